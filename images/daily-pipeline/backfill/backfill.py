@@ -0,0 +1,327 @@
+import os
+import sys
+import json
+import time
+import heapq
+import logging
+import argparse
+from datetime import date, timedelta
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
+
+# 로컬 실행 시 각 이미지 디렉터리의 엔트리 모듈을 import할 수 있도록 한다. (컨테이너에서는 모두 /app에 복사됨)
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+for module_dir in ("split_ticker", "resample_ticker", "upload_to_influxdb"):
+    sys.path.insert(0, os.path.join(BASE_DIR, module_dir))
+sys.path.insert(0, BASE_DIR)
+
+from common.tuner import detect_limits, log_plan
+from common.gcs import get_storage_client, RESAMPLED_BUCKET
+from common.priority import PRIORITY_WORKERS, priority_tickers, split_priority, publish_priority_done
+from common.planner import load_profile, list_raw_sizes, measured_profile, estimate, log_estimate
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+SPLIT, RESAMPLE, INFLUX = "split", "resample", "influx"
+# 같은 날짜 안에서는 뒤 단계부터 처리하여 시작된 날짜를 먼저 끝낸다.
+STAGE_RANK = {INFLUX: 0, RESAMPLE: 1, SPLIT: 2}
+
+
+def run_split(day_str):
+    from split_ticker import process_stock_data
+    year, month, day = day_str.split("-")
+    return process_stock_data(year, month, day)
+
+
+def run_resample(day_str, tickers):
+    from resample_ticker import resample_data
+    year, month, day = day_str.split("-")
+    # 모든 주기가 올라가지 않은 티커가 있으면 이 샤드를 완료로 기록하지 않는다.
+    failed = [ticker for ticker in tickers if resample_data(year, month, day, ticker) is False]
+    if failed:
+        raise RuntimeError(f"Resample failed for {len(failed)} tickers: {failed[:10]}")
+    return len(tickers)
+
+
+def run_influx(day_str, tickers, influx_args):
+    from upload_to_influxdb import upload_to_influxdb
+    year, month, day = day_str.split("-")
+    for ticker in tickers:
+        upload_to_influxdb(year, month, day, ticker, *influx_args)
+    return len(tickers)
+
+
+class Checkpoint:
+    # 완료된 (날짜, 단계, 샤드) 단위를 JSON lines로 기록한다. split 항목에는 티커 목록도 남겨
+    # 재시작 시 split을 다시 돌리지 않고도 같은 샤드 구성을 복원할 수 있다.
+    def __init__(self, path):
+        self.path = path
+        self.done = {}
+        if os.path.exists(path):
+            with open(path) as f:
+                for line in f:
+                    if line.strip():
+                        entry = json.loads(line)
+                        self.done[(entry["date"], entry["stage"], entry["shard"])] = entry
+        logger.info(f"Loaded {len(self.done)} completed units from {path}")
+
+    def is_done(self, key):
+        return key in self.done
+
+    def get(self, key):
+        return self.done.get(key)
+
+    def record(self, key, **extra):
+        entry = {"date": key[0], "stage": key[1], "shard": key[2], **extra}
+        with open(self.path, "a") as f:
+            f.write(json.dumps(entry) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+        self.done[key] = entry
+
+
+def is_priority(key):
+    # 우선순위 티커 샤드는 "p0", "p1", ... 처럼 문자열 번호를 쓴다.
+    return isinstance(key[2], str)
+
+
+class BackfillScheduler:
+    # 날짜 × 단계 × 샤드 단위의 의존성 그래프를 로컬 프로세스 풀에서 실행한다.
+    # 준비된 작업은 하나의 우선순위 큐에 모이고, 빈 워커는 날짜와 관계없이 다음 작업을 가져가므로
+    # 어떤 날짜의 꼬리 작업이 남아 있어도 다른 날짜의 작업으로 코어가 계속 채워진다.
+    # 우선순위 티커는 별도 샤드로 묶어 큐의 앞에 두고, 그 샤드가 대기/실행 중인 동안 priority_workers개의 워커를 비워 둔다.
+    def __init__(self, days, workers, shard_size, max_split, checkpoint, influx_args=None,
+                 priority_workers=PRIORITY_WORKERS):
+        self.days = days
+        self.workers = workers
+        self.shard_size = shard_size
+        self.max_split = max(1, max_split)
+        self.checkpoint = checkpoint
+        self.influx_args = influx_args
+        self.priority_workers = min(max(0, priority_workers), workers - 1) if priority_tickers() else 0
+        self.ready = []
+        self.failed = []
+        # (날짜, 단계) -> 아직 끝나지 않은 우선순위 샤드. 비면 그 단계의 완료 신호를 남긴다.
+        self.priority_pending = {}
+        self._signal_bucket = None
+
+    def _push(self, key):
+        day_str, stage, shard = key
+        heapq.heappush(self.ready, (0 if is_priority(key) else 1, STAGE_RANK[stage], day_str, shard, key))
+
+    def _chunks(self, tickers):
+        return [tickers[i:i + self.shard_size] for i in range(0, len(tickers), self.shard_size)]
+
+    def _shards(self, day_str):
+        # 샤드 구성은 split 체크포인트에 남긴 티커와 우선순위 목록으로 정하므로 재시작해도 같다.
+        entry = self.checkpoint.get((day_str, SPLIT, 0))
+        priority = entry.get("priority", [])
+        _, rest = split_priority(entry["tickers"], set(priority))
+        shards = {f"p{i}": tickers for i, tickers in enumerate(self._chunks(priority))}
+        shards.update(enumerate(self._chunks(rest)))
+        return shards
+
+    def _on_split_done(self, day_str):
+        # split이 끝나면 해당 날짜의 resample 샤드를 준비 큐에 넣는다.
+        stages = [RESAMPLE] if self.influx_args is None else [RESAMPLE, INFLUX]
+        for shard in self._shards(day_str):
+            if isinstance(shard, str):
+                for stage in stages:
+                    if not self.checkpoint.is_done((day_str, stage, shard)):
+                        self.priority_pending.setdefault((day_str, stage), set()).add(shard)
+            key = (day_str, RESAMPLE, shard)
+            if self.checkpoint.is_done(key):
+                self._on_resample_done(key)
+            else:
+                self._push(key)
+
+    def _on_resample_done(self, key):
+        if self.influx_args is None:
+            return
+        influx_key = (key[0], INFLUX, key[2])
+        if not self.checkpoint.is_done(influx_key):
+            self._push(influx_key)
+
+    def _on_priority_done(self, key):
+        pending = self.priority_pending.get(key[:2])
+        if pending is None:
+            return
+        pending.discard(key[2])
+        if pending:
+            return
+        del self.priority_pending[key[:2]]
+        day_str, stage = key[:2]
+        tickers = [t for shard, chunk in self._shards(day_str).items() if isinstance(shard, str) for t in chunk]
+        try:
+            if self._signal_bucket is None:
+                self._signal_bucket = get_storage_client().bucket(RESAMPLED_BUCKET)
+            publish_priority_done(self._signal_bucket, stage, *day_str.split("-"), tickers)
+        except Exception as e:
+            logger.error(f"Failed to publish priority signal for {day_str} {stage}: {e}")
+
+    def _shard_tickers(self, day_str, shard):
+        return self._shards(day_str)[shard]
+
+    def _priority_outstanding(self, running):
+        # 우선순위 샤드가 실제로 준비 큐에 있거나 실행 중일 때만 참.
+        # (split이 남아 있다는 이유만으로 비워 두면 긴 백필 내내 워커가 놀게 된다.
+        #  split이 끝나 생기는 우선순위 샤드는 큐의 앞에 들어가 다음 빈 워커를 가져간다)
+        if not self.priority_workers:
+            return False
+        return any(is_priority(key) for key in running.values()) or \
+            any(is_priority(item[-1]) for item in self.ready)
+
+    def _submit(self, executor, key):
+        day_str, stage, shard = key
+        if stage == SPLIT:
+            return executor.submit(run_split, day_str)
+        if stage == RESAMPLE:
+            return executor.submit(run_resample, day_str, self._shard_tickers(day_str, shard))
+        return executor.submit(run_influx, day_str, self._shard_tickers(day_str, shard), self.influx_args)
+
+    def _next_ready(self, running_splits, normal_slots):
+        # split은 메모리를 많이 쓰므로 동시에 max_split개까지만 실행한다.
+        # normal_slots: 우선순위가 아닌 작업이 더 쓸 수 있는 워커 수 (비워 둔 워커 제외)
+        deferred = []
+        chosen = None
+        while self.ready:
+            item = heapq.heappop(self.ready)
+            key = item[-1]
+            if (key[1] == SPLIT and running_splits >= self.max_split) or \
+                    (not is_priority(key) and normal_slots <= 0):
+                deferred.append(item)
+                continue
+            chosen = key
+            break
+        for item in deferred:
+            heapq.heappush(self.ready, item)
+        return chosen
+
+    def run(self):
+        for day_str in self.days:
+            split_key = (day_str, SPLIT, 0)
+            if self.checkpoint.is_done(split_key):
+                self._on_split_done(day_str)
+            else:
+                self._push(split_key)
+
+        running = {}
+        started = {}
+        with ProcessPoolExecutor(max_workers=self.workers) as executor:
+            while self.ready or running:
+                running_splits = sum(1 for key in running.values() if key[1] == SPLIT)
+                while len(running) < self.workers:
+                    reserved = self.priority_workers if self._priority_outstanding(running) else 0
+                    normal = sum(1 for key in running.values() if not is_priority(key))
+                    key = self._next_ready(running_splits, self.workers - reserved - normal)
+                    if key is None:
+                        break
+                    future = self._submit(executor, key)
+                    running[future] = key
+                    started[future] = time.monotonic()
+                    running_splits += key[1] == SPLIT
+
+                done, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in done:
+                    key = running.pop(future)
+                    # 소요 시간은 플래너(--plan)가 처리량 프로파일을 측정하는 데 쓴다.
+                    seconds = round(time.monotonic() - started.pop(future), 3)
+                    try:
+                        result = future.result()
+                    except Exception as e:
+                        logger.error(f"Unit {key} failed: {e}")
+                        self.failed.append(key)
+                        continue
+                    if key[1] == SPLIT:
+                        tickers = result or []
+                        # 우선순위 목록도 남겨 재시작 시 같은 샤드 구성을 복원한다.
+                        self.checkpoint.record(key, tickers=tickers, priority=split_priority(tickers)[0],
+                                               seconds=seconds)
+                        logger.info(f"Split done for {key[0]}: {len(tickers)} tickers")
+                        self._on_split_done(key[0])
+                    else:
+                        self.checkpoint.record(key, count=result, seconds=seconds)
+                        logger.info(f"Unit done: {key} ({result} tickers)")
+                        if key[1] == RESAMPLE:
+                            self._on_resample_done(key)
+                        if is_priority(key):
+                            self._on_priority_done(key)
+
+        if self.failed:
+            logger.error(f"Backfill finished with {len(self.failed)} failed units: {self.failed}")
+        else:
+            logger.info("Backfill completed")
+        return not self.failed
+
+
+def date_range(start, end):
+    current = date.fromisoformat(start)
+    last = date.fromisoformat(end)
+    while current <= last:
+        # 주말에는 원본 파일이 없으므로 건너뛴다.
+        if current.weekday() < 5:
+            yield current.isoformat()
+        current += timedelta(days=1)
+
+
+def plan_backfill(args):
+    # 원본 목록(크기)과 기존 체크포인트의 측정값만 읽고 데이터는 옮기지 않는다.
+    days = list(date_range(args.start_date, args.end_date))
+    raw_sizes, list_ops = list_raw_sizes(get_storage_client(), days)
+    entries = Checkpoint(args.checkpoint).done.values() if os.path.exists(args.checkpoint) else []
+    profile, tickers_by_day, measured = measured_profile(load_profile(args.profile), entries, raw_sizes)
+    plan = estimate(days, raw_sizes, profile, tickers_by_day, workers=args.workers, max_split=args.max_split,
+                    shard_size=args.shard_size, influx=bool(args.influx_url), list_ops=list_ops)
+    log_estimate(plan, profile, measured, args.workers, args.max_split, args.target_hours)
+    if args.plan_json:
+        with open(args.plan_json, "w") as f:
+            json.dump({"plan": plan, "profile": profile, "measured": measured}, f, indent=2)
+    return plan
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Backfill split/resample/influx for a date range")
+    parser.add_argument("start_date", help="YYYY-MM-DD (inclusive)")
+    parser.add_argument("end_date", help="YYYY-MM-DD (inclusive)")
+    parser.add_argument("--workers", type=int, default=detect_limits().workers)
+    parser.add_argument("--shard-size", type=int, default=200, help="tickers per resample/influx unit")
+    parser.add_argument("--max-split", type=int, default=2, help="concurrent split units")
+    parser.add_argument("--priority-workers", type=int, default=PRIORITY_WORKERS,
+                        help="workers kept free while PRIORITY_TICKERS shards are queued or running")
+    parser.add_argument("--checkpoint", default="backfill_checkpoint.jsonl")
+    parser.add_argument("--influx-url", default=os.environ.get("INFLUX_URL"))
+    parser.add_argument("--influx-token", default=os.environ.get("INFLUX_TOKEN"))
+    parser.add_argument("--influx-org", default=os.environ.get("INFLUX_ORG"))
+    parser.add_argument("--influx-bucket", default=os.environ.get("INFLUX_BUCKET"))
+    parser.add_argument("--plan", action="store_true", help="estimate I/O, cost and time without moving data")
+    parser.add_argument("--profile", help="JSON file overriding the planner's throughput profile")
+    parser.add_argument("--plan-json", help="also write the plan to this JSON file")
+    parser.add_argument("--target-hours", type=float, help="report how many pods are needed to finish in time")
+    args = parser.parse_args()
+    if args.plan:
+        plan_backfill(args)
+        return
+    log_plan("backfill", workers=args.workers, max_split=args.max_split, shard_size=args.shard_size,
+             priority_workers=args.priority_workers, priority_tickers=len(priority_tickers()))
+
+    influx_args = None
+    if args.influx_url:
+        influx_args = (args.influx_url, args.influx_token, args.influx_org, args.influx_bucket)
+    else:
+        logger.warning("No InfluxDB URL given; the influx stage will be skipped")
+
+    scheduler = BackfillScheduler(
+        list(date_range(args.start_date, args.end_date)),
+        workers=args.workers,
+        shard_size=args.shard_size,
+        max_split=args.max_split,
+        checkpoint=Checkpoint(args.checkpoint),
+        influx_args=influx_args,
+        priority_workers=args.priority_workers,
+    )
+    if not scheduler.run():
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,212 @@
+import os
+import math
+import time
+import logging
+import threading
+from collections import deque
+
+logger = logging.getLogger(__name__)
+
+# 이 작업들의 동시 요청 수를 AIMD로 조절한다. 비워 두면 끈다.
+ADAPTIVE_OPS = [op.strip() for op in os.environ.get("GCS_AIMD_OPS", "upload,async_upload").split(",") if op.strip()]
+INITIAL_LIMIT = float(os.environ.get("GCS_AIMD_INITIAL", "16"))
+MIN_LIMIT = float(os.environ.get("GCS_AIMD_MIN", "1"))
+MAX_LIMIT = float(os.environ.get("GCS_AIMD_MAX", "256"))
+# 한 "창"(현재 한도만큼의 성공)마다 늘리는 양과, 쓰로틀 신호마다 곱하는 비율
+INCREASE = float(os.environ.get("GCS_AIMD_INCREASE", "1"))
+DECREASE = float(os.environ.get("GCS_AIMD_DECREASE", "0.5"))
+# 최근 LATENCY_RECENT개 응답의 평균 지연이 기준(약 LATENCY_WINDOW개 응답에 걸친 이동 평균)의 이 배수를 넘는
+# 상태가 이어지면 지연이 지속적으로 부풀었다고 보고 줄인다. 개별 요청의 꼬리 지연(객체 크기 차이 등)에는 반응하지 않는다.
+LATENCY_FACTOR = float(os.environ.get("GCS_AIMD_LATENCY_FACTOR", "2"))
+LATENCY_RECENT = int(os.environ.get("GCS_AIMD_LATENCY_RECENT", "32"))
+LATENCY_WINDOW = int(os.environ.get("GCS_AIMD_LATENCY_WINDOW", "2000"))
+# 한 번 줄인 뒤 이 시간 동안은 다시 줄이지 않는다. (같은 혼잡에 대한 응답 여러 개로 한도가 바닥나지 않게)
+COOLDOWN_SECONDS = float(os.environ.get("GCS_AIMD_COOLDOWN_SECONDS", "1.0"))
+LOG_INTERVAL_SECONDS = float(os.environ.get("GCS_AIMD_LOG_INTERVAL_SECONDS", "10"))
+
+THROTTLE_STATUS = {429, 503}
+# 408(요청 타임아웃)과 504(google.api_core의 DeadlineExceeded 등)도 혼잡 신호로 본다.
+TIMEOUT_STATUS = {408, 504}
+OK, THROTTLED, ERROR = "ok", "throttled", "error"
+
+
+def is_timeout(exc):
+    # requests(ConnectTimeout/ReadTimeout), urllib3(ReadTimeoutError), socket.timeout(3.9에서는 OSError) 등
+    # 라이브러리마다 타임아웃 예외가 달라 클래스 이름으로 판단한다. (이 모듈에서 무거운 라이브러리를 import하지 않음)
+    if isinstance(exc, TimeoutError):
+        return True
+    return any("timeout" in cls.__name__.lower() for cls in type(exc).__mro__)
+
+
+def classify(exc):
+    # 429/503과 타임아웃은 서버가 밀어내는 신호로 보고, 그 밖의 오류는 한도에 반영하지 않는다.
+    if exc is None:
+        return OK
+    code = getattr(exc, "code", None)
+    if code in THROTTLE_STATUS or code in TIMEOUT_STATUS or is_timeout(exc):
+        return THROTTLED
+    return ERROR
+
+
+class AIMDLimiter:
+    # 가산 증가/승산 감소(AIMD) 동시성 한도. 건강한 응답이 한 창만큼 모이면 한도를 INCREASE만큼 올리고,
+    # 쓰로틀(429/503, 타임아웃)이나 지속적인 지연 증가에는 DECREASE를 곱해 내린다.
+    # acquire로 자리를 얻고 release로 결과를 알린다.
+    def __init__(self, name, initial=INITIAL_LIMIT, minimum=MIN_LIMIT, maximum=MAX_LIMIT, increase=INCREASE,
+                 decrease=DECREASE, latency_factor=LATENCY_FACTOR, cooldown=COOLDOWN_SECONDS,
+                 log_interval=LOG_INTERVAL_SECONDS, latency_recent=LATENCY_RECENT, latency_window=LATENCY_WINDOW):
+        self.name = name
+        self.minimum = minimum
+        self.maximum = maximum
+        self.limit = max(minimum, min(maximum, initial))
+        self.increase = increase
+        self.decrease = decrease
+        self.latency_factor = latency_factor
+        self.cooldown = cooldown
+        self.log_interval = log_interval
+        self.in_flight = 0
+        self.peak_in_flight = 0
+        self.peak_limit = self.limit
+        self.baseline = None
+        self.recent_latency = None
+        self.latency_window = max(1, latency_window)
+        self._recent = deque(maxlen=max(1, latency_recent))
+        self._recent_sum = 0.0
+        self._log_baseline = None
+        self._inflated = 0
+        self.counters = {"ok": 0, "throttled": 0, "errors": 0, "increases": 0, "decreases": 0, "slow": 0}
+        self._cond = threading.Condition()
+        self._last_decrease = 0.0
+        self._last_log = time.monotonic()
+
+    def try_acquire(self):
+        with self._cond:
+            if self.in_flight >= int(self.limit):
+                return False
+            self._take()
+            return True
+
+    def acquire(self):
+        with self._cond:
+            while self.in_flight >= int(self.limit):
+                self._cond.wait()
+            self._take()
+
+    def cancel(self):
+        # 자리를 얻었지만 요청을 보내지 않았을 때: 결과를 한도에 반영하지 않고 자리만 돌려준다.
+        with self._cond:
+            self.in_flight -= 1
+            self._cond.notify_all()
+
+    def _take(self):
+        self.in_flight += 1
+        self.peak_in_flight = max(self.peak_in_flight, self.in_flight)
+
+    def release(self, outcome, latency=None):
+        with self._cond:
+            # 한도까지 채워 쓰고 있을 때만 늘린다. 요청이 적어 한도가 제약이 아니면 한도만 부풀게 된다.
+            saturated = self.in_flight >= int(self.limit)
+            self.in_flight -= 1
+            if outcome == OK:
+                self.counters["ok"] += 1
+                self._on_success(latency, saturated)
+            elif outcome == THROTTLED:
+                self.counters["throttled"] += 1
+                self._decrease("throttled")
+            else:
+                self.counters["errors"] += 1
+            self._cond.notify_all()
+            self._maybe_log()
+
+    def _observe(self, latency):
+        # 지연의 로그 평균(기하 평균)으로 비교한다. 로그 평균은 꼬리 지연이나 크기가 다른 객체가 섞인 분포에도
+        # 크게 흔들리지 않는다. 최근 창의 평균이 기준의 latency_factor배를 최근 창 길이만큼 연달아 넘을 때만
+        # 지연이 지속적으로 부풀었다고 본다. 기준은 수천 개 응답에 걸쳐 천천히 따라가므로 갑자기 부푼 지연은
+        # 기준에 묻히지 않고, 객체 크기가 바뀌는 것처럼 오래 이어지는 변화는 결국 기준에 반영된다.
+        value = math.log(max(latency, 1e-6))
+        if self._log_baseline is not None:
+            # 한 응답이 최근 평균을 혼자 끌어올리지 못하게 기준의 latency_factor²배에서 자른다.
+            value = min(value, self._log_baseline + 2 * math.log(self.latency_factor))
+        if len(self._recent) == self._recent.maxlen:
+            self._recent_sum -= self._recent[0]
+        self._recent.append(value)
+        self._recent_sum += value
+        if len(self._recent) < self._recent.maxlen:
+            return False
+        recent = self._recent_sum / len(self._recent)
+        if self._log_baseline is None:
+            self._log_baseline = recent
+        else:
+            self._log_baseline += (value - self._log_baseline) / self.latency_window
+        self.baseline = math.exp(self._log_baseline)
+        self.recent_latency = math.exp(recent)
+        if self.recent_latency > self.baseline * self.latency_factor:
+            self._inflated += 1
+        else:
+            self._inflated = 0
+        if self._inflated < self._recent.maxlen:
+            return False
+        # 줄인 뒤에는 다시 최근 창 하나만큼 부푼 상태가 이어져야 또 줄인다.
+        self._inflated = 0
+        return True
+
+    def _on_success(self, latency, saturated=True):
+        if latency is not None and self._observe(latency):
+            self.counters["slow"] += 1
+            self._decrease("latency")
+            return
+        if not saturated:
+            return
+        # 한도만큼 성공할 때마다 INCREASE만큼 오르도록 한 번에 increase / limit씩 올린다.
+        previous = self.limit
+        self.limit = min(self.maximum, self.limit + self.increase / max(1.0, self.limit))
+        if int(self.limit) > int(previous):
+            self.counters["increases"] += 1
+            self.peak_limit = max(self.peak_limit, self.limit)
+
+    def _decrease(self, reason):
+        now = time.monotonic()
+        if now - self._last_decrease < self.cooldown:
+            return
+        self._last_decrease = now
+        previous = self.limit
+        self.limit = max(self.minimum, self.limit * self.decrease)
+        self.counters["decreases"] += 1
+        logger.info(f"AIMD {self.name}: limit {previous:.1f} -> {self.limit:.1f} ({reason}), "
+                    f"in_flight={self.in_flight}")
+
+    def _maybe_log(self):
+        now = time.monotonic()
+        if now - self._last_log >= self.log_interval:
+            self._last_log = now
+            logger.info(f"AIMD {self.name}: " + ", ".join(f"{k}={v}" for k, v in self.snapshot().items()))
+
+    def snapshot(self):
+        return {
+            "limit": round(self.limit, 1),
+            "in_flight": self.in_flight,
+            "peak_limit": round(self.peak_limit, 1),
+            "peak_in_flight": self.peak_in_flight,
+            "baseline_latency": round(self.baseline, 4) if self.baseline is not None else None,
+            "recent_latency": round(self.recent_latency, 4) if self.recent_latency is not None else None,
+            **self.counters,
+        }
+
+
+_limiters = {}
+_limiters_lock = threading.Lock()
+
+
+def limiter_for(op):
+    # 같은 작업 종류의 요청은 프로세스 안에서 하나의 한도를 공유한다. (split과 resample의 업로드 등)
+    if op not in ADAPTIVE_OPS:
+        return None
+    with _limiters_lock:
+        if op not in _limiters:
+            _limiters[op] = AIMDLimiter(op)
+        return _limiters[op]
+
+
+def all_limiters():
+    with _limiters_lock:
+        return dict(_limiters)
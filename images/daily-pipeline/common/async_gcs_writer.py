@@ -0,0 +1,196 @@
+import os
+import json
+import time
+import asyncio
+import logging
+import threading
+from collections import deque
+from urllib.parse import quote
+
+from common.lazy import lazy_import
+from common.budget import ByteBudget
+from common.tuner import cpu_workers, memory_share, tuned_int
+from common.request_policy import RETRYABLE_STATUS, backoff_delay, default_policy
+from common.aimd import OK, ERROR, THROTTLED, THROTTLE_STATUS, limiter_for
+
+logger = logging.getLogger(__name__)
+aiohttp = lazy_import("aiohttp")
+
+GCS_API_ENDPOINT = "https://storage.googleapis.com"
+GCS_SCOPES = ["https://www.googleapis.com/auth/devstorage.read_write"]
+
+ASYNC_CONCURRENCY = tuned_int("GCS_ASYNC_CONCURRENCY", cpu_workers(per_cpu=128, minimum=32, maximum=512))
+ASYNC_MAX_BUFFERED_BYTES = tuned_int("GCS_ASYNC_MAX_BUFFERED_BYTES",
+                                     memory_share(0.0625, 16 * 1024 ** 2, 512 * 1024 ** 2))
+# 적응형 한도의 자리는 이 writer의 업로드가 끝날 때 대기자에게 넘긴다. 같은 한도를 쓰는 다른 코드가
+# 자리를 비운 경우에 대비해 대기자는 이 간격마다 한 번씩 직접 확인한다.
+SLOT_RECHECK_SECONDS = 0.5
+
+
+def use_async_writer():
+    return os.environ.get("GCS_UPLOAD_ENGINE", "threads").lower() == "async"
+
+
+def _load_credentials():
+    import google.auth
+    from google.oauth2 import service_account
+
+    creds_json = os.environ.get("GOOGLE_CREDENTIALS")
+    if creds_json:
+        try:
+            return service_account.Credentials.from_service_account_info(json.loads(creds_json), scopes=GCS_SCOPES)
+        except Exception as e:
+            logger.error(f"Failed to parse GOOGLE_CREDENTIALS: {e}")
+    credentials, _ = google.auth.default(scopes=GCS_SCOPES)
+    return credentials
+
+
+class AsyncGCSWriter:
+    # 백그라운드 이벤트 루프에서 하나의 HTTP 세션을 공유하며 작은 객체 수백 개를 동시에 업로드한다.
+    # 동기 코드(split_ticker, resample_ticker)에서는 submit으로 넘기고 concurrent.futures.Future로 결과를 받는다.
+    # 버퍼링된 바이트가 max_buffered_bytes를 넘으면 submit이 블로킹되어 메모리 사용량이 제한된다.
+    def __init__(self, concurrency=ASYNC_CONCURRENCY, max_buffered_bytes=ASYNC_MAX_BUFFERED_BYTES, max_attempts=5):
+        emulator_host = os.environ.get("STORAGE_EMULATOR_HOST")
+        self.endpoint = (emulator_host or GCS_API_ENDPOINT).rstrip("/")
+        self.concurrency = concurrency
+        self.max_attempts = max_attempts
+        # 에뮬레이터는 인증을 요구하지 않는다.
+        self._credentials = None if emulator_host else _load_credentials()
+        self._budget = ByteBudget(max_buffered_bytes)
+        self._loop = asyncio.new_event_loop()
+        self._ready = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="async-gcs-writer", daemon=True)
+        self._thread.start()
+        self._ready.wait()
+        self.uploaded = 0
+        self.failed = 0
+        # concurrency는 상한이고, 실제 동시 업로드 수는 적응형 한도가 정한다.
+        self._limiter = limiter_for("async_upload")
+        # 자리를 기다리는 업로드 (도착 순서대로 자리를 받는다)
+        self._slot_waiters = deque()
+
+    def _run(self):
+        asyncio.set_event_loop(self._loop)
+        self._loop.create_task(self._setup())
+        self._loop.run_forever()
+
+    async def _setup(self):
+        # aiohttp 세션과 동기화 객체는 실행 중인 이벤트 루프 안에서 만들어야 한다.
+        self._semaphore = asyncio.Semaphore(self.concurrency)
+        self._token_lock = asyncio.Lock()
+        connector = aiohttp.TCPConnector(limit=self.concurrency)
+        self._session = aiohttp.ClientSession(connector=connector, timeout=aiohttp.ClientTimeout(total=120))
+        self._ready.set()
+
+    async def _auth_headers(self):
+        if self._credentials is None:
+            return {}
+        async with self._token_lock:
+            if not self._credentials.valid:
+                import google.auth.transport.requests
+                request = google.auth.transport.requests.Request()
+                await self._loop.run_in_executor(None, self._credentials.refresh, request)
+        return {"Authorization": f"Bearer {self._credentials.token}"}
+
+    async def _acquire_slot(self):
+        if self._limiter is None:
+            return
+        # 먼저 기다리는 업로드가 없을 때만 바로 가져가서 늦게 온 업로드가 앞지르지 않게 한다.
+        if not self._slot_waiters and self._limiter.try_acquire():
+            return
+        waiter = self._loop.create_future()
+        self._slot_waiters.append(waiter)
+        try:
+            while not waiter.done():
+                await asyncio.wait([waiter], timeout=SLOT_RECHECK_SECONDS)
+                self._grant_slots()
+        except asyncio.CancelledError:
+            if waiter.done() and not waiter.cancelled():
+                # 자리를 받은 뒤 취소됐으면 다음 대기자에게 넘긴다.
+                self._limiter.cancel()
+                self._grant_slots()
+            else:
+                waiter.cancel()
+                self._slot_waiters.remove(waiter)
+            raise
+
+    def _grant_slots(self):
+        # 한도에 빈 자리가 있는 만큼 가장 오래 기다린 업로드부터 깨운다. (AIMD로 한도가 늘면 여러 개)
+        while self._slot_waiters and self._limiter.try_acquire():
+            self._slot_waiters.popleft().set_result(None)
+
+    def _release_slot(self, outcome, started):
+        if self._limiter is not None:
+            self._limiter.release(outcome, time.monotonic() - started)
+            self._grant_slots()
+
+    async def _upload(self, bucket_name, object_name, data, content_type):
+        url = f"{self.endpoint}/upload/storage/v1/b/{quote(bucket_name, safe='')}/o"
+        params = {"uploadType": "media", "name": object_name}
+        async with self._semaphore:
+            for attempt in range(1, self.max_attempts + 1):
+                headers = await self._auth_headers()
+                headers["Content-Type"] = content_type
+                await self._acquire_slot()
+                started = time.monotonic()
+                outcome = ERROR
+                try:
+                    async with self._session.post(url, params=params, data=data, headers=headers) as response:
+                        if response.status < 300:
+                            body = await response.json(content_type=None)
+                            outcome = OK
+                            self.uploaded += 1
+                            default_policy().stats.record("async_upload", time.monotonic() - started)
+                            return body
+                        outcome = THROTTLED if response.status in THROTTLE_STATUS else ERROR
+                        text = await response.text()
+                        if response.status not in RETRYABLE_STATUS or attempt == self.max_attempts:
+                            raise RuntimeError(f"Upload failed ({response.status}) for {object_name}: {text[:200]}")
+                except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                    if isinstance(e, asyncio.TimeoutError):
+                        outcome = THROTTLED
+                    if attempt == self.max_attempts:
+                        raise RuntimeError(f"Upload failed for {object_name}: {e}") from e
+                finally:
+                    self._release_slot(outcome, started)
+                default_policy().stats.count("async_upload", "retries")
+                await asyncio.sleep(backoff_delay(attempt))
+
+    async def _upload_counted(self, bucket_name, object_name, data, content_type):
+        try:
+            return await self._upload(bucket_name, object_name, data, content_type)
+        except Exception:
+            self.failed += 1
+            raise
+
+    def submit(self, bucket_name, object_name, data, content_type="application/octet-stream"):
+        if isinstance(data, str):
+            data = data.encode("utf-8")
+        nbytes = len(data)
+        self._budget.acquire(nbytes)
+        future = asyncio.run_coroutine_threadsafe(
+            self._upload_counted(bucket_name, object_name, data, content_type), self._loop)
+        future.add_done_callback(lambda _: self._budget.release(nbytes))
+        return future
+
+    async def _close_session(self):
+        # 아직 진행 중인 업로드를 모두 마친 뒤 세션을 닫는다.
+        pending = [task for task in asyncio.all_tasks() if task is not asyncio.current_task()]
+        await asyncio.gather(*pending, return_exceptions=True)
+        await self._session.close()
+
+    def close(self):
+        if not self._thread.is_alive():
+            return
+        asyncio.run_coroutine_threadsafe(self._close_session(), self._loop).result()
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join()
+        self._loop.close()
+        logger.info(f"Async GCS writer closed: uploaded={self.uploaded}, failed={self.failed}, "
+                    f"peak buffered bytes={self._budget.peak}")
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
@@ -0,0 +1,111 @@
+import os
+
+from common.lazy import lazy_import
+
+pd = lazy_import("pandas")
+
+# 리샘플링할 주기 정의 (모든 주기에 대해 정규화된 결과 파일을 생성)
+PERIOD_CODES = {
+    "1m": "1min",
+    "5m": "5min",
+    "10m": "10min",
+    "15m": "15min",
+    "30m": "30min",
+    "1h": "1h",
+    "4h": "4h",
+    "1d": "1d"
+}
+
+OHLCV_AGG = {
+    'open': 'first',
+    'high': 'max',
+    'low': 'min',
+    'close': 'last',
+    'volume': 'sum'
+}
+PRICE_COLUMNS = ["open", "high", "low", "close"]
+
+# 세션 캘린더: 미국 동부 시간 기준 (월~금)
+SESSION_TIMEZONE = os.environ.get("RESAMPLE_SESSION_TIMEZONE", "America/New_York")
+SESSIONS = {
+    "regular": ("09:30", "16:00"),
+    "extended": ("04:00", "20:00"),
+}
+# full: 기존처럼 데이터 구간 전체를 사용 / regular, extended 또는 "HH:MM-HH:MM"
+SESSION = os.environ.get("RESAMPLE_SESSION", "full")
+# ffill: 기존처럼 빈 구간을 직전 값으로 채움 / mark: 채우되 filled 컬럼으로 표시 / skip: 거래가 있던 구간만 저장
+FILL_MODE = os.environ.get("RESAMPLE_FILL", "ffill")
+
+
+def session_bounds(session=SESSION):
+    if session in (None, "", "full"):
+        return None
+    start, end = SESSIONS[session] if session in SESSIONS else session.split("-")
+    return pd.Timedelta(f"{start}:00"), pd.Timedelta(f"{end}:00")
+
+
+def session_mask(index, period_code, bounds):
+    # 구간 [start, start + period)이 그날(또는 다음 날) 세션과 겹치면 남긴다.
+    # 1d, 4h처럼 현지 자정을 넘는 구간은 다음 날 세션과 겹칠 수 있으므로 두 날을 모두 확인한다.
+    open_offset, close_offset = bounds
+    local_start = index.tz_localize("UTC").tz_convert(SESSION_TIMEZONE)
+    local_end = local_start + pd.tseries.frequencies.to_offset(period_code)
+    mask = pd.Series(False, index=index)
+    for shift in (0, 1):
+        day = local_start.normalize() + pd.Timedelta(days=shift)
+        overlaps = (local_start < day + close_offset) & (local_end > day + open_offset) & (day.weekday < 5)
+        mask |= pd.Series(overlaps, index=index)
+    return mask.to_numpy()
+
+
+def resample_bars(df, period_name, session=SESSION, fill=FILL_MODE):
+    # df: window_start(UTC, tz 없음)를 인덱스로 하는 1분봉
+    period_code = PERIOD_CODES[period_name]
+    bars = df.resample(period_code).agg(OHLCV_AGG)
+    # volume은 sum이므로 빈 구간에서도 0이 된다. 거래 여부는 open으로 판단한다.
+    traded = bars["open"].notna()
+
+    if fill == "skip":
+        bars = bars[traded]
+    else:
+        if fill == "mark":
+            bars["filled"] = (~traded).astype(int)
+        # forward filling으로 결측치 보완 (세션 시작 직후 값이 장전 거래에서 이어지도록 필터링 전에 채운다)
+        bars = bars.ffill()
+
+    bounds = session_bounds(session)
+    if bounds is not None:
+        bars = bars[session_mask(bars.index, period_code, bounds)]
+    bars = bars.reset_index()
+    if fill == "skip":
+        # 읽는 쪽(ffill_bars)이 같은 세션 격자로 채울 수 있도록 어떤 세션으로 잘랐는지 남긴다.
+        bars["session"] = session or "full"
+    return bars
+
+
+def ffill_bars(df, period_name, session=None):
+    # skip 모드로 저장된 희소한 봉을 읽는 쪽에서 필요할 때 채운다. (티커별, 첫 봉~마지막 봉 구간)
+    # 격자는 resample_bars와 같은 세션 규칙으로 만든다. 세션을 주지 않으면 파일에 기록된 session 컬럼을 따른다.
+    # 세션 밖의 거래는 저장되지 않았으므로, 거래 없이 시작한 세션의 첫 봉은 직전 세션의 마지막 값으로 채워진다.
+    period_code = PERIOD_CODES[period_name]
+    frames = []
+    for ticker, group in df.groupby("ticker", sort=False):
+        group = group.set_index("window_start").drop(columns=["ticker"])
+        grid = pd.date_range(group.index.min(), group.index.max(), freq=period_code)
+        ticker_session = session
+        if ticker_session is None and "session" in group.columns:
+            ticker_session = group["session"].iloc[0]
+        bounds = session_bounds(ticker_session)
+        if bounds is not None:
+            grid = grid[session_mask(grid, period_code, bounds)]
+        filled = group.reindex(grid)
+        if "session" in filled.columns:
+            filled["session"] = filled["session"].ffill()
+        filled[PRICE_COLUMNS] = filled[PRICE_COLUMNS].ffill()
+        filled["volume"] = filled["volume"].fillna(0)
+        if "filled" in filled.columns:
+            filled["filled"] = filled["filled"].fillna(1).astype(int)
+        filled = filled.rename_axis("window_start").reset_index()
+        filled.insert(0, "ticker", ticker)
+        frames.append(filled)
+    return pd.concat(frames, ignore_index=True) if frames else df
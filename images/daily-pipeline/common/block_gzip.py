@@ -0,0 +1,58 @@
+import io
+import json
+import zlib
+import logging
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+from common.lazy import lazy_import
+from common.gcs import raw_block_gzip_object_path, raw_block_gzip_index_path
+
+logger = logging.getLogger(__name__)
+pd = lazy_import("pandas")
+
+
+class BlockGzipSource:
+    # polygon_to_gcs_daily의 reencode_raw.py가 만든 block-gzip 사본과 member 인덱스.
+    # 인덱스: {"header", "rows", "sorted", "blocks": [{"offset", "length", "raw_offset", "raw_length",
+    #          "start_row", "rows", "first_ticker", "last_ticker"}]}
+    # 블록은 줄(그리고 티커) 경계에서 끊긴 독립적인 gzip member라서 서로 다른 코어에서 따로 풀 수 있다.
+    def __init__(self, bucket, year, month, day, index):
+        self.bucket = bucket
+        self.object_path = raw_block_gzip_object_path(year, month, day)
+        self.index = index
+        self.blocks = index["blocks"]
+        self.columns = index["header"].split(",")
+
+    @classmethod
+    def open(cls, bucket, year, month, day):
+        index_blob = bucket.get_blob(raw_block_gzip_index_path(year, month, day))
+        if index_blob is None:
+            return None
+        return cls(bucket, year, month, day, json.loads(index_blob.download_as_bytes()))
+
+
+def parse_block(path, offset, length, columns):
+    # 프로세스 풀 워커: 한 member를 읽어 풀고 CSV로 파싱한다.
+    with open(path, "rb") as f:
+        f.seek(offset)
+        data = f.read(length)
+    raw = zlib.decompress(data, wbits=31)
+    return pd.read_csv(io.BytesIO(raw), header=None, names=columns, keep_default_na=False)
+
+
+def iter_block_chunks(local_file, source, workers, start_row=0):
+    # 블록을 여러 프로세스에서 동시에 풀되, 결과는 원본 순서대로 (시작 행, 끝 행, 청크)로 돌려준다.
+    # 앞서 제출하는 블록 수를 워커의 두 배로 제한하여 메모리에 올라오는 청크 수를 묶어 둔다.
+    blocks = [b for b in source.blocks if b["start_row"] + b["rows"] > start_row]
+    pending = deque()
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        position = 0
+        while position < len(blocks) or pending:
+            while position < len(blocks) and len(pending) < workers * 2:
+                block = blocks[position]
+                pending.append((block, executor.submit(parse_block, local_file, block["offset"], block["length"],
+                                                       source.columns)))
+                position += 1
+            block, future = pending.popleft()
+            yield block["start_row"], block["start_row"] + block["rows"], future.result()
@@ -0,0 +1,24 @@
+import threading
+
+
+class ByteBudget:
+    # 처리 중(in-flight)인 데이터의 총 바이트 수를 제한한다.
+    # 예산을 넘기면 acquire가 다른 작업의 release를 기다리므로 생산자(리더)가 자연스럽게 멈춘다.
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self.in_flight = 0
+        self.peak = 0
+        self._cond = threading.Condition()
+
+    def acquire(self, nbytes):
+        with self._cond:
+            # 예산보다 큰 단일 항목도 진행 중인 작업이 없으면 통과시켜 교착을 막는다.
+            while self.in_flight > 0 and self.in_flight + nbytes > self.max_bytes:
+                self._cond.wait()
+            self.in_flight += nbytes
+            self.peak = max(self.peak, self.in_flight)
+
+    def release(self, nbytes):
+        with self._cond:
+            self.in_flight -= nbytes
+            self._cond.notify_all()
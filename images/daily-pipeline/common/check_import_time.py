@@ -0,0 +1,73 @@
+import os
+import sys
+import logging
+import argparse
+import subprocess
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+# 엔트리 모듈을 import하는 것만으로 읽혀서는 안 되는 무거운 의존성 (실제로 쓰는 경로에서 읽는다)
+DEFAULT_FORBIDDEN = "pandas,numpy,pyarrow,google.cloud.storage,google.oauth2.service_account,influxdb_client,aiohttp"
+DEFAULT_BUDGET_MS = int(os.environ.get("IMPORT_TIME_BUDGET_MS", "300"))
+# 시간 예산 초과는 기본적으로 경고만 한다. (QEMU 멀티 아키텍처 빌드처럼 느린 환경에서 빌드가 깨지지 않게)
+# 무거운 의존성을 eager import하는 것은 환경과 무관하므로 항상 실패시킨다.
+STRICT_BUDGET = os.environ.get("IMPORT_TIME_STRICT", "false").lower() == "true"
+
+
+def measure(module):
+    # `python -X importtime`의 stderr를 (self us, cumulative us, 모듈명, 깊이) 목록으로 바꾼다.
+    result = subprocess.run([sys.executable, "-X", "importtime", "-c", f"import {module}"],
+                            capture_output=True, text=True, cwd=os.getcwd())
+    if result.returncode != 0:
+        raise RuntimeError(f"Importing {module} failed:\n{result.stderr[-2000:]}")
+    entries = []
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|", 2)
+        depth = (len(name) - len(name.lstrip()) - 1) // 2
+        entries.append((int(self_us), int(cumulative_us), name.strip(), depth))
+    return entries
+
+
+def check(module, budget_ms, forbidden, strict_budget=False):
+    entries = measure(module)
+    total_ms = sum(cumulative for _, cumulative, _, depth in entries if depth == 0) / 1000
+    imported = {name for _, _, name, _ in entries}
+    violations = sorted(name for name in imported if any(name == f or name.startswith(f + ".") for f in forbidden))
+
+    heaviest = sorted(entries, key=lambda e: e[1], reverse=True)[:10]
+    logger.info(f"Import of {module}: {total_ms:.1f}ms (budget {budget_ms}ms)")
+    for _, cumulative, name, _ in heaviest:
+        logger.info(f"  {cumulative / 1000:8.1f}ms  {name}")
+
+    ok = True
+    if violations:
+        logger.error(f"{module} eagerly imports heavy dependencies: {', '.join(violations[:10])}")
+        ok = False
+    if total_ms > budget_ms:
+        if strict_budget:
+            logger.error(f"{module} import time {total_ms:.1f}ms exceeds budget {budget_ms}ms")
+            ok = False
+        else:
+            logger.warning(f"{module} import time {total_ms:.1f}ms exceeds budget {budget_ms}ms")
+    return ok
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Check that entry modules import lazily and within a time budget")
+    parser.add_argument("modules", nargs="+")
+    parser.add_argument("--budget-ms", type=int, default=DEFAULT_BUDGET_MS)
+    parser.add_argument("--strict-budget", action="store_true", default=STRICT_BUDGET,
+                        help="fail instead of warning when the time budget is exceeded")
+    parser.add_argument("--forbid", default=DEFAULT_FORBIDDEN, help="comma-separated module prefixes")
+    args = parser.parse_args()
+    forbidden = [f.strip() for f in args.forbid.split(",") if f.strip()]
+    results = [check(module, args.budget_ms, forbidden, args.strict_budget) for module in args.modules]
+    if not all(results):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
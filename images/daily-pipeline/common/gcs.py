@@ -0,0 +1,101 @@
+import json
+import os
+import logging
+
+from common.lazy import lazy_import
+
+logger = logging.getLogger(__name__)
+storage = lazy_import("google.cloud.storage")
+service_account = lazy_import("google.oauth2.service_account")
+
+RAW_BUCKET = "goboolean-452007-raw"
+RESAMPLED_BUCKET = "goboolean-452007-resampled"
+
+# resample_ticker가 생성하는 모든 주기 (정규화된 파일은 _norm 접미사를 사용)
+PERIODS = ["1m", "5m", "10m", "15m", "30m", "1h", "4h", "1d"]
+
+
+def get_storage_client():
+    creds_json = os.environ.get("GOOGLE_CREDENTIALS")
+    emulator_host = os.environ.get("STORAGE_EMULATOR_HOST")
+    client_options = {"api_endpoint": emulator_host} if emulator_host else None
+
+    if creds_json:
+        try:
+            credentials = service_account.Credentials.from_service_account_info(json.loads(creds_json))
+            return storage.Client(credentials=credentials, client_options=client_options)
+        except Exception as e:
+            logger.error(f"Failed to parse GOOGLE_CREDENTIALS: {e}")
+    return storage.Client(client_options=client_options)
+
+
+def raw_object_path(year, month, day):
+    return f"stock/usa/{year}/{month}/{year}-{month}-{day}.csv.gz"
+
+
+def ticker_object_path(ticker, period, year, month, day):
+    return f"stock/usa/{ticker}/{period}/{year}/{month}/{ticker}_{year}-{month}-{day}_{period}.csv.gz"
+
+
+def norm_object_path(ticker, period, year, month, day):
+    return ticker_object_path(ticker, f"{period}_norm", year, month, day)
+
+
+def indicator_object_path(ticker, period, year, month, day):
+    return ticker_object_path(ticker, f"{period}_ind", year, month, day)
+
+
+def indicator_state_path(ticker, period, year, month, day):
+    # 그날까지의 마지막 꼬리 행(롤링 윈도우 상태). 다음 거래일의 지표 계산이 이것 하나만 읽는다.
+    return ticker_object_path(ticker, f"{period}_ind_state", year, month, day)
+
+
+def snapshot_object_path(period, year, month, day):
+    # 모든 티커를 담은 주기별 일간 단면 파일. 티커 목록 조회에 섞이지 않도록 stock/ 밖에 둔다.
+    return f"snapshot/usa/{period}_norm/{year}/{month}/{year}-{month}-{day}_{period}_norm.csv.gz"
+
+
+def norm_month_prefix(ticker, period, year, month):
+    return f"stock/usa/{ticker}/{period}_norm/{year}/{month}/"
+
+
+def raw_columnar_object_path(year, month, day):
+    # polygon_to_gcs_daily가 REENCODE_COLUMNAR=true일 때 함께 올리는 티커 순 Parquet 사본
+    return f"stock/usa/{year}/{month}/{year}-{month}-{day}.parquet"
+
+
+def raw_columnar_index_path(year, month, day):
+    return f"{raw_columnar_object_path(year, month, day)}.index.json"
+
+
+def raw_block_gzip_object_path(year, month, day):
+    # polygon_to_gcs_daily가 REENCODE_BLOCK_GZIP=true일 때 함께 올리는 block-gzip 사본
+    return f"stock/usa/{year}/{month}/{year}-{month}-{day}.csv.bgz"
+
+
+def raw_block_gzip_index_path(year, month, day):
+    return f"{raw_block_gzip_object_path(year, month, day)}.index.json"
+
+
+def split_manifest_prefix(year, month, day):
+    return f"_manifests/split_ticker/{year}-{month}-{day}/"
+
+
+def split_manifest_path(year, month, day, shard_index, shard_count):
+    # split_ticker 실행마다 남기는 결과 목록(샤드 없이 돌리면 shard-0-of-1). verify가 모든 샤드를 합쳐
+    # 티커 누락을 확인하고, 내보내기는 이 목록으로 그날 올라간 티커를 찾는다.
+    return f"{split_manifest_prefix(year, month, day)}shard-{shard_index}-of-{shard_count}.json"
+
+
+def minute_cube_object_path(year, month, day):
+    # split_ticker가 SPLIT_CUBE=true일 때 올리는 하루치 (티커, 필드, 분) 고정 격자 배열과 그 인덱스
+    return f"cube/usa/1m/{year}/{month}/{year}-{month}-{day}_1m.cube"
+
+
+def minute_cube_index_path(year, month, day):
+    return f"{minute_cube_object_path(year, month, day)}.json"
+
+
+def priority_signal_path(stage, year, month, day):
+    # 우선순위 티커가 해당 단계를 모두 마쳤을 때 남기는 완료 신호. 전체 완료와 따로 기다릴 수 있다.
+    return f"_signals/priority/{year}-{month}-{day}/{stage}.json"
@@ -0,0 +1,22 @@
+import sys
+import importlib
+import importlib.util
+
+
+def lazy_import(name):
+    # 모듈 객체만 먼저 만들어 두고 실제 import는 속성에 처음 접근할 때 실행한다.
+    # 파드 시작 시 인자 검증 전에 pandas, google-cloud-storage 등을 읽느라 CPU를 쓰지 않게 한다.
+    if name in sys.modules:
+        return sys.modules[name]
+    spec = importlib.util.find_spec(name)
+    if spec is None:
+        raise ImportError(f"No module named '{name}'")
+    loader = importlib.util.LazyLoader(spec.loader)
+    spec.loader = loader
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[name] = module
+    loader.exec_module(module)
+    parent, _, child = name.rpartition(".")
+    if parent:
+        setattr(sys.modules[parent], child, module)
+    return module
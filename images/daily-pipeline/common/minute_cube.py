@@ -0,0 +1,181 @@
+import os
+import json
+import logging
+import threading
+
+from common.lazy import lazy_import
+from common.gcs import minute_cube_object_path, minute_cube_index_path
+from common.request_policy import default_policy
+from common.sliced_download import download_to_filename as sliced_download
+
+logger = logging.getLogger(__name__)
+pd = lazy_import("pandas")
+np = lazy_import("numpy")
+
+# 하루치 1분봉을 (티커, 필드, 분) 격자로 담는 고정 크기 배열. 거래가 없는 분은 NaN이다.
+# 한 티커의 모든 필드가 연속된 바이트이므로 범위 읽기 한 번으로 한 티커를 가져올 수 있고,
+# 로컬에서는 memmap으로 열어 파싱이나 복사 없이 티커 단위로 자르거나 전 티커에 걸친 배열 연산을 한다.
+FIELDS = ["open", "high", "low", "close", "volume", "transactions"]
+# 거래가 있는 분에는 항상 값이 있는 정수 컬럼. 읽을 때 정수로 되돌려 CSV 경로와 같은 결과를 만든다.
+INTEGER_FIELDS = ["volume", "transactions"]
+MINUTES = 1440
+DTYPE = "<f8"
+VERSION = 1
+NS_PER_MINUTE = 60 * 10 ** 9
+
+
+def use_minute_cube():
+    # MINUTE_CUBE_READ=true이면 resample/적재 단계가 티커별 1m CSV 대신 큐브에서 1분봉을 읽는다.
+    return os.environ.get("MINUTE_CUBE_READ", "false").lower() == "true"
+
+
+def day_start_ns(year, month, day):
+    # split의 날짜 필터와 같은 기준(UTC 자정)
+    return int(pd.Timestamp(f"{year}-{month}-{day}").value)
+
+
+def minute_frame(values, start_ns, fields=FIELDS):
+    # values: (필드, 분) 배열 -> split이 올리는 1m 파일과 같은 모양(거래가 있는 분만, window_start 인덱스)
+    open_index = fields.index("open")
+    minutes = np.flatnonzero(~np.isnan(values[open_index]))
+    frame = pd.DataFrame({field: values[i, minutes] for i, field in enumerate(fields)},
+                         index=pd.DatetimeIndex(start_ns + minutes * NS_PER_MINUTE, name="window_start"))
+    for field in INTEGER_FIELDS:
+        if field in frame.columns and not frame[field].isna().any():
+            frame[field] = frame[field].astype("int64")
+    return frame
+
+
+class MinuteCubeWriter:
+    # split 청크마다 티커 순 part를 로컬에 쓰고, 마지막에 원본 순서대로 하나의 큐브 파일로 합친다.
+    # (SnapshotWriter와 같은 방식이므로 원본이 티커 순일 때만 쓴다)
+    def __init__(self, temp_dir, year, month, day):
+        self.base_dir = os.path.join(temp_dir, "minute_cube")
+        self.start_ns = day_start_ns(year, month, day)
+        self._parts = []
+        self._lock = threading.Lock()
+        os.makedirs(self.base_dir, exist_ok=True)
+
+    def add_chunk(self, order_key, chunk):
+        # chunk: 날짜 필터를 거친 원본 행 (window_start는 ns 정수)
+        codes, tickers = pd.factorize(chunk["ticker"], sort=True)
+        minutes = (chunk["window_start"].to_numpy(dtype="int64") - self.start_ns) // NS_PER_MINUTE
+        cube = np.full((len(tickers), len(FIELDS), MINUTES), np.nan, dtype=DTYPE)
+        for i, field in enumerate(FIELDS):
+            if field in chunk.columns:
+                cube[codes, i, minutes] = chunk[field].to_numpy(dtype="float64")
+        path = os.path.join(self.base_dir, f"{order_key:012d}.npy")
+        np.save(path, cube)
+        with self._lock:
+            self._parts.append((order_key, path, list(tickers)))
+
+    def finalize(self, bucket, year, month, day):
+        parts = sorted(self._parts)
+        if not parts:
+            return None
+        tickers = [ticker for _, _, part_tickers in parts for ticker in part_tickers]
+        shape = (len(tickers), len(FIELDS), MINUTES)
+        local_file = os.path.join(self.base_dir, "day.cube")
+        out = np.memmap(local_file, dtype=DTYPE, mode="w+", shape=shape)
+        row = 0
+        for _, path, part_tickers in parts:
+            out[row:row + len(part_tickers)] = np.load(path, mmap_mode="r")
+            row += len(part_tickers)
+            os.remove(path)
+        out.flush()
+        del out
+
+        target_path = minute_cube_object_path(year, month, day)
+        blob = bucket.blob(target_path)
+        # 업로드가 끝나면 로컬 파일을 지우므로 hedge하지 않는다. (남은 요청이 지워진 파일을 읽지 않게)
+        default_policy().call("upload", lambda: blob.upload_from_filename(
+            local_file, content_type="application/octet-stream"), idempotent=False)
+        # 인덱스는 큐브 다음에 올리므로 인덱스가 있으면 큐브도 완성된 상태다.
+        # 큐브의 generation을 남겨 읽는 쪽이 다른 실행이 덮어쓴 큐브와 섞지 않게 한다.
+        index = {"version": VERSION, "date": f"{year}-{month}-{day}", "start_ns": self.start_ns,
+                 "minutes": MINUTES, "dtype": DTYPE, "fields": FIELDS, "shape": list(shape),
+                 "tickers": tickers, "generation": blob.generation}
+        default_policy().call("upload", lambda: bucket.blob(minute_cube_index_path(year, month, day)).upload_from_string(
+            json.dumps(index), content_type="application/json"))
+        nbytes = os.path.getsize(local_file)
+        os.remove(local_file)
+        logger.info(f"Uploaded minute cube ({len(tickers)} tickers, {nbytes} bytes): gs://{bucket.name}/{target_path}")
+        return target_path
+
+
+class MinuteCube:
+    # 로컬 큐브 파일을 memmap으로 연다. 모든 접근은 원본 배열의 view이다.
+    def __init__(self, path, index):
+        self.path = path
+        self.index = index
+        self.fields = index["fields"]
+        self.tickers = index["tickers"]
+        self.start_ns = index["start_ns"]
+        self.rows = {ticker: row for row, ticker in enumerate(self.tickers)}
+        self.array = np.memmap(path, dtype=index["dtype"], mode="r", shape=tuple(index["shape"]))
+
+    @classmethod
+    def open(cls, path):
+        with open(f"{path}.json") as f:
+            return cls(path, json.load(f))
+
+    @classmethod
+    def download(cls, bucket, year, month, day, local_dir):
+        # 큐브 전체를 slice 단위로 받아 로컬에 두고 연다. 같은 generation이 이미 있으면 다시 받지 않는다.
+        index_blob = bucket.get_blob(minute_cube_index_path(year, month, day))
+        if index_blob is None:
+            return None
+        index = json.loads(index_blob.download_as_bytes())
+        path = os.path.join(local_dir, f"{year}-{month}-{day}_{index.get('generation')}.cube")
+        if not os.path.exists(path):
+            blob = bucket.get_blob(minute_cube_object_path(year, month, day))
+            if blob is None or (index.get("generation") is not None and blob.generation != index["generation"]):
+                logger.warning(f"Minute cube for {year}-{month}-{day} does not match its index")
+                return None
+            sliced_download(blob, f"{path}.tmp")
+            os.replace(f"{path}.tmp", path)
+        with open(f"{path}.json", "w") as f:
+            json.dump(index, f)
+        return cls(path, index)
+
+    def __contains__(self, ticker):
+        return ticker in self.rows
+
+    def minute_index(self):
+        return pd.DatetimeIndex(self.start_ns + np.arange(MINUTES) * NS_PER_MINUTE, name="window_start")
+
+    def field(self, name):
+        # (티커, 분) 배열: 전 티커에 걸친 연산용
+        return self.array[:, self.fields.index(name), :]
+
+    def ticker(self, ticker):
+        # (필드, 분) 배열
+        return self.array[self.rows[ticker]]
+
+    def minute_bars(self, ticker):
+        return minute_frame(self.ticker(ticker), self.start_ns, self.fields)
+
+
+def read_ticker_minutes(bucket, year, month, day, ticker):
+    # 큐브 전체를 받지 않고 인덱스와 한 티커의 바이트 범위만 읽는다. 큐브나 티커가 없으면 None.
+    policy = default_policy()
+    try:
+        index = json.loads(policy.call("download", bucket.blob(minute_cube_index_path(year, month, day)).download_as_bytes))
+    except Exception as e:
+        if getattr(e, "code", None) == 404:
+            return None
+        raise
+    try:
+        row = index["tickers"].index(ticker)
+    except ValueError:
+        return None
+    _, fields, minutes = index["shape"]
+    row_bytes = fields * minutes * np.dtype(index["dtype"]).itemsize
+    start = row * row_bytes
+    blob = bucket.blob(minute_cube_object_path(year, month, day))
+    kwargs = {"if_generation_match": index["generation"]} if index.get("generation") is not None else {}
+    data = policy.call("download", lambda: blob.download_as_bytes(start=start, end=start + row_bytes - 1, **kwargs))
+    if len(data) != row_bytes:
+        raise ValueError(f"Short read for {ticker} from minute cube {blob.name}: {len(data)} bytes")
+    values = np.frombuffer(data, dtype=index["dtype"]).reshape(fields, minutes)
+    return minute_frame(values, index["start_ns"], index["fields"])
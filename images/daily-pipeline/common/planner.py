@@ -0,0 +1,163 @@
+import json
+import math
+import logging
+
+from common.gcs import RAW_BUCKET, raw_object_path
+from common.bars import PERIOD_CODES
+from common.sliced_download import MIN_SLICED_BYTES, SLICE_BYTES
+
+logger = logging.getLogger(__name__)
+
+# 측정값이 없을 때 쓰는 처리량 프로파일. 실제 실행의 backfill 체크포인트가 있으면 그 값으로 덮어쓴다.
+DEFAULT_PROFILE = {
+    "raw_bytes_per_row": 22.0,           # 원본 gzip CSV의 행당 바이트
+    "tickers_per_day": 11000,            # 측정된 split 결과가 없을 때의 하루 티커 수
+    "minute_output_ratio": 1.1,          # 티커별 1m 파일 합계 / 원본 크기
+    "norm_output_ratio": 1.6,            # 티커별 _norm 8개 파일 합계 / 1m 파일 크기
+    "split_bytes_per_second": 2000000,   # split 한 유닛이 처리하는 원본 바이트/초
+    "resample_seconds_per_ticker": 0.25,
+    "influx_seconds_per_ticker": 0.5,
+    "class_a_price_per_1000": 0.005,     # USD, Standard 스토리지
+    "class_b_price_per_1000": 0.0004,
+}
+PERIOD_MINUTES = {"min": 1, "h": 60, "d": 1440}
+
+
+def _period_minutes(code):
+    for unit, minutes in PERIOD_MINUTES.items():
+        if code.endswith(unit):
+            return int(code[:-len(unit)] or 1) * minutes
+    raise ValueError(f"Unsupported period code: {code}")
+
+
+# 1분봉 한 행이 InfluxDB 포인트 몇 개가 되는지 (모든 주기 합, 빈 구간 채우기 제외)
+POINTS_PER_ROW = sum(1 / _period_minutes(code) for code in PERIOD_CODES.values())
+
+
+def load_profile(path=None):
+    profile = dict(DEFAULT_PROFILE)
+    if path:
+        with open(path) as f:
+            profile.update(json.load(f))
+    return profile
+
+
+def list_raw_sizes(storage_client, days):
+    # 달마다 한 번 목록을 조회해(Class A 1회) 원본 객체 크기를 얻는다. 데이터는 읽지 않는다.
+    sizes = {}
+    months = sorted({day[:7] for day in days})
+    for month in months:
+        year, mm = month.split("-")
+        for blob in storage_client.list_blobs(RAW_BUCKET, prefix=f"stock/usa/{year}/{mm}/"):
+            sizes[blob.name] = blob.size
+    return {day: sizes.get(raw_object_path(*day.split("-"))) for day in days}, len(months)
+
+
+def measured_profile(profile, checkpoint_entries, raw_sizes):
+    # backfill 체크포인트의 유닛별 소요 시간(seconds)과 티커 수(count)로 처리량을 다시 계산한다.
+    profile = dict(profile)
+    tickers_by_day = {}
+    split_seconds = split_bytes = 0
+    stage_seconds = {"resample": 0.0, "influx": 0.0}
+    stage_tickers = {"resample": 0, "influx": 0}
+    for entry in checkpoint_entries:
+        if entry["stage"] == "split":
+            tickers_by_day[entry["date"]] = len(entry.get("tickers", []))
+            if entry.get("seconds") and raw_sizes.get(entry["date"]):
+                split_seconds += entry["seconds"]
+                split_bytes += raw_sizes[entry["date"]]
+        elif entry.get("seconds") and entry.get("count"):
+            stage_seconds[entry["stage"]] += entry["seconds"]
+            stage_tickers[entry["stage"]] += entry["count"]
+    measured = []
+    if split_seconds:
+        profile["split_bytes_per_second"] = split_bytes / split_seconds
+        measured.append("split")
+    for stage in ("resample", "influx"):
+        if stage_tickers[stage]:
+            profile[f"{stage}_seconds_per_ticker"] = stage_seconds[stage] / stage_tickers[stage]
+            measured.append(stage)
+    if tickers_by_day:
+        profile["tickers_per_day"] = sum(tickers_by_day.values()) / len(tickers_by_day)
+        measured.append("tickers")
+    return profile, tickers_by_day, measured
+
+
+def estimate(days, raw_sizes, profile, tickers_by_day=None, workers=1, max_split=1, shard_size=200,
+             influx=True, list_ops=0):
+    tickers_by_day = tickers_by_day or {}
+    present = [day for day in days if raw_sizes.get(day)]
+    plan = {
+        "days": len(days), "days_with_raw": len(present), "missing_days": [d for d in days if d not in present],
+        "raw_bytes": 0, "tickers": 0, "rows": 0, "objects_written": 0, "bytes_read": 0, "bytes_written": 0,
+        "class_a_ops": list_ops, "class_b_ops": 0, "influx_points": 0, "units": 0,
+        "split_seconds": 0.0, "resample_seconds": 0.0, "influx_seconds": 0.0,
+    }
+    for day in present:
+        raw = raw_sizes[day]
+        tickers = int(tickers_by_day.get(day) or profile["tickers_per_day"])
+        rows = raw / profile["raw_bytes_per_row"]
+        minute_bytes = raw * profile["minute_output_ratio"]
+        norm_bytes = minute_bytes * profile["norm_output_ratio"]
+        shards = math.ceil(tickers / shard_size)
+
+        plan["raw_bytes"] += raw
+        plan["tickers"] += tickers
+        plan["rows"] += rows
+        # split: 원본 메타데이터 + (slice 단위) 다운로드, 티커별 1m 업로드
+        plan["class_b_ops"] += 1 + (math.ceil(raw / SLICE_BYTES) if raw >= MIN_SLICED_BYTES else 1)
+        plan["class_a_ops"] += tickers
+        plan["bytes_read"] += raw
+        plan["bytes_written"] += minute_bytes
+        plan["split_seconds"] += raw / profile["split_bytes_per_second"]
+        # resample: 티커별 존재 확인 + 다운로드, 주기별 _norm과 폴더 플레이스홀더 업로드
+        plan["class_b_ops"] += tickers * 2
+        plan["class_a_ops"] += tickers * len(PERIOD_CODES) * 2
+        plan["bytes_read"] += minute_bytes
+        plan["bytes_written"] += norm_bytes
+        plan["objects_written"] += tickers * (1 + len(PERIOD_CODES) * 2)
+        plan["resample_seconds"] += tickers * profile["resample_seconds_per_ticker"]
+        plan["units"] += 1 + shards
+        if influx:
+            plan["class_b_ops"] += tickers * len(PERIOD_CODES)
+            plan["bytes_read"] += norm_bytes
+            plan["influx_points"] += rows * POINTS_PER_ROW
+            plan["influx_seconds"] += tickers * profile["influx_seconds_per_ticker"]
+            plan["units"] += shards
+
+    plan["cost_usd"] = (plan["class_a_ops"] * profile["class_a_price_per_1000"]
+                        + plan["class_b_ops"] * profile["class_b_price_per_1000"]) / 1000
+    # 벽시계 시간: 전체 작업량을 워커 수로 나눈 값과, 동시에 max_split개만 도는 split의 합 중 큰 쪽
+    work = plan["split_seconds"] + plan["resample_seconds"] + plan["influx_seconds"]
+    plan["work_hours"] = work / 3600
+    plan["wall_hours"] = max(work / max(1, workers), plan["split_seconds"] / max(1, min(max_split, workers))) / 3600
+    for key in ("rows", "bytes_written", "influx_points"):
+        plan[key] = int(plan[key])
+    return plan
+
+
+def pods_for(plan, target_hours):
+    # 주어진 시간 안에 끝내려면 같은 설정의 파드(또는 --shard)를 몇 개로 나눠야 하는지
+    if target_hours <= 0:
+        return None
+    return max(1, math.ceil(plan["wall_hours"] / target_hours))
+
+
+def log_estimate(plan, profile, measured, workers, max_split, target_hours=None):
+    gib = 1024 ** 3
+    logger.info(f"Plan for {plan['days']} days ({plan['days_with_raw']} with raw files, "
+                f"{len(plan['missing_days'])} missing), workers={workers}, max_split={max_split}")
+    logger.info(f"  throughput profile: {'measured ' + ','.join(measured) if measured else 'defaults'} "
+                f"(split {profile['split_bytes_per_second'] / 1024 ** 2:.1f}MB/s, "
+                f"resample {profile['resample_seconds_per_ticker']:.3f}s/ticker, "
+                f"influx {profile['influx_seconds_per_ticker']:.3f}s/ticker)")
+    logger.info(f"  data: {plan['raw_bytes'] / gib:.2f}GiB raw, ~{plan['rows']:,} rows, ~{plan['tickers']:,} ticker-days")
+    logger.info(f"  GCS: read {plan['bytes_read'] / gib:.2f}GiB, write {plan['bytes_written'] / gib:.2f}GiB "
+                f"in ~{plan['objects_written']:,} objects")
+    logger.info(f"  GCS ops: ~{plan['class_a_ops']:,} class A, ~{plan['class_b_ops']:,} class B "
+                f"(~${plan['cost_usd']:.2f})")
+    logger.info(f"  InfluxDB: ~{plan['influx_points']:,} points")
+    logger.info(f"  time: {plan['units']:,} units, {plan['work_hours']:.1f} worker-hours, "
+                f"~{plan['wall_hours']:.1f}h wall on one pod")
+    if target_hours:
+        logger.info(f"  to finish within {target_hours}h: ~{pods_for(plan, target_hours)} pods/shards")
@@ -0,0 +1,47 @@
+import os
+import json
+import time
+import logging
+from functools import lru_cache
+
+from common.gcs import priority_signal_path
+from common.request_policy import default_policy
+
+logger = logging.getLogger(__name__)
+
+# 우선순위 티커가 남아 있는 동안 다른 작업이 쓰지 못하게 비워 두는 워커 수 (backfill)
+PRIORITY_WORKERS = int(os.environ.get("PRIORITY_WORKERS", "1"))
+
+
+@lru_cache(maxsize=1)
+def priority_tickers():
+    # 장 시작에 먼저 필요한 티커 목록. PRIORITY_TICKERS(쉼표 구분)와 PRIORITY_TICKERS_FILE(한 줄에 하나, #은 주석)을 합친다.
+    tickers = {t.strip() for t in os.environ.get("PRIORITY_TICKERS", "").split(",") if t.strip()}
+    path = os.environ.get("PRIORITY_TICKERS_FILE")
+    if path:
+        with open(path) as f:
+            tickers.update(line.strip() for line in f if line.strip() and not line.startswith("#"))
+    return frozenset(tickers)
+
+
+def split_priority(tickers, priority=None):
+    # (우선순위 티커, 나머지)로 나누며 각각 원래 순서를 유지한다.
+    priority = priority_tickers() if priority is None else priority
+    return [t for t in tickers if t in priority], [t for t in tickers if t not in priority]
+
+
+def priority_first(tickers, priority=None):
+    first, rest = split_priority(tickers, priority)
+    return first + rest
+
+
+def publish_priority_done(bucket, stage, year, month, day, tickers, **extra):
+    # 우선순위 티커가 이 단계를 모두 마쳤음을 GCS 객체로 알린다. (Airflow 센서 등이 전체 완료와 따로 기다림)
+    # 실패한 티커가 있으면 호출하지 않으므로 객체가 있으면 그 단계의 우선순위 티커는 모두 완료된 것이다.
+    path = priority_signal_path(stage, year, month, day)
+    signal = {"stage": stage, "date": f"{year}-{month}-{day}", "tickers": sorted(tickers),
+              "completed_at": time.time(), **extra}
+    default_policy().call("upload", lambda: bucket.blob(path).upload_from_string(
+        json.dumps(signal), content_type="application/json"))
+    logger.info(f"Priority tier done for {stage} ({len(tickers)} tickers): gs://{bucket.name}/{path}")
+    return path
@@ -0,0 +1,94 @@
+import json
+import logging
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+from common.lazy import lazy_import
+from common.gcs import raw_columnar_object_path, raw_columnar_index_path
+from common.request_policy import default_policy
+
+logger = logging.getLogger(__name__)
+pd = lazy_import("pandas")
+
+
+class RawColumnarSource:
+    # polygon_to_gcs_daily의 reencode_raw.py가 만든 티커 순 Parquet 사본과 행 그룹 인덱스.
+    # 인덱스: {"rows", "columns", "row_groups": [{"start_row", "rows", "first_ticker", "last_ticker"}],
+    #          "tickers": {ticker: 행 그룹 번호}}
+    # 티커는 행 그룹 하나에만 들어 있으므로 행 그룹이 그대로 split의 청크 경계가 된다.
+    def __init__(self, bucket, year, month, day, index):
+        self.bucket = bucket
+        self.object_path = raw_columnar_object_path(year, month, day)
+        self.index = index
+        self.row_groups = index["row_groups"]
+
+    @classmethod
+    def open(cls, bucket, year, month, day):
+        # 인덱스는 Parquet 파일 다음에 올라가므로 인덱스가 있으면 사본도 완성된 상태다.
+        index_blob = bucket.get_blob(raw_columnar_index_path(year, month, day))
+        if index_blob is None:
+            return None
+        return cls(bucket, year, month, day, json.loads(index_blob.download_as_bytes()))
+
+    def get_blob(self):
+        return self.bucket.get_blob(self.object_path)
+
+    def row_groups_for(self, tickers):
+        return sorted({self.index["tickers"][t] for t in tickers if t in self.index["tickers"]})
+
+    def read_tickers(self, tickers, max_workers=8):
+        # 필요한 행 그룹만 범위 읽기로 동시에 가져온다. (파일 전체를 내려받지 않음)
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        groups = self.row_groups_for(tickers)
+        if not groups:
+            return pd.DataFrame(columns=self.index["columns"])
+
+        def read_group(group):
+            def read():
+                with self.bucket.blob(self.object_path).open("rb") as f:
+                    return pq.ParquetFile(f).read_row_group(group)
+            return default_policy().call("read_row_group", read)
+
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            tables = list(executor.map(read_group, groups))
+        df = pa.concat_tables(tables).to_pandas()
+        logger.info(f"Read {len(groups)} row groups for {len(tickers)} tickers from gs://{self.bucket.name}/"
+                    f"{self.object_path}")
+        return df[df["ticker"].isin(set(tickers))].reset_index(drop=True)
+
+    def iter_row_groups(self, groups, max_workers=8):
+        # 지정한 행 그룹만 범위 읽기로 동시에 가져와 행 그룹 순서대로 (시작 행, 끝 행, 청크)를 돌려준다.
+        # 앞서 요청하는 행 그룹 수를 워커의 두 배로 제한하여 메모리에 올라오는 청크 수를 묶어 둔다.
+        import pyarrow.parquet as pq
+
+        def read_group(group):
+            def read():
+                with self.bucket.blob(self.object_path).open("rb") as f:
+                    return pq.ParquetFile(f).read_row_group(group).to_pandas()
+            return default_policy().call("read_row_group", read)
+
+        pending = deque()
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            position = 0
+            while position < len(groups) or pending:
+                while position < len(groups) and len(pending) < max_workers * 2:
+                    pending.append((groups[position], executor.submit(read_group, groups[position])))
+                    position += 1
+                group, future = pending.popleft()
+                meta = self.row_groups[group]
+                yield meta["start_row"], meta["start_row"] + meta["rows"], future.result()
+
+
+def iter_row_group_chunks(parquet_file, row_groups, start_row=0):
+    # 로컬에 내려받은 사본을 행 그룹 단위로 읽는다. 텍스트 파싱이 없고, 티커가 그룹 경계에 걸치지 않는다.
+    # (시작 행, 끝 행, 청크)를 반환한다.
+    import pyarrow.parquet as pq
+
+    reader = pq.ParquetFile(parquet_file)
+    for group, meta in enumerate(row_groups):
+        end_row = meta["start_row"] + meta["rows"]
+        if end_row <= start_row:
+            continue
+        yield meta["start_row"], end_row, reader.read_row_group(group).to_pandas()
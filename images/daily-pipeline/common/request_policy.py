@@ -0,0 +1,225 @@
+import os
+import time
+import random
+import logging
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+from common.aimd import all_limiters, classify, limiter_for
+
+logger = logging.getLogger(__name__)
+
+RETRYABLE_STATUS = {408, 429, 500, 502, 503, 504}
+
+MAX_ATTEMPTS = int(os.environ.get("GCS_RETRY_ATTEMPTS", "5"))
+BASE_DELAY = float(os.environ.get("GCS_RETRY_BASE_DELAY", "0.2"))
+MAX_DELAY = float(os.environ.get("GCS_RETRY_MAX_DELAY", "10"))
+# 이 분위수보다 오래 걸리는 멱등 요청에는 같은 요청을 하나 더 보낸다. 0이면 hedging을 끈다.
+HEDGE_PERCENTILE = float(os.environ.get("GCS_HEDGE_PERCENTILE", "0.95"))
+# 분위수를 믿을 수 있을 만큼 표본이 모이기 전에는 hedging하지 않는다.
+HEDGE_MIN_SAMPLES = int(os.environ.get("GCS_HEDGE_MIN_SAMPLES", "20"))
+# 분위수가 아주 작을 때(에뮬레이터 등) 거의 모든 요청이 hedge되지 않도록 하는 하한(초)
+HEDGE_MIN_DELAY = float(os.environ.get("GCS_HEDGE_MIN_DELAY", "0.05"))
+HEDGE_WORKERS = int(os.environ.get("GCS_HEDGE_WORKERS", "64"))
+LATENCY_WINDOW = 1000
+
+
+def backoff_delay(attempt, base=BASE_DELAY, maximum=MAX_DELAY):
+    # 지수 백오프 + full jitter. 동시에 실패한 요청들이 같은 시각에 다시 몰리지 않게 한다.
+    return random.uniform(0, min(maximum, base * 2 ** (attempt - 1)))
+
+
+def is_retryable(exc):
+    code = getattr(exc, "code", None)
+    if code is not None:
+        return code in RETRYABLE_STATUS
+    # requests/urllib3의 연결 오류와 타임아웃은 OSError 계열이다.
+    return isinstance(exc, (OSError, TimeoutError))
+
+
+class LatencyStats:
+    # 작업 종류별 최근 지연 시간과 재시도/hedge/실패 횟수
+    def __init__(self, window=LATENCY_WINDOW):
+        self.window = window
+        self._lock = threading.Lock()
+        self._samples = {}
+        self._counters = {}
+
+    def record(self, op, seconds):
+        with self._lock:
+            self._samples.setdefault(op, deque(maxlen=self.window)).append(seconds)
+
+    def count(self, op, name):
+        with self._lock:
+            counters = self._counters.setdefault(op, {"retries": 0, "hedges": 0, "hedge_wins": 0, "failures": 0})
+            counters[name] += 1
+
+    def percentile(self, op, q):
+        with self._lock:
+            samples = sorted(self._samples.get(op, ()))
+        if not samples:
+            return None
+        return samples[min(len(samples) - 1, int(q * len(samples)))]
+
+    def sample_count(self, op):
+        with self._lock:
+            return len(self._samples.get(op, ()))
+
+    def snapshot(self):
+        with self._lock:
+            ops = set(self._samples) | set(self._counters)
+            samples = {op: sorted(self._samples.get(op, ())) for op in ops}
+            counters = {op: dict(self._counters.get(op, {})) for op in ops}
+        result = {}
+        for op in sorted(ops):
+            values = samples[op]
+            stats = {"count": len(values), **counters[op]}
+            if values:
+                for name, q in (("p50", 0.5), ("p90", 0.9), ("p99", 0.99)):
+                    stats[name] = round(values[min(len(values) - 1, int(q * len(values)))], 4)
+                stats["max"] = round(values[-1], 4)
+            result[op] = stats
+        return result
+
+
+class RequestPolicy:
+    # GCS 읽기/쓰기 공통 정책: 재시도(지수 백오프 + jitter)와 꼬리 지연에 대한 hedged request.
+    # fn은 재시도와 hedge로 여러 번, 동시에 호출될 수 있다. 같은 로컬 파일에 내려받는 것처럼
+    # 부수 효과가 겹치는 작업은 idempotent=False로 호출한다.
+    def __init__(self, max_attempts=MAX_ATTEMPTS, hedge_percentile=HEDGE_PERCENTILE,
+                 hedge_min_samples=HEDGE_MIN_SAMPLES, hedge_workers=HEDGE_WORKERS, stats=None):
+        self.max_attempts = max_attempts
+        self.hedge_percentile = hedge_percentile
+        self.hedge_min_samples = hedge_min_samples
+        self.hedge_workers = hedge_workers
+        self.stats = stats if stats is not None else LatencyStats()
+        self._executor = None
+        self._slots = None
+        self._lock = threading.Lock()
+
+    def _get_executor(self):
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=self.hedge_workers,
+                                                    thread_name_prefix="gcs-hedge")
+                # 실행기에 들어간 작업 수를 스레드 수 이하로 유지해 큐에서 기다리는 작업이 없게 한다.
+                self._slots = threading.BoundedSemaphore(self.hedge_workers)
+            return self._executor
+
+    def _submit(self, fn, start_times):
+        # 빈 스레드가 있을 때만 넣는다. 없으면 None (호출한 쪽이 직접 실행하거나 hedge를 건너뜀)
+        executor = self._get_executor()
+        if not self._slots.acquire(blocking=False):
+            return None
+        future = executor.submit(self._run, fn, start_times)
+        future.add_done_callback(lambda _: self._slots.release())
+        return future
+
+    @staticmethod
+    def _run(fn, start_times):
+        # 실제로 시작한 시각을 남겨, 지연 시간에 실행기 대기 시간이 섞이지 않게 한다.
+        start_times.append(time.monotonic())
+        return fn()
+
+    def _hedge_after(self, op, idempotent):
+        if not idempotent or self.hedge_percentile <= 0:
+            return None
+        if self.stats.sample_count(op) < self.hedge_min_samples:
+            return None
+        return max(HEDGE_MIN_DELAY, self.stats.percentile(op, self.hedge_percentile))
+
+    def _timed(self, fn):
+        started = time.monotonic()
+        result = fn()
+        return result, time.monotonic() - started
+
+    def _call_once(self, op, fn, idempotent):
+        threshold = self._hedge_after(op, idempotent)
+        submitted = time.monotonic()
+        start_times = []
+        primary = self._submit(fn, start_times) if threshold is not None else None
+        if primary is None:
+            # hedge 대상이 아니거나 실행기가 가득 찼으면 호출한 스레드에서 바로 실행한다.
+            result, elapsed = self._timed(fn)
+            self.stats.record(op, elapsed)
+            return result
+
+        done, _ = wait([primary], timeout=threshold)
+        started = start_times[0] if start_times else submitted
+        if done:
+            self.stats.record(op, time.monotonic() - started)
+            return primary.result()
+
+        # 임계값을 넘긴 요청: 같은 요청을 하나 더 보내고 먼저 성공한 쪽을 쓴다. 늦은 쪽은 버린다.
+        # 실행기에 빈 스레드가 없으면 hedge 없이 원래 요청을 기다린다.
+        hedge = self._submit(fn, [])
+        if hedge is None:
+            result = primary.result()
+            self.stats.record(op, time.monotonic() - started)
+            return result
+        self.stats.count(op, "hedges")
+        pending = {primary, hedge}
+        error = None
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                if future.exception() is None:
+                    if future is hedge:
+                        self.stats.count(op, "hedge_wins")
+                    self.stats.record(op, time.monotonic() - started)
+                    return future.result()
+                error = future.exception()
+        raise error
+
+    def _call_limited(self, op, fn, idempotent, limiter):
+        # 적응형 한도가 걸린 작업은 자리를 얻은 뒤 보내고, 결과(성공/쓰로틀/오류)와 지연을 한도에 알린다.
+        # 혼잡할 때 요청을 늘리지 않도록 이런 작업에는 hedge를 보내지 않는다.
+        limiter.acquire()
+        started = time.monotonic()
+        error = None
+        try:
+            return self._call_once(op, fn, False)
+        except Exception as e:
+            error = e
+            raise
+        finally:
+            limiter.release(classify(error), time.monotonic() - started)
+
+    def call(self, op, fn, idempotent=True):
+        limiter = limiter_for(op)
+        for attempt in range(1, self.max_attempts + 1):
+            try:
+                if limiter is not None:
+                    return self._call_limited(op, fn, idempotent, limiter)
+                return self._call_once(op, fn, idempotent)
+            except Exception as e:
+                if attempt == self.max_attempts or not is_retryable(e):
+                    # 없는 객체(404)는 호출한 쪽이 정상 흐름으로 처리하므로 실패로 세지 않는다.
+                    if getattr(e, "code", None) != 404:
+                        self.stats.count(op, "failures")
+                    raise
+                self.stats.count(op, "retries")
+                delay = backoff_delay(attempt)
+                logger.warning(f"{op} failed (attempt {attempt}/{self.max_attempts}), retrying in {delay:.2f}s: {e}")
+                time.sleep(delay)
+
+    def log_stats(self):
+        for op, stats in self.stats.snapshot().items():
+            logger.info(f"GCS {op} latency: " + ", ".join(f"{name}={value}" for name, value in stats.items()))
+        for op, limiter in all_limiters().items():
+            logger.info(f"GCS {op} concurrency: " + ", ".join(
+                f"{name}={value}" for name, value in limiter.snapshot().items()))
+
+
+_default_policy = None
+_default_lock = threading.Lock()
+
+
+def default_policy():
+    # 프로세스 안의 모든 GCS 호출이 지연 통계를 공유하도록 하나의 정책을 쓴다.
+    global _default_policy
+    with _default_lock:
+        if _default_policy is None:
+            _default_policy = RequestPolicy()
+        return _default_policy
@@ -0,0 +1,196 @@
+import io
+import os
+import hashlib
+import logging
+import tempfile
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+from common.lazy import lazy_import
+from common.gcs import RESAMPLED_BUCKET, PERIODS, get_storage_client, norm_month_prefix
+from common.bars import ffill_bars
+from common.request_policy import default_policy
+
+logger = logging.getLogger(__name__)
+pd = lazy_import("pandas")
+
+DEFAULT_CACHE_DIR = os.path.join(tempfile.gettempdir(), "goboolean-resampled-cache")
+DEFAULT_CACHE_MAX_BYTES = 2 * 1024 ** 3
+COLUMNS = ["ticker", "window_start", "open", "high", "low", "close", "volume"]
+
+
+class LocalObjectCache:
+    # (bucket, 객체명, generation) 단위로 객체 바이트를 디스크에 보관하는 LRU 캐시.
+    # generation이 키에 포함되므로 객체가 덮어써지면 자연스럽게 새 항목으로 취급된다.
+    def __init__(self, cache_dir=DEFAULT_CACHE_DIR, max_bytes=DEFAULT_CACHE_MAX_BYTES):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+        self._total_bytes = 0
+        os.makedirs(cache_dir, exist_ok=True)
+        self._load()
+
+    def _load(self):
+        # 이전 실행에서 남은 파일을 mtime(마지막 사용 시각) 순서로 복원한다.
+        files = []
+        for name in os.listdir(self.cache_dir):
+            path = os.path.join(self.cache_dir, name)
+            if name.endswith(".tmp") or not os.path.isfile(path):
+                continue
+            stat = os.stat(path)
+            files.append((stat.st_mtime, name, stat.st_size))
+        for _, name, size in sorted(files):
+            self._entries[name] = size
+            self._total_bytes += size
+        self._evict()
+
+    @staticmethod
+    def _key(bucket_name, object_name, generation):
+        return hashlib.sha1(f"{bucket_name}/{object_name}#{generation}".encode("utf-8")).hexdigest()
+
+    def get(self, bucket_name, object_name, generation):
+        key = self._key(bucket_name, object_name, generation)
+        with self._lock:
+            if key not in self._entries:
+                return None
+            self._entries.move_to_end(key)
+        path = os.path.join(self.cache_dir, key)
+        try:
+            with open(path, "rb") as f:
+                data = f.read()
+            os.utime(path)
+            return data
+        except FileNotFoundError:
+            with self._lock:
+                size = self._entries.pop(key, None)
+                if size is not None:
+                    self._total_bytes -= size
+            return None
+
+    def put(self, bucket_name, object_name, generation, data):
+        if len(data) > self.max_bytes:
+            return
+        key = self._key(bucket_name, object_name, generation)
+        path = os.path.join(self.cache_dir, key)
+        tmp_path = f"{path}.{threading.get_ident()}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+        with self._lock:
+            previous = self._entries.pop(key, None)
+            if previous is not None:
+                self._total_bytes -= previous
+            self._entries[key] = len(data)
+            self._total_bytes += len(data)
+            self._evict()
+
+    def _evict(self):
+        while self._total_bytes > self.max_bytes and self._entries:
+            key, size = self._entries.popitem(last=False)
+            self._total_bytes -= size
+            try:
+                os.remove(os.path.join(self.cache_dir, key))
+            except FileNotFoundError:
+                pass
+
+
+def _to_utc_naive(value):
+    # _norm 파일의 window_start는 tz 정보가 없는 UTC 시각으로 저장되어 있다.
+    ts = pd.Timestamp(value)
+    if ts.tzinfo is not None:
+        ts = ts.tz_convert("UTC").tz_localize(None)
+    return ts
+
+
+def _month_range(start, end):
+    year, month = start.year, start.month
+    while (year, month) <= (end.year, end.month):
+        yield f"{year:04d}", f"{month:02d}"
+        year, month = (year + 1, 1) if month == 12 else (year, month + 1)
+
+
+class ResampledReader:
+    # 티커/주기/시간 범위로 resampled 버킷의 _norm 객체를 찾아 동시에 내려받고 하나의 테이블로 합친다.
+    def __init__(self, storage_client=None, bucket_name=RESAMPLED_BUCKET, cache=None, max_workers=16):
+        self.storage_client = storage_client or get_storage_client()
+        self.bucket = self.storage_client.bucket(bucket_name)
+        self.cache = cache if cache is not None else LocalObjectCache()
+        self.max_workers = max_workers
+
+    def covering_objects(self, tickers, period, start, end):
+        # [start, end) 구간을 덮는 일별 객체 목록. 티커-월 단위 목록 조회로 generation까지 함께 얻는다.
+        if period not in PERIODS:
+            raise ValueError(f"Unsupported period: {period}")
+        start, end = _to_utc_naive(start), _to_utc_naive(end)
+        first_day, last_day = start.normalize(), end.normalize()
+        if end == last_day:
+            last_day -= pd.Timedelta(days=1)
+        if last_day < first_day:
+            return []
+
+        prefixes = [
+            (ticker, norm_month_prefix(ticker, period, year, month))
+            for ticker in tickers
+            for year, month in _month_range(first_day, last_day)
+        ]
+
+        def list_prefix(item):
+            ticker, prefix = item
+            found = []
+            for blob in self.storage_client.list_blobs(self.bucket, prefix=prefix):
+                # 파일명 형식: {ticker}_{YYYY-MM-DD}_{period}_norm.csv.gz
+                date_str = blob.name[len(prefix):].split("_")[-3]
+                day = pd.Timestamp(date_str)
+                if first_day <= day <= last_day:
+                    found.append((ticker, day, blob.name, blob.generation))
+            return found
+
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            listed = list(executor.map(list_prefix, prefixes))
+        return sorted(obj for objs in listed for obj in objs)
+
+    def _fetch(self, object_name, generation):
+        data = self.cache.get(self.bucket.name, object_name, generation)
+        if data is None:
+            data = default_policy().call(
+                "download", lambda: self.bucket.blob(object_name, generation=generation).download_as_bytes())
+            self.cache.put(self.bucket.name, object_name, generation, data)
+        return data
+
+    def _load_frame(self, obj):
+        ticker, _, object_name, generation = obj
+        df = pd.read_csv(io.BytesIO(self._fetch(object_name, generation)), compression="gzip")
+        df["window_start"] = pd.to_datetime(df["window_start"])
+        df.insert(0, "ticker", ticker)
+        return df
+
+    def read(self, tickers, period, start, end, as_arrow=False, fill=False):
+        # fill=True: RESAMPLE_FILL=skip으로 저장된 희소한 봉을 읽는 시점에 직전 값으로 채운다.
+        # 격자는 파일에 기록된 세션(session 컬럼)을 따르므로 저장할 때의 RESAMPLE_SESSION과 같은 봉이 나온다.
+        if isinstance(tickers, str):
+            tickers = [tickers]
+        objects = self.covering_objects(tickers, period, start, end)
+        logger.info(f"Reading {len(objects)} {period}_norm objects for {len(tickers)} tickers")
+
+        if objects:
+            with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+                frames = list(executor.map(self._load_frame, objects))
+            df = pd.concat(frames, ignore_index=True)
+            start, end = _to_utc_naive(start), _to_utc_naive(end)
+            df = df[(df["window_start"] >= start) & (df["window_start"] < end)]
+            df = df.sort_values(["ticker", "window_start"], kind="stable").reset_index(drop=True)
+            if fill:
+                df = ffill_bars(df, period)
+        else:
+            df = pd.DataFrame(columns=COLUMNS)
+
+        if as_arrow:
+            import pyarrow as pa
+            return pa.Table.from_pandas(df, preserve_index=False)
+        return df
+
+
+def read_range(tickers, period, start, end, as_arrow=False, fill=False, **kwargs):
+    return ResampledReader(**kwargs).read(tickers, period, start, end, as_arrow=as_arrow, fill=fill)
@@ -0,0 +1,15 @@
+import zlib
+
+
+def in_shard(ticker, shard_index, shard_count):
+    # 프로세스나 파이썬 버전과 관계없이 같은 값을 내는 해시(crc32)로 티커를 샤드에 배정한다.
+    return zlib.crc32(ticker.encode("utf-8")) % shard_count == shard_index
+
+
+def parse_shard(spec):
+    # "i/N" -> (i, N)
+    index, _, count = spec.partition("/")
+    index, count = int(index), int(count)
+    if count < 1 or not 0 <= index < count:
+        raise ValueError(f"Invalid shard {spec}: expected i/N with 0 <= i < N")
+    return index, count
@@ -0,0 +1,86 @@
+import os
+import base64
+import logging
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+from common.lazy import lazy_import
+from common.request_policy import default_policy
+from common.tuner import clamp, cpu_workers, memory_share, tuned_int
+
+logger = logging.getLogger(__name__)
+google_crc32c = lazy_import("google_crc32c")
+
+# 이 크기보다 작은 객체는 한 번에 받는다. (slice로 나눠도 요청 수만 늘어난다)
+MIN_SLICED_BYTES = int(os.environ.get("GCS_SLICED_MIN_BYTES", str(64 * 1024 ** 2)))
+SLICE_BYTES = int(os.environ.get("GCS_SLICE_BYTES", str(32 * 1024 ** 2)))
+# 동시에 받는 slice 수. 메모리에 올라오는 slice는 최대 워커의 두 배이므로 메모리 몫으로도 묶는다.
+SLICE_WORKERS = tuned_int("GCS_SLICE_WORKERS",
+                          clamp(min(cpu_workers(per_cpu=4, minimum=4, maximum=16),
+                                    memory_share(0.25, 64 * 1024 ** 2, 2 * 1024 ** 3) // (SLICE_BYTES * 2)),
+                                1, 16))
+
+
+class SliceError(Exception):
+    pass
+
+
+def slice_ranges(size, slice_bytes=SLICE_BYTES):
+    # [start, end] (end 포함, GCS range 요청과 같은 규약)
+    return [(start, min(start + slice_bytes, size) - 1) for start in range(0, size, slice_bytes)]
+
+
+def _fetch_slice(blob, start, end):
+    # 같은 세대(generation)의 객체에서만 읽어 다운로드 중에 원본이 바뀌어도 섞이지 않게 한다.
+    data = blob.download_as_bytes(start=start, end=end, if_generation_match=blob.generation)
+    if len(data) != end - start + 1:
+        raise SliceError(f"Slice {start}-{end} of {blob.name} returned {len(data)} bytes")
+    return data
+
+
+def iter_slices(blob, slice_bytes=SLICE_BYTES, workers=SLICE_WORKERS):
+    # slice를 여러 스레드에서 동시에 받되 원본 순서대로 돌려준다.
+    # 한 slice는 메모리로 받으므로 hedge로 같은 요청이 두 번 나가도 안전하다.
+    policy = default_policy()
+    ranges = slice_ranges(blob.size, slice_bytes)
+    pending = deque()
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        position = 0
+        while position < len(ranges) or pending:
+            while position < len(ranges) and len(pending) < workers * 2:
+                start, end = ranges[position]
+                pending.append(executor.submit(
+                    policy.call, "download_slice", lambda s=start, e=end: _fetch_slice(blob, s, e)))
+                position += 1
+            yield pending.popleft().result()
+
+
+def expected_crc32c(blob):
+    if not blob.crc32c:
+        return None
+    return int.from_bytes(base64.b64decode(blob.crc32c), "big")
+
+
+def download_to_filename(blob, local_file, slice_bytes=SLICE_BYTES, workers=SLICE_WORKERS):
+    # 큰 객체를 byte range로 나눠 동시에 받아 순서대로 이어 쓴다.
+    # slice마다 길이를 확인하고, 이어 쓰면서 계산한 crc32c를 객체 메타데이터의 crc32c와 비교한다.
+    # (range 응답에는 slice별 체크섬이 없으므로 객체 전체 체크섬으로 검증한다.)
+    if blob.size is None:
+        blob.reload()
+    if blob.size < MIN_SLICED_BYTES or workers <= 1:
+        default_policy().call("download_source", lambda: blob.download_to_filename(local_file), idempotent=False)
+        return
+    checksum = google_crc32c.Checksum()
+    slices = 0
+    with open(local_file, "wb") as out:
+        for data in iter_slices(blob, slice_bytes, workers):
+            checksum.update(data)
+            out.write(data)
+            slices += 1
+    expected = expected_crc32c(blob)
+    actual = int.from_bytes(checksum.digest(), "big")
+    if expected is not None and actual != expected:
+        os.remove(local_file)
+        raise SliceError(f"crc32c mismatch for {blob.name}: expected {expected:08x}, got {actual:08x}")
+    logger.info(f"Downloaded {blob.size} bytes in {slices} slices ({workers} workers): {blob.name}")
+
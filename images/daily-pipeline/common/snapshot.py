@@ -0,0 +1,95 @@
+import os
+import gzip
+import json
+import logging
+import threading
+
+from common.lazy import lazy_import
+from common.bars import PERIOD_CODES, resample_bars
+from common.gcs import snapshot_object_path
+
+logger = logging.getLogger(__name__)
+pd = lazy_import("pandas")
+
+
+def snapshot_periods():
+    # SNAPSHOT_PERIODS: 쉼표로 구분한 주기 목록 또는 all. 비어 있으면 단면 파일을 만들지 않는다.
+    spec = os.environ.get("SNAPSHOT_PERIODS", "").strip()
+    if not spec:
+        return []
+    if spec == "all":
+        return list(PERIOD_CODES)
+    periods = [p.strip() for p in spec.split(",") if p.strip()]
+    for period in periods:
+        if period not in PERIOD_CODES:
+            raise ValueError(f"Unsupported snapshot period: {period}")
+    return periods
+
+
+class SnapshotWriter:
+    # 하루치 모든 티커의 봉을 주기별 파일 하나로 모은다.
+    # 청크마다 티커 순으로 정렬된 part(gzip member)를 로컬에 쓰고, 마지막에 원본 순서대로 이어 붙인다.
+    # gzip member를 이어 붙인 파일도 올바른 gzip이며, 원본이 티커 순이므로 결과도 티커 순이 된다.
+    def __init__(self, temp_dir, periods):
+        self.periods = periods
+        self.base_dir = os.path.join(temp_dir, "snapshot")
+        self._parts = {}
+        self._lock = threading.Lock()
+        for period in periods:
+            os.makedirs(os.path.join(self.base_dir, period), exist_ok=True)
+
+    def add(self, order_key, bars_by_ticker):
+        # bars_by_ticker: {period: [(ticker, bars DataFrame), ...]} (티커 순)
+        for period, items in bars_by_ticker.items():
+            if not items:
+                continue
+            frame = pd.concat([bars.assign(ticker=ticker) for ticker, bars in items], ignore_index=True)
+            columns = ["ticker"] + [c for c in frame.columns if c != "ticker"]
+            path = os.path.join(self.base_dir, period, f"{order_key:012d}.csv.gz")
+            frame[columns].to_csv(path, compression="gzip", index=False, header=False)
+            with self._lock:
+                self._parts.setdefault(period, []).append(
+                    (order_key, path, [(ticker, len(bars)) for ticker, bars in items], columns))
+
+    def add_chunk(self, order_key, chunk):
+        # chunk: 날짜 필터를 거친 원본 행 (date 컬럼이 datetime)
+        bars_by_ticker = {period: [] for period in self.periods}
+        for ticker, group in chunk.groupby("ticker", sort=True):
+            minute_bars = group.set_index("date")[["open", "high", "low", "close", "volume"]].sort_index()
+            minute_bars.index.name = "window_start"
+            for period in self.periods:
+                bars_by_ticker[period].append((ticker, resample_bars(minute_bars, period)))
+        self.add(order_key, bars_by_ticker)
+
+    def finalize(self, bucket, year, month, day):
+        uploaded = []
+        for period in self.periods:
+            parts = sorted(self._parts.get(period, []))
+            if not parts:
+                continue
+            target_path = snapshot_object_path(period, year, month, day)
+            local_file = os.path.join(self.base_dir, f"{period}.csv.gz")
+            index = {"columns": parts[0][3], "tickers": {}, "members": []}
+            row = 0
+            with open(local_file, "wb") as out:
+                out.write(gzip.compress((",".join(parts[0][3]) + "\n").encode("utf-8")))
+                for _, path, tickers, _ in parts:
+                    # 청크별 gzip member의 바이트 위치도 남겨 범위 읽기로 일부 티커만 가져올 수 있게 한다.
+                    offset = out.tell()
+                    with open(path, "rb") as part:
+                        out.write(part.read())
+                    index["members"].append([offset, out.tell() - offset])
+                    member = len(index["members"]) - 1
+                    for ticker, rows in tickers:
+                        index["tickers"][ticker] = [row, rows, member]
+                        row += rows
+                    os.remove(path)
+            index["rows"] = row
+            bucket.blob(target_path).upload_from_filename(local_file, content_type="application/gzip")
+            bucket.blob(f"{target_path[:-len('.csv.gz')]}_index.json").upload_from_string(
+                json.dumps(index), content_type="application/json")
+            os.remove(local_file)
+            logger.info(f"Uploaded {period} snapshot ({len(index['tickers'])} tickers, {row} rows): "
+                        f"gs://{bucket.name}/{target_path}")
+            uploaded.append(target_path)
+        return uploaded
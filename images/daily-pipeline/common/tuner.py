@@ -0,0 +1,113 @@
+import os
+import math
+import logging
+from functools import lru_cache
+
+logger = logging.getLogger(__name__)
+
+CGROUP_ROOT = os.environ.get("CGROUP_ROOT", "/sys/fs/cgroup")
+# cgroup v1에서 제한이 없을 때 memory.limit_in_bytes에 들어 있는 값보다 작은 경계값
+UNLIMITED_MEMORY = 1 << 60
+
+
+def _read(path):
+    try:
+        with open(os.path.join(CGROUP_ROOT, path)) as f:
+            return f.read().strip()
+    except OSError:
+        return None
+
+
+def _host_cpus():
+    try:
+        return len(os.sched_getaffinity(0))
+    except AttributeError:
+        return os.cpu_count() or 1
+
+
+def _host_memory():
+    try:
+        return os.sysconf("SC_PAGE_SIZE") * os.sysconf("SC_PHYS_PAGES")
+    except (ValueError, OSError, AttributeError):
+        return None
+
+
+def cgroup_cpu_limit():
+    # v2: cpu.max = "<quota> <period>" 또는 "max <period>"
+    value = _read("cpu.max")
+    if value:
+        quota, _, period = value.partition(" ")
+        if quota != "max":
+            return int(quota) / int(period or 100000)
+        return None
+    # v1: cpu.cfs_quota_us가 -1이면 제한 없음
+    quota = _read("cpu/cpu.cfs_quota_us") or _read("cpu,cpuacct/cpu.cfs_quota_us")
+    period = _read("cpu/cpu.cfs_period_us") or _read("cpu,cpuacct/cpu.cfs_period_us")
+    if quota and period and int(quota) > 0:
+        return int(quota) / int(period)
+    return None
+
+
+def cgroup_memory_limit():
+    value = _read("memory.max")
+    if value is None:
+        value = _read("memory/memory.limit_in_bytes")
+    if value is None or value == "max" or int(value) >= UNLIMITED_MEMORY:
+        return None
+    return int(value)
+
+
+class ResourceLimits:
+    # 파드에 실제로 할당된 CPU(소수 가능)와 메모리. cgroup 제한이 없으면 호스트 값을 쓴다.
+    def __init__(self, cpus, memory_bytes, source):
+        self.cpus = cpus
+        self.memory_bytes = memory_bytes
+        self.source = source
+
+    @property
+    def workers(self):
+        # CPU 작업용 워커 수: 할당량을 올림하되 최소 1
+        return max(1, math.ceil(self.cpus))
+
+
+@lru_cache(maxsize=1)
+def detect_limits():
+    host_cpus = _host_cpus()
+    cpus = cgroup_cpu_limit()
+    memory = cgroup_memory_limit()
+    source = "cgroup" if cpus is not None or memory is not None else "host"
+    cpus = min(cpus, host_cpus) if cpus is not None else host_cpus
+    host_memory = _host_memory()
+    if memory is None or (host_memory and host_memory < memory):
+        memory = host_memory
+    return ResourceLimits(cpus, memory or 2 * 1024 ** 3, source)
+
+
+def clamp(value, minimum, maximum):
+    return max(minimum, min(maximum, value))
+
+
+def tuned_int(env_name, derived):
+    # 환경변수가 지정되어 있으면 그 값이 항상 우선한다.
+    value = os.environ.get(env_name)
+    return int(value) if value else int(derived)
+
+
+def tuned_float(env_name, derived):
+    value = os.environ.get(env_name)
+    return float(value) if value else float(derived)
+
+
+def cpu_workers(per_cpu=1, minimum=1, maximum=64):
+    return clamp(math.ceil(detect_limits().cpus * per_cpu), minimum, maximum)
+
+
+def memory_share(fraction, minimum, maximum):
+    return int(clamp(detect_limits().memory_bytes * fraction, minimum, maximum))
+
+
+def log_plan(component, **values):
+    limits = detect_limits()
+    settings = ", ".join(f"{name}={value}" for name, value in values.items())
+    logger.info(f"{component} plan ({limits.source}: cpus={limits.cpus:g}, "
+                f"memory={limits.memory_bytes // 1024 ** 2}MB): {settings}")
@@ -0,0 +1,252 @@
+import io
+import os
+import sys
+import logging
+from datetime import date, timedelta
+from concurrent.futures import ThreadPoolExecutor
+
+from common.lazy import lazy_import
+from common.gcs import (get_storage_client, norm_object_path, indicator_object_path, indicator_state_path,
+                        RESAMPLED_BUCKET, PERIODS)
+from common.bars import SESSION_TIMEZONE
+from common.request_policy import default_policy
+from common.tuner import cpu_workers, log_plan, tuned_int
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+pd = lazy_import("pandas")
+np = lazy_import("numpy")
+
+# 계산할 지표: "이름[:기간]"을 쉼표로 구분 (예: sma:20,ema:20,vwap,volatility:20,return)
+INDICATORS = os.environ.get("INDICATORS", "sma:20,ema:20,vwap,volatility:20,return")
+# 롤링 윈도우에 필요한 이전 행을 모을 때 몇 일 전까지 거슬러 올라갈지 (주말/휴장일 포함 달력 기준)
+# 1d 주기는 하루에 한 행이므로 ema:20(60행)을 채우려면 석 달 가까이 필요하다.
+LOOKBACK_DAYS = int(os.environ.get("INDICATOR_LOOKBACK_DAYS", "100"))
+# 전날 계산이 남긴 상태 객체(마지막 꼬리 행)를 읽어 (티커, 주기)마다 GET 한 번으로 꼬리를 잇는다.
+# 상태가 없으면(첫 실행, 전날 실패, 순서 없이 돌린 백필) _norm 파일을 거슬러 올라가며 모은다.
+# 지표 구성을 바꿔 꼬리가 길어졌다면 false로 한 번 돌려 상태를 다시 만든다.
+USE_STATE = os.environ.get("INDICATOR_USE_STATE", "true").lower() == "true"
+# 전 거래일을 찾을 때 거슬러 올라갈 달력 일수 (연휴 포함)
+STATE_LOOKBACK_DAYS = int(os.environ.get("INDICATOR_STATE_LOOKBACK_DAYS", "7"))
+DOWNLOAD_WORKERS = tuned_int("INDICATOR_DOWNLOAD_WORKERS", cpu_workers(per_cpu=8, minimum=4, maximum=64))
+KEYS = ["ticker", "period"]
+
+
+def parse_indicators(spec=INDICATORS):
+    indicators = []
+    for item in spec.split(","):
+        item = item.strip()
+        if not item:
+            continue
+        name, _, window = item.partition(":")
+        if name not in ("sma", "ema", "vwap", "volatility", "return"):
+            raise ValueError(f"Unsupported indicator: {name}")
+        indicators.append((name, int(window) if window else None))
+    return indicators
+
+
+def tail_rows(indicators):
+    # 전날 데이터에서 필요한 꼬리 길이. EMA는 3 × span 정도면 초기값의 영향이 충분히 줄어든다.
+    rows = 1
+    for name, window in indicators:
+        if name == "ema":
+            rows = max(rows, 3 * window)
+        elif window:
+            rows = max(rows, window + 1)
+    return rows
+
+
+def compute(frame, indicators):
+    # 모든 티커 × 주기를 한 프레임에 담아 groupby 연산 한 번씩으로 계산한다.
+    # frame은 (ticker, period, window_start) 순으로 정렬되어 있고 전날 꼬리 행을 포함한다.
+    result = frame[KEYS + ["window_start", "is_today"]].copy()
+    grouped = frame.groupby(KEYS, sort=False)
+    close = frame["close"]
+    for name, window in indicators:
+        if name == "sma":
+            result[f"sma_{window}"] = grouped["close"].rolling(window).mean().reset_index(level=[0, 1], drop=True)
+        elif name == "ema":
+            result[f"ema_{window}"] = grouped["close"].ewm(span=window, adjust=False).mean() \
+                .reset_index(level=[0, 1], drop=True)
+        elif name == "return":
+            result["return"] = grouped["close"].pct_change()
+        elif name == "volatility":
+            log_return = np.log(close).groupby([frame["ticker"], frame["period"]], sort=False).diff()
+            result[f"volatility_{window}"] = log_return.groupby([frame["ticker"], frame["period"]], sort=False) \
+                .rolling(window).std().reset_index(level=[0, 1], drop=True)
+        elif name == "vwap":
+            # VWAP는 거래일마다 새로 시작한다. UTC 자정은 미국 동부 19~20시(연장 거래 시간)라서
+            # 세션 시간대의 날짜로 나눈다.
+            day = frame["window_start"].dt.tz_localize("UTC").dt.tz_convert(SESSION_TIMEZONE) \
+                .dt.tz_localize(None).dt.normalize()
+            typical = (frame["high"] + frame["low"] + close) / 3
+            day_keys = [frame["ticker"], frame["period"], day]
+            cum_pv = (typical * frame["volume"]).groupby(day_keys, sort=False).cumsum()
+            cum_volume = frame["volume"].groupby(day_keys, sort=False).cumsum()
+            result["vwap"] = cum_pv / cum_volume.replace(0, np.nan)
+    return result[result["is_today"]].drop(columns=["is_today"])
+
+
+def download_csv(bucket, path):
+    blob = bucket.blob(path)
+    try:
+        data = default_policy().call("download", blob.download_as_bytes)
+    except Exception as e:
+        # 없는 파일(주말/휴장일)만 건너뛰고, 재시도 후에도 실패한 다운로드는 지표 계산 전체를 실패시킨다.
+        if getattr(e, "code", None) != 404:
+            logger.error(f"Failed to download gs://{bucket.name}/{blob.name}: {e}")
+            raise
+        return None
+    df = pd.read_csv(io.BytesIO(data), compression="gzip")
+    df["window_start"] = pd.to_datetime(df["window_start"])
+    return df
+
+
+def day_parts(day):
+    return f"{day.year:04d}", f"{day.month:02d}", f"{day.day:02d}"
+
+
+def load_norm(bucket, ticker, period, day):
+    return download_csv(bucket, norm_object_path(ticker, period, *day_parts(day)))
+
+
+def load_state(bucket, ticker, period, today):
+    # 전 거래일의 상태 객체를 읽는다. 평일에 상태가 없으면 그날 _norm이 있는지 보고,
+    # 있으면(거래일인데 상태가 없음) None을 돌려 _norm에서 다시 모으게 하고, 없으면(휴장일) 하루 더 거슬러 간다.
+    for offset in range(1, STATE_LOOKBACK_DAYS + 1):
+        day = today - timedelta(days=offset)
+        if day.weekday() >= 5:
+            continue
+        state = download_csv(bucket, indicator_state_path(ticker, period, *day_parts(day)))
+        if state is not None:
+            return state
+        if load_norm(bucket, ticker, period, day) is not None:
+            return None
+    return None
+
+
+def collect_tail(bucket, ticker, period, today, tail):
+    frames = []
+    rows = 0
+    # 이전 거래일들을 거슬러 올라가며 꼬리 행이 tail개 모일 때까지 롤링 윈도우 상태를 이어 붙인다.
+    # (1d/4h처럼 하루 행 수가 적은 주기는 여러 날이 필요하다)
+    for offset in range(1, LOOKBACK_DAYS + 1):
+        if rows >= tail:
+            break
+        previous = load_norm(bucket, ticker, period, today - timedelta(days=offset))
+        if previous is not None and len(previous):
+            frames.append(previous)
+            rows += len(previous)
+    return pd.concat(frames[::-1], ignore_index=True) if frames else None
+
+
+def load_series(bucket, ticker, period, today, tail):
+    current = load_norm(bucket, ticker, period, today)
+    if current is None:
+        return None
+    current["is_today"] = True
+    previous = load_state(bucket, ticker, period, today) if USE_STATE else None
+    if previous is None:
+        previous = collect_tail(bucket, ticker, period, today, tail)
+    frames = []
+    if previous is not None and len(previous):
+        frames = [previous.tail(tail).assign(is_today=False)]
+    frames.append(current)
+    df = pd.concat(frames, ignore_index=True)
+    df.insert(0, "period", period)
+    df.insert(0, "ticker", ticker)
+    return df
+
+
+def build_points(result, indicator_columns):
+    from influxdb_client import Point
+
+    points = []
+    # OHLCV와 같은 series(stock_price, ticker, period)에 지표를 추가 필드로 쓴다.
+    # itertuples는 예약어인 "return" 컬럼 이름을 바꾸므로 컬럼 이름을 그대로 쓰는 records로 읽는다.
+    for row in result[KEYS + ["window_start"] + indicator_columns].to_dict("records"):
+        values = {column: float(row[column]) for column in indicator_columns if pd.notna(row[column])}
+        # 윈도우가 아직 차지 않아 모든 지표가 NaN인 행은 필드가 없으므로 쓰지 않는다.
+        if not values:
+            continue
+        point = Point("stock_price").tag("ticker", row["ticker"]).tag("period", row["period"])
+        for column, value in values.items():
+            point = point.field(column, value)
+        points.append(point.time(int(row["window_start"].value)))
+    return points
+
+
+def write_to_influx(result, indicator_columns):
+    from influxdb_client import InfluxDBClient
+    from influxdb_client.client.write_api import SYNCHRONOUS
+
+    client = InfluxDBClient(url=os.environ["INFLUX_URL"], token=os.environ.get("INFLUX_TOKEN"),
+                            org=os.environ.get("INFLUX_ORG"))
+    try:
+        write_api = client.write_api(write_options=SYNCHRONOUS)
+        points = build_points(result, indicator_columns)
+        write_api.write(bucket=os.environ.get("INFLUX_BUCKET"), record=points)
+        logger.info(f"Wrote {len(points)} indicator points to InfluxDB")
+    finally:
+        client.close()
+
+
+def compute_indicators(year, month, day, tickers):
+    logger.info(f"Computing indicators for {year}-{month}-{day}, {len(tickers)} tickers")
+    log_plan("compute_indicators", download_workers=DOWNLOAD_WORKERS)
+    indicators = parse_indicators()
+    tail = tail_rows(indicators)
+    today = date(int(year), int(month), int(day))
+
+    storage_client = get_storage_client()
+    bucket = storage_client.bucket(RESAMPLED_BUCKET)
+
+    jobs = [(ticker, period) for ticker in tickers for period in PERIODS]
+    with ThreadPoolExecutor(max_workers=DOWNLOAD_WORKERS) as executor:
+        frames = [df for df in executor.map(lambda job: load_series(bucket, *job, today, tail), jobs)
+                  if df is not None]
+    if not frames:
+        logger.error(f"No _norm files found for {year}-{month}-{day}")
+        return False
+
+    frame = pd.concat(frames, ignore_index=True)
+    result = compute(frame, indicators)
+    indicator_columns = [c for c in result.columns if c not in KEYS + ["window_start"]]
+
+    def upload(item):
+        (ticker, period), group = item
+        target_path = indicator_object_path(ticker, period, year, month, day)
+        buffer = io.BytesIO()
+        group.drop(columns=KEYS).to_csv(buffer, compression={"method": "gzip"}, index=False)
+        default_policy().call("upload", lambda: bucket.blob(target_path).upload_from_string(
+            buffer.getvalue(), content_type="application/gzip"))
+        return target_path
+
+    def upload_state(item):
+        # 오늘까지의 마지막 tail개 행을 남겨 다음 거래일이 _norm을 거슬러 올라가지 않게 한다.
+        (ticker, period), group = item
+        target_path = indicator_state_path(ticker, period, year, month, day)
+        buffer = io.BytesIO()
+        group.drop(columns=KEYS + ["is_today"]).tail(tail).to_csv(buffer, compression={"method": "gzip"}, index=False)
+        default_policy().call("upload", lambda: bucket.blob(target_path).upload_from_string(
+            buffer.getvalue(), content_type="application/gzip"))
+        return target_path
+
+    with ThreadPoolExecutor(max_workers=DOWNLOAD_WORKERS) as executor:
+        uploaded = list(executor.map(upload, result.groupby(KEYS, sort=False)))
+        list(executor.map(upload_state, frame.groupby(KEYS, sort=False)))
+    logger.info(f"Uploaded {len(uploaded)} indicator files ({', '.join(indicator_columns)})")
+    default_policy().log_stats()
+
+    if os.environ.get("INFLUX_URL"):
+        write_to_influx(result, indicator_columns)
+    return True
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 5:
+        logger.error("Usage: python compute_indicators.py <year> <month> <day> <ticker> [<ticker> ...]")
+        sys.exit(1)
+    year, month, day = sys.argv[1], sys.argv[2], sys.argv[3]
+    if not compute_indicators(year, month, day, sys.argv[4:]):
+        sys.exit(1)
@@ -0,0 +1,285 @@
+import io
+import os
+import sys
+import time
+import logging
+import tempfile
+import threading
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+# 로컬 실행 시 각 이미지 디렉터리의 엔트리 모듈을 import할 수 있도록 한다. (컨테이너에서는 모두 /app에 복사됨)
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+for module_dir in ("split_ticker", "upload_to_influxdb"):
+    sys.path.insert(0, os.path.join(BASE_DIR, module_dir))
+sys.path.insert(0, BASE_DIR)
+
+from common.lazy import lazy_import
+from common.gcs import get_storage_client, ticker_object_path, norm_object_path, RAW_BUCKET, RESAMPLED_BUCKET
+from common.bars import PERIOD_CODES, resample_bars
+from common.budget import ByteBudget
+from common.async_gcs_writer import AsyncGCSWriter
+from common.request_policy import default_policy
+from common.priority import priority_tickers, publish_priority_done
+from common.sliced_download import download_to_filename as sliced_download
+from common.tuner import cpu_workers, log_plan, memory_share, tuned_int
+from split_ticker import (ChunkSizer, select_source, iter_source_chunks, INITIAL_CHUNK_ROWS, MIN_CHUNK_ROWS,
+                          MAX_CHUNK_ROWS, TARGET_CHUNK_SECONDS)
+from upload_to_influxdb import build_points
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+pd = lazy_import("pandas")
+
+# 중간 산출물의 GCS 저장: all(1m + 모든 _norm), 1m(1m만), none(저장하지 않음)
+PERSIST = os.environ.get("DAY_PERSIST", "all")
+TRANSFORM_WORKERS = tuned_int("DAY_TRANSFORM_WORKERS", cpu_workers(maximum=32))
+MAX_INFLIGHT_BYTES = tuned_int("DAY_MAX_INFLIGHT_BYTES", memory_share(0.25, 64 * 1024 ** 2, 4 * 1024 ** 3))
+INFLUX_WRITE_WORKERS = int(os.environ.get("DAY_INFLUX_WRITE_WORKERS", "4"))
+INFLUX_BATCH_LINES = int(os.environ.get("DAY_INFLUX_BATCH_LINES", "5000"))
+
+
+def to_gzip_csv(df):
+    buffer = io.BytesIO()
+    df.to_csv(buffer, compression={"method": "gzip"}, index=False)
+    return buffer.getvalue()
+
+
+def transform_chunk(chunk, year, month, day, persist, with_lines):
+    # 프로세스 풀 워커: 청크의 티커마다 1m 봉을 모든 주기로 리샘플링하고,
+    # GCS에 남길 gzip CSV와 InfluxDB에 쓸 line protocol을 메모리에서 만든다.
+    started = time.monotonic()
+    dates = pd.to_datetime(chunk["window_start"], unit='ns')
+    chunk = chunk[dates.dt.strftime("%Y-%m-%d") == f"{year}-{month}-{day}"]
+    results = []
+    for ticker, minute in chunk.groupby("ticker"):
+        objects = []
+        if persist in ("all", "1m"):
+            objects.append((ticker_object_path(ticker, "1m", year, month, day), to_gzip_csv(minute)))
+        bars_source = minute.assign(window_start=pd.to_datetime(minute["window_start"], unit='ns')) \
+            .set_index("window_start")
+        lines = []
+        for period in PERIOD_CODES:
+            bars = resample_bars(bars_source, period)
+            if persist == "all":
+                objects.append((norm_object_path(ticker, period, year, month, day), to_gzip_csv(bars)))
+            if with_lines:
+                lines.extend(point.to_line_protocol() for point in build_points(bars, ticker, period))
+        results.append((ticker, objects, lines))
+    return len(chunk), results, time.monotonic() - started
+
+
+class InfluxSink:
+    # line protocol을 배치로 모아 여러 스레드에서 InfluxDB에 쓴다.
+    # 쓰기가 밀리면 add()가 기다리므로 메모리에 쌓이는 배치 수가 제한된다.
+    def __init__(self, url, token, org, bucket, workers=INFLUX_WRITE_WORKERS, batch_lines=INFLUX_BATCH_LINES):
+        from influxdb_client import InfluxDBClient
+        from influxdb_client.client.write_api import SYNCHRONOUS
+
+        self.client = InfluxDBClient(url=url, token=token, org=org)
+        self.write_api = self.client.write_api(write_options=SYNCHRONOUS)
+        self.bucket = bucket
+        self.batch_lines = batch_lines
+        self._executor = ThreadPoolExecutor(max_workers=workers)
+        self._slot_count = workers * 2
+        self._slots = threading.Semaphore(self._slot_count)
+        self._batch = []
+        self.written = 0
+        self.failed = 0
+
+    def _write(self, lines):
+        try:
+            self.write_api.write(bucket=self.bucket, record=lines)
+            self.written += len(lines)
+        except Exception as e:
+            self.failed += len(lines)
+            logger.error(f"Failed to write {len(lines)} lines to InfluxDB: {e}")
+        finally:
+            self._slots.release()
+
+    def _flush(self):
+        if self._batch:
+            self._slots.acquire()
+            self._executor.submit(self._write, self._batch)
+            self._batch = []
+
+    def add(self, lines):
+        for start in range(0, len(lines), self.batch_lines):
+            self._batch.extend(lines[start:start + self.batch_lines])
+            if len(self._batch) >= self.batch_lines:
+                self._flush()
+
+    def drain(self):
+        # 지금까지 넘긴 줄이 모두 쓰일 때까지 기다린다. (쓰기 슬롯을 모두 잡았다 놓음)
+        self._flush()
+        for _ in range(self._slot_count):
+            self._slots.acquire()
+        for _ in range(self._slot_count):
+            self._slots.release()
+
+    def close(self):
+        self._flush()
+        self._executor.shutdown(wait=True)
+        self.client.close()
+
+
+def run_priority_lane(columnar, priority, year, month, day, sink, writer):
+    # Parquet 인덱스로 우선순위 티커가 든 행 그룹만 범위 읽기하여 원본 전체를 받기 전에 변환, 적재, 저장을 마친다.
+    # 모두 성공한 티커를 돌려주며, 본 처리는 이 티커들을 건너뛴다.
+    present = sorted(t for t in priority if t in columnar.index["tickers"])
+    if not present:
+        return set()
+    started = time.monotonic()
+    _, results, _ = transform_chunk(columnar.read_tickers(present), year, month, day, PERSIST, sink is not None)
+    uploads = []
+    failed_before = sink.failed if sink is not None else 0
+    for ticker, objects, lines in results:
+        for path, data in objects:
+            uploads.append((ticker, writer.submit(RESAMPLED_BUCKET, path, data, content_type="application/gzip")))
+        if sink is not None:
+            sink.add(lines)
+    failed = set()
+    for ticker, upload in uploads:
+        try:
+            upload.result()
+        except Exception as e:
+            logger.error(f"Failed to persist intermediate for {ticker}: {e}")
+            failed.add(ticker)
+    if sink is not None:
+        sink.drain()
+        if sink.failed > failed_before:
+            # 어느 티커의 줄이 실패했는지 알 수 없으므로 모두 본 처리에서 다시 쓴다.
+            logger.error("InfluxDB writes failed in the priority lane; retrying priority tickers in the main pass")
+            return set()
+    done = {ticker for ticker, _, _ in results} - failed
+    logger.info(f"Priority lane finished {len(done)}/{len(present)} tickers in {time.monotonic() - started:.1f}s")
+    return done
+
+
+def signal_priority(storage_client, year, month, day, tickers):
+    try:
+        publish_priority_done(storage_client.bucket(RESAMPLED_BUCKET), "day_pipeline", year, month, day, tickers)
+    except Exception as e:
+        logger.error(f"Failed to publish priority signal: {e}")
+
+
+def run_day(year, month, day):
+    logger.info(f"Running fused day pipeline for {year}-{month}-{day} (persist={PERSIST})")
+    log_plan("day_pipeline", transform_workers=TRANSFORM_WORKERS, max_inflight_bytes=MAX_INFLIGHT_BYTES,
+             influx_write_workers=INFLUX_WRITE_WORKERS)
+    storage_client = get_storage_client()
+    source_bucket = storage_client.bucket(RAW_BUCKET)
+
+    source = select_source(source_bucket, year, month, day)
+    if source is None:
+        return None
+    source_path, columnar, block_source = source
+    blob = source_bucket.get_blob(source_path)
+    if blob is None:
+        logger.error(f"File not found: gs://{RAW_BUCKET}/{source_path}")
+        return None
+
+    influx_url = os.environ.get("INFLUX_URL")
+    sink = None
+    if influx_url:
+        sink = InfluxSink(influx_url, os.environ.get("INFLUX_TOKEN"), os.environ.get("INFLUX_ORG"),
+                          os.environ.get("INFLUX_BUCKET"))
+    else:
+        logger.warning("No INFLUX_URL given; the influx stage will be skipped")
+    # 중간 산출물은 비동기로 올려 변환과 InfluxDB 적재를 기다리게 하지 않는다.
+    writer = AsyncGCSWriter() if PERSIST != "none" else None
+
+    all_tickers = set()
+    done_tickers = set()
+    failed_tickers = set()
+    uploads = []
+    total_rows = 0
+    budget = ByteBudget(MAX_INFLIGHT_BYTES)
+    sizer = ChunkSizer(INITIAL_CHUNK_ROWS, MIN_CHUNK_ROWS, MAX_CHUNK_ROWS, MAX_INFLIGHT_BYTES, TRANSFORM_WORKERS,
+                       TARGET_CHUNK_SECONDS)
+
+    def collect(future, rows_in):
+        nonlocal total_rows
+        try:
+            rows, results, elapsed = future.result()
+        except Exception as e:
+            logger.error(f"Failed to transform chunk: {e}")
+            return False
+        sizer.record_process(rows_in, elapsed)
+        total_rows += rows
+        for ticker, objects, lines in results:
+            for path, data in objects:
+                uploads.append((ticker, writer.submit(RESAMPLED_BUCKET, path, data, content_type="application/gzip")))
+            if sink is not None:
+                sink.add(lines)
+            done_tickers.add(ticker)
+        return True
+
+    # 우선순위 티커: Parquet 사본이 있으면 원본을 받기 전에 따로 끝내고 완료 신호를 남긴다.
+    # 사본이 없으면 본 처리가 모두 끝난 뒤 우선순위 티커의 성공 여부로 신호를 남긴다.
+    priority = priority_tickers()
+    priority_done = set()
+    if priority and columnar is not None:
+        priority_done = run_priority_lane(columnar, priority, year, month, day, sink, writer)
+        done_tickers.update(priority_done)
+        if priority_done and priority_done == {t for t in priority if t in columnar.index["tickers"]}:
+            signal_priority(storage_client, year, month, day, priority_done)
+            priority = set()
+
+    ok = True
+    with tempfile.TemporaryDirectory() as temp_dir:
+        local_file = os.path.join(temp_dir, os.path.basename(source_path))
+        sliced_download(blob, local_file)
+
+        try:
+            with ProcessPoolExecutor(max_workers=TRANSFORM_WORKERS) as executor:
+                futures = {}
+                for _, _, chunk in iter_source_chunks(local_file, columnar, block_source, sizer, all_tickers):
+                    if priority_done:
+                        chunk = chunk[~chunk["ticker"].isin(priority_done)]
+                        if chunk.empty:
+                            continue
+                    nbytes = int(chunk.memory_usage(deep=True).sum())
+                    budget.acquire(nbytes)
+                    future = executor.submit(transform_chunk, chunk, year, month, day, PERSIST, sink is not None)
+                    future.add_done_callback(lambda _, n=nbytes: budget.release(n))
+                    futures[future] = len(chunk)
+                    del chunk
+                    for done in [f for f in futures if f.done()]:
+                        ok &= collect(done, futures.pop(done))
+                for future in list(futures):
+                    ok &= collect(future, futures.pop(future))
+        finally:
+            if sink is not None:
+                sink.close()
+            if writer is not None:
+                for ticker, upload in uploads:
+                    try:
+                        upload.result()
+                    except Exception as e:
+                        logger.error(f"Failed to persist intermediate for {ticker}: {e}")
+                        failed_tickers.add(ticker)
+                writer.close()
+
+    logger.info(f"Processed {total_rows} rows, {len(done_tickers)}/{len(all_tickers)} tickers")
+    if writer is not None:
+        logger.info(f"Persisted {writer.uploaded} objects ({writer.failed} failed)")
+    if sink is not None:
+        logger.info(f"Wrote {sink.written} lines to InfluxDB ({sink.failed} failed)")
+        ok &= sink.failed == 0
+    if failed_tickers:
+        logger.warning(f"Tickers with failed uploads: {sorted(failed_tickers)}")
+    ok &= not failed_tickers and done_tickers == all_tickers
+    expected_priority = set(priority) & all_tickers
+    if expected_priority and expected_priority <= done_tickers - failed_tickers and \
+            (sink is None or sink.failed == 0):
+        signal_priority(storage_client, year, month, day, expected_priority)
+    default_policy().log_stats()
+    return sorted(done_tickers) if ok else None
+
+
+if __name__ == "__main__":
+    if len(sys.argv) != 4:
+        logger.error("Usage: python day_pipeline.py <year> <month> <day>")
+        sys.exit(1)
+    if run_day(sys.argv[1], sys.argv[2], sys.argv[3]) is None:
+        sys.exit(1)
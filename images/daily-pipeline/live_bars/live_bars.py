@@ -0,0 +1,424 @@
+import io
+import os
+import sys
+import json
+import time
+import socket
+import logging
+import threading
+from datetime import datetime, timedelta, timezone
+
+# 로컬 실행 시 upload_to_influxdb 모듈을 import할 수 있도록 한다. (컨테이너에서는 모두 /app에 복사됨)
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(BASE_DIR, "upload_to_influxdb"))
+sys.path.insert(0, BASE_DIR)
+
+from common.lazy import lazy_import
+from common.gcs import get_storage_client, norm_object_path, RESAMPLED_BUCKET
+from common.bars import PERIOD_CODES, session_bounds, session_mask
+from common.request_policy import default_policy
+from upload_to_influxdb import MEASUREMENT, FIELDS, build_points, list_tickers
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+pd = lazy_import("pandas")
+influxdb_client = lazy_import("influxdb_client")
+
+# Polygon 분봉 플랫 파일과 같은 컬럼 순서 (헤더 줄이 오면 헤더를 따른다)
+RAW_COLUMNS = ["ticker", "volume", "open", "close", "high", "low", "window_start", "transactions"]
+# 봉 갱신을 모아 두었다가 이 간격 또는 이 줄 수마다 InfluxDB에 쓴다.
+FLUSH_SECONDS = float(os.environ.get("LIVE_FLUSH_SECONDS", "1.0"))
+BATCH_LINES = int(os.environ.get("LIVE_BATCH_LINES", "5000"))
+# 파일 소스: EOF에서 새 줄을 기다리는 간격. LIVE_FOLLOW=false이면 EOF에서 끝낸다.
+POLL_SECONDS = float(os.environ.get("LIVE_POLL_SECONDS", "0.2"))
+FOLLOW = os.environ.get("LIVE_FOLLOW", "true").lower() == "true"
+RECONNECT_SECONDS = float(os.environ.get("LIVE_RECONNECT_SECONDS", "1.0"))
+STATS_SECONDS = float(os.environ.get("LIVE_STATS_SECONDS", "60"))
+# 재조정 시 배치 결과와 비교할 때 허용하는 가격/거래량 오차
+RECONCILE_TOLERANCE = float(os.environ.get("LIVE_RECONCILE_TOLERANCE", "1e-9"))
+
+UNIT_SECONDS = {"min": 60, "h": 3600, "d": 86400}
+
+
+def period_ns(code):
+    # "5min", "1h", "1d" -> 나노초. 모든 주기가 하루를 나누어 떨어지므로 epoch 기준 내림이
+    # resample_ticker(pandas resample, 자정 기준)와 같은 구간 경계를 만든다.
+    for unit, seconds in UNIT_SECONDS.items():
+        if code.endswith(unit):
+            return int(code[:-len(unit)] or 1) * seconds * 1000000000
+    raise ValueError(f"Unsupported period code: {code}")
+
+
+PERIOD_NS = {period: period_ns(code) for period, code in PERIOD_CODES.items()}
+
+
+def parse_bar(line, columns):
+    # 한 줄(CSV 또는 JSON)을 (ticker, window_start ns, open, high, low, close, volume)로 바꾼다.
+    if line.startswith("{"):
+        record = json.loads(line)
+    else:
+        record = dict(zip(columns, line.split(",")))
+    return (record["ticker"], int(record["window_start"]), float(record["open"]), float(record["high"]),
+            float(record["low"]), float(record["close"]), float(record["volume"]))
+
+
+def _iter_lines(lines):
+    # 헤더 줄을 만나면 이후 줄은 그 컬럼 순서로 읽는다.
+    columns = RAW_COLUMNS
+    for line in lines:
+        line = line.strip()
+        if not line:
+            continue
+        if line.startswith("ticker,"):
+            columns = line.split(",")
+            continue
+        try:
+            yield parse_bar(line, columns)
+        except (KeyError, ValueError) as e:
+            logger.warning(f"Skipping malformed line {line[:100]!r}: {e}")
+
+
+def tail_file(path, follow=FOLLOW, poll_seconds=POLL_SECONDS, stop=None):
+    # 로컬 파일을 tail -f처럼 읽는다. 마지막 줄이 아직 다 쓰이지 않았으면 줄바꿈이 올 때까지 기다린다.
+    def lines():
+        with open(path) as f:
+            partial = ""
+            while stop is None or not stop.is_set():
+                chunk = f.readline()
+                if not chunk:
+                    if not follow:
+                        break
+                    time.sleep(poll_seconds)
+                    continue
+                partial += chunk
+                if partial.endswith("\n"):
+                    yield partial
+                    partial = ""
+            if partial:
+                yield partial
+    return _iter_lines(lines())
+
+
+def read_socket(host, port, reconnect_seconds=RECONNECT_SECONDS, stop=None):
+    # 줄 단위(CSV 또는 JSON) 스트림을 보내는 TCP 서버에 붙는다. 연결이 끊기면 다시 붙는다.
+    def lines():
+        while stop is None or not stop.is_set():
+            try:
+                with socket.create_connection((host, port)) as conn, conn.makefile("r") as stream:
+                    logger.info(f"Connected to {host}:{port}")
+                    for line in stream:
+                        yield line
+                        if stop is not None and stop.is_set():
+                            return
+            except OSError as e:
+                logger.warning(f"Connection to {host}:{port} failed: {e}")
+            if not FOLLOW:
+                return
+            time.sleep(reconnect_seconds)
+    return _iter_lines(lines())
+
+
+SOURCES = {
+    "file": lambda target, stop: tail_file(target, stop=stop),
+    "tcp": lambda target, stop: read_socket(*_host_port(target), stop=stop),
+}
+
+
+def _host_port(target):
+    host, _, port = target.rpartition(":")
+    return host or "localhost", int(port)
+
+
+def open_source(spec, stop=None):
+    # spec: "file:/path/to/bars.csv" 또는 "tcp:host:port"
+    kind, _, target = spec.partition(":")
+    if kind not in SOURCES:
+        raise ValueError(f"Unsupported live source: {spec} (expected one of {sorted(SOURCES)})")
+    return SOURCES[kind](target, stop)
+
+
+class RollingBars:
+    # 티커별로 주기마다 아직 닫히지 않은 마지막 구간 하나만 들고 있다.
+    # 새 분봉이 같은 구간이면 그 구간만 갱신하고, 다음 구간이면 이전 구간을 닫고 새로 연다.
+    # 이미 지난 분봉(순서가 뒤바뀐 입력, 중복 전송)은 버리고 세어 둔다. 이런 차이는 EOD 재조정에서 바로잡는다.
+    def __init__(self, periods=PERIOD_CODES, session=None):
+        self.periods = list(periods)
+        self.bounds = session_bounds() if session is None else session_bounds(session)
+        self._state = {}
+        self._last_minute = {}
+        self._in_session = {}
+        self.late = 0
+        self.closed = 0
+
+    def _session_ok(self, period, start):
+        if self.bounds is None:
+            return True
+        key = (period, start)
+        ok = self._in_session.get(key)
+        if ok is None:
+            index = pd.DatetimeIndex([pd.Timestamp(start, unit="ns")])
+            ok = bool(session_mask(index, PERIOD_CODES[period], self.bounds)[0])
+            if len(self._in_session) > 100000:
+                self._in_session.clear()
+            self._in_session[key] = ok
+        return ok
+
+    def update(self, ticker, ts, open_, high, low, close, volume):
+        # 반환값: 갱신된 봉 목록 [(ticker, period, start, [open, high, low, close, volume], closed)]
+        last = self._last_minute.get(ticker)
+        if last is not None and ts <= last:
+            self.late += 1
+            return []
+        self._last_minute[ticker] = ts
+        state = self._state.setdefault(ticker, {})
+        updates = []
+        for period in self.periods:
+            start = ts - ts % PERIOD_NS[period]
+            current = state.get(period)
+            if current is not None and current[0] == start:
+                bar = current[1]
+                bar[1] = max(bar[1], high)
+                bar[2] = min(bar[2], low)
+                bar[3] = close
+                bar[4] += volume
+            else:
+                if current is not None:
+                    self.closed += 1
+                    if self._session_ok(period, current[0]):
+                        updates.append((ticker, period, current[0], list(current[1]), True))
+                bar = [open_, high, low, close, volume]
+                state[period] = (start, bar)
+            if self._session_ok(period, start):
+                updates.append((ticker, period, start, list(bar), False))
+        return updates
+
+    def open_bars(self):
+        return sum(len(state) for state in self._state.values())
+
+
+class LiveInfluxWriter:
+    # 같은 (티커, 주기, 구간) 갱신은 마지막 값 하나로 합쳐 두었다가 배치로 쓴다.
+    # 같은 태그와 시각의 포인트는 InfluxDB에서 덮어쓰이므로 열린 봉을 여러 번 써도 결과는 마지막 값이 된다.
+    def __init__(self, url, token, org, bucket, flush_seconds=FLUSH_SECONDS, batch_lines=BATCH_LINES):
+        from influxdb_client.client.write_api import SYNCHRONOUS
+
+        self.client = influxdb_client.InfluxDBClient(url=url, token=token, org=org)
+        self.write_api = self.client.write_api(write_options=SYNCHRONOUS)
+        self.bucket = bucket
+        self.flush_seconds = flush_seconds
+        self.batch_lines = batch_lines
+        self._pending = {}
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self.written = 0
+        self.failed = 0
+        self.batches = 0
+        self.max_lag = 0.0
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def add(self, updates):
+        with self._lock:
+            for ticker, period, start, values, _ in updates:
+                self._pending[(ticker, period, start)] = values
+            full = len(self._pending) >= self.batch_lines
+        if full:
+            self._wake.set()
+
+    def _points(self, batch):
+        points = []
+        for (ticker, period, start), values in batch.items():
+            point = influxdb_client.Point(MEASUREMENT).tag("ticker", ticker).tag("period", period)
+            for field, value in zip(FIELDS, values):
+                point = point.field(field, float(value))
+            points.append(point.time(start))
+        return points
+
+    def flush(self):
+        with self._lock:
+            batch, self._pending = self._pending, {}
+        if not batch:
+            return
+        newest = max(start for _, _, start in batch) / 1e9
+        try:
+            self.write_api.write(bucket=self.bucket, record=self._points(batch))
+            self.written += len(batch)
+            self.batches += 1
+            # 가장 최근 봉 시작 시각 기준 지연 (1분봉이면 분봉 길이만큼은 항상 포함된다)
+            self.max_lag = max(self.max_lag, time.time() - newest)
+        except Exception as e:
+            self.failed += len(batch)
+            logger.error(f"Failed to write {len(batch)} live bars to InfluxDB: {e}")
+            # 실패한 갱신은 그 사이에 들어온 더 새로운 값이 없을 때만 되돌려 다음 배치에서 다시 쓴다.
+            with self._lock:
+                for key, values in batch.items():
+                    self._pending.setdefault(key, values)
+
+    def _run(self):
+        while not self._stop.is_set():
+            self._wake.wait(self.flush_seconds)
+            self._wake.clear()
+            self.flush()
+
+    def close(self):
+        self._stop.set()
+        self._wake.set()
+        self._thread.join()
+        self.flush()
+        self.client.close()
+
+
+def run_live(source_spec, influx_url, influx_token, influx_org, influx_bucket, stop=None):
+    logger.info(f"Starting live bars from {source_spec} (flush every {FLUSH_SECONDS}s or {BATCH_LINES} bars)")
+    bars = RollingBars()
+    writer = LiveInfluxWriter(influx_url, influx_token, influx_org, influx_bucket)
+    consumed = 0
+    last_stats = time.monotonic()
+    try:
+        for bar in open_source(source_spec, stop):
+            writer.add(bars.update(*bar))
+            consumed += 1
+            if time.monotonic() - last_stats >= STATS_SECONDS:
+                last_stats = time.monotonic()
+                logger.info(f"Live: consumed {consumed} minute bars, {bars.open_bars()} open bars, "
+                            f"{bars.late} late bars dropped, wrote {writer.written} bars in {writer.batches} batches "
+                            f"({writer.failed} failed), max lag {writer.max_lag:.1f}s")
+    finally:
+        writer.close()
+    logger.info(f"Live stream ended: consumed {consumed} minute bars, {bars.late} late bars dropped, "
+                f"wrote {writer.written} bars ({writer.failed} failed)")
+    return writer.failed == 0
+
+
+def _day_range(year, month, day):
+    start = datetime(int(year), int(month), int(day), tzinfo=timezone.utc)
+    return start, start + timedelta(days=1)
+
+
+def _query_live_bars(query_api, influx_bucket, ticker, start, stop):
+    # {(period, ns): {field: value}}
+    flux = (f'from(bucket: "{influx_bucket}") '
+            f'|> range(start: {start.isoformat()}, stop: {stop.isoformat()}) '
+            f'|> filter(fn: (r) => r._measurement == "{MEASUREMENT}" and r.ticker == "{ticker}")')
+    existing = {}
+    for table in query_api.query(flux):
+        for record in table.records:
+            key = (record.values["period"], int(record.get_time().timestamp() * 1000000000))
+            existing.setdefault(key, {})[record.get_field()] = record.get_value()
+    return existing
+
+
+def _point_key_values(point):
+    # build_points가 만든 Point에서 (period, ns)와 필드 값을 꺼낸다. (line protocol을 기준으로 비교)
+    line = point.to_line_protocol()
+    series, fields, ts = line.rsplit(" ", 2)
+    tags = dict(tag.split("=", 1) for tag in series.split(",")[1:])
+    values = {}
+    for field in fields.split(","):
+        name, value = field.split("=", 1)
+        values[name] = float(value.rstrip("i"))
+    return (tags["period"], int(ts)), values
+
+
+def reconcile_ticker(storage_client, query_api, write_api, delete_api, influx_bucket, influx_org,
+                     year, month, day, ticker):
+    # 실시간으로 쓴 봉을 EOD 배치 결과(_norm)와 맞춘다: 배치에만 있거나 값이 다른 봉은 다시 쓰고,
+    # 실시간 쪽에만 있는 봉(배치에서 세션/정정으로 빠진 구간)은 지운다.
+    bucket = storage_client.bucket(RESAMPLED_BUCKET)
+    expected = {}
+    for period in PERIOD_CODES:
+        blob = bucket.blob(norm_object_path(ticker, period, year, month, day))
+        try:
+            data = default_policy().call("download", blob.download_as_bytes)
+        except Exception as e:
+            if getattr(e, "code", None) != 404:
+                raise
+            continue
+        df = pd.read_csv(io.BytesIO(data), compression="gzip")
+        df["window_start"] = pd.to_datetime(df["window_start"])
+        for point in build_points(df, ticker, period):
+            key, values = _point_key_values(point)
+            expected[key] = (point, values)
+    if not expected:
+        return {"missing": 0, "changed": 0, "extra": 0, "skipped": True}
+
+    start, stop = _day_range(year, month, day)
+    existing = _query_live_bars(query_api, influx_bucket, ticker, start, stop)
+    rewrite = []
+    missing = changed = 0
+    for key, (point, values) in expected.items():
+        live = existing.get(key)
+        if live is None:
+            missing += 1
+            rewrite.append(point)
+        elif any(abs(float(live.get(f, float("nan"))) - v) > RECONCILE_TOLERANCE or f not in live
+                 for f, v in values.items()):
+            changed += 1
+            rewrite.append(point)
+    extra = [key for key in existing if key not in expected]
+    if rewrite:
+        write_api.write(bucket=influx_bucket, record=rewrite)
+    for period, ns in extra:
+        moment = datetime.fromtimestamp(ns / 1e9, tz=timezone.utc)
+        delete_api.delete(moment, moment + timedelta(microseconds=1),
+                          f'_measurement="{MEASUREMENT}" AND ticker="{ticker}" AND period="{period}"',
+                          bucket=influx_bucket, org=influx_org)
+    return {"missing": missing, "changed": changed, "extra": len(extra), "skipped": False}
+
+
+def reconcile(year, month, day, influx_url, influx_token, influx_org, influx_bucket, tickers=None):
+    from influxdb_client.client.write_api import SYNCHRONOUS
+
+    storage_client = get_storage_client()
+    tickers = tickers or list_tickers(storage_client, year, month, day)
+    logger.info(f"Reconciling live bars against EOD output for {year}-{month}-{day} ({len(tickers)} tickers)")
+    client = influxdb_client.InfluxDBClient(url=influx_url, token=influx_token, org=influx_org)
+    write_api = client.write_api(write_options=SYNCHRONOUS)
+    totals = {"missing": 0, "changed": 0, "extra": 0, "skipped": 0}
+    failed = []
+    try:
+        for ticker in tickers:
+            try:
+                result = reconcile_ticker(storage_client, client.query_api(), write_api, client.delete_api(),
+                                          influx_bucket, influx_org, year, month, day, ticker)
+            except Exception as e:
+                logger.error(f"Failed to reconcile {ticker}: {e}")
+                failed.append(ticker)
+                continue
+            for name in ("missing", "changed", "extra"):
+                totals[name] += result[name]
+            totals["skipped"] += int(result["skipped"])
+            if result["missing"] or result["changed"] or result["extra"]:
+                logger.info(f"Reconciled {ticker}: {result['missing']} missing, {result['changed']} changed, "
+                            f"{result['extra']} extra bars")
+    finally:
+        client.close()
+    logger.info(f"Reconciliation done: {totals['missing']} missing, {totals['changed']} changed, "
+                f"{totals['extra']} extra bars; {totals['skipped']} tickers without EOD output, "
+                f"{len(failed)} failed")
+    return not failed
+
+
+def _influx_env():
+    values = [os.environ.get(name) for name in ("INFLUX_URL", "INFLUX_TOKEN", "INFLUX_ORG", "INFLUX_BUCKET")]
+    if not all(values):
+        logger.error("INFLUX_URL, INFLUX_TOKEN, INFLUX_ORG and INFLUX_BUCKET must be set")
+        sys.exit(1)
+    return values
+
+
+if __name__ == "__main__":
+    # 사용법: live_bars.py stream <file:/path|tcp:host:port>
+    #        live_bars.py reconcile <year> <month> <day> [<ticker,ticker,...>]
+    if len(sys.argv) == 3 and sys.argv[1] == "stream":
+        ok = run_live(sys.argv[2], *_influx_env())
+    elif len(sys.argv) in (5, 6) and sys.argv[1] == "reconcile":
+        tickers = [t for t in sys.argv[5].split(",") if t] if len(sys.argv) == 6 else None
+        ok = reconcile(sys.argv[2], sys.argv[3], sys.argv[4], *_influx_env(), tickers=tickers)
+    else:
+        logger.error("Usage: python live_bars.py stream <file:/path/to/bars.csv|tcp:host:port>")
+        logger.error("   or: python live_bars.py reconcile <year> <month> <day> [<ticker,ticker,...>]")
+        sys.exit(1)
+    if not ok:
+        sys.exit(1)
@@ -107,7 +107,40 @@ if [ $? -ne 0 ]; then
     exit 1
 fi
 
-rm "/tmp/temp_${DAY_FILE}"
 echo "Successfully transferred ${DAY_FILE}"
 
+# 재인코딩한 사본과 인덱스를 만들어 올린다. 인덱스는 데이터 파일이 올라간 뒤에 올려
+# 인덱스가 있으면 데이터도 있음을 보장한다.
+reencode_and_upload() {
+    local format="$1"
+    local target_file="$2"
+    echo "Re-encoding ${DAY_FILE} -> ${target_file}"
+    python /app/reencode_raw.py "$format" "/tmp/temp_${DAY_FILE}" "/tmp/${target_file}" "/tmp/${target_file}.index.json"
+    if [ $? -ne 0 ]; then
+        echo "Error: re-encoding (${format}) failed for ${DAY_FILE}"
+        exit 1
+    fi
+    gsutil cp "/tmp/${target_file}" "${GCS_PREFIX}${target_file}" > "/tmp/gsutil_${target_file}.log" 2>&1 && \
+        gsutil cp "/tmp/${target_file}.index.json" "${GCS_PREFIX}${target_file}.index.json" >> "/tmp/gsutil_${target_file}.log" 2>&1
+    if [ $? -ne 0 ]; then
+        echo "Error: gsutil cp failed for ${target_file}"
+        cat "/tmp/gsutil_${target_file}.log"
+        exit 1
+    fi
+    rm "/tmp/${target_file}" "/tmp/${target_file}.index.json"
+    echo "Successfully uploaded ${target_file}"
+}
+
+# 선택: 티커 순으로 정렬된 Parquet 사본과 행 그룹 인덱스 (split_ticker가 우선 사용)
+if [ "$REENCODE_COLUMNAR" = "true" ]; then
+    reencode_and_upload parquet "${DAY_FILE%.csv.gz}.parquet"
+fi
+
+# 선택: 독립적인 gzip member로 나눈 block-gzip 사본과 member 오프셋 인덱스 (여러 코어에서 나눠 풀 수 있음)
+if [ "$REENCODE_BLOCK_GZIP" = "true" ]; then
+    reencode_and_upload bgzip "${DAY_FILE%.csv.gz}.csv.bgz"
+fi
+
+rm "/tmp/temp_${DAY_FILE}"
+
 echo "Script completed"
@@ -0,0 +1,124 @@
+import os
+import sys
+import gzip
+import json
+import logging
+import pyarrow as pa
+import pyarrow.csv as pv
+import pyarrow.compute as pc
+import pyarrow.parquet as pq
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+# 행 그룹 하나에 담을 목표 행 수. 티커 경계에서만 자르므로 실제 크기는 조금씩 다르다.
+ROW_GROUP_ROWS = int(os.environ.get("REENCODE_ROW_GROUP_ROWS", "100000"))
+COMPRESSION = os.environ.get("REENCODE_COMPRESSION", "zstd")
+# block-gzip member 하나에 담을 목표 원본 크기(바이트). 티커 경계에서만 자른다.
+BLOCK_BYTES = int(os.environ.get("REENCODE_BLOCK_BYTES", str(8 * 1024 ** 2)))
+BLOCK_LEVEL = int(os.environ.get("REENCODE_BLOCK_LEVEL", "6"))
+
+
+def row_group_bounds(tickers, target_rows):
+    # tickers: 정렬된 ticker 컬럼 (numpy). 티커가 두 행 그룹에 걸치지 않도록 경계를 정한다.
+    bounds = []
+    start = 0
+    total = len(tickers)
+    while start < total:
+        end = min(start + target_rows, total)
+        if end < total:
+            # end 위치의 티커가 끝나는 곳까지 늘린다.
+            last = tickers[end - 1]
+            while end < total and tickers[end] == last:
+                end += 1
+        bounds.append((start, end))
+        start = end
+    return bounds
+
+
+def reencode_parquet(source_file, parquet_file, index_file):
+    table = pv.read_csv(source_file, convert_options=pv.ConvertOptions(
+        column_types={"ticker": pa.string()}, strings_can_be_null=False))
+    logger.info(f"Read {table.num_rows} rows from {source_file}")
+
+    # 티커 순(같은 티커 안에서는 시간 순)으로 정렬해 티커 범위로 행 그룹을 나눌 수 있게 한다.
+    table = table.take(pc.sort_indices(table, sort_keys=[("ticker", "ascending"), ("window_start", "ascending")]))
+    tickers = table.column("ticker").to_numpy(zero_copy_only=False)
+
+    index = {"format": "parquet", "rows": table.num_rows, "columns": table.column_names,
+             "row_groups": [], "tickers": {}}
+    with pq.ParquetWriter(parquet_file, table.schema, compression=COMPRESSION) as writer:
+        for start, end in row_group_bounds(tickers, ROW_GROUP_ROWS):
+            writer.write_table(table.slice(start, end - start), row_group_size=end - start)
+            group = len(index["row_groups"])
+            index["row_groups"].append({"start_row": start, "rows": end - start,
+                                        "first_ticker": tickers[start], "last_ticker": tickers[end - 1]})
+            for ticker in pc.unique(table.column("ticker").slice(start, end - start)).to_pylist():
+                index["tickers"][ticker] = group
+
+    with open(index_file, "w") as f:
+        json.dump(index, f)
+    logger.info(f"Wrote {len(index['row_groups'])} row groups, {len(index['tickers'])} tickers to {parquet_file}")
+
+
+def reencode_block_gzip(source_file, target_file, index_file):
+    # 원본 행 순서를 그대로 두고, 티커 경계에서 끊은 블록마다 독립적인 gzip member로 압축한다.
+    # member를 이어 붙인 파일도 올바른 gzip이므로 기존 도구(zcat, pandas)로도 읽을 수 있다.
+    # 인덱스에는 member의 압축 오프셋/길이와 원본 오프셋/행 수를 남긴다.
+    with gzip.open(source_file, "rb") as src, open(target_file, "wb") as out:
+        header = src.readline()
+        ticker_column = header.decode("utf-8").strip().split(",").index("ticker")
+        index = {"format": "bgzip", "header": header.decode("utf-8").rstrip("\r\n"), "blocks": [],
+                 "rows": 0, "sorted": True}
+        # member 0은 헤더만 담는다.
+        out.write(gzip.compress(header, compresslevel=BLOCK_LEVEL))
+        raw_offset = len(header)
+        seen = set()
+        lines, size, previous = [], 0, None
+
+        def ticker_of(line):
+            return line.split(b",", ticker_column + 1)[ticker_column].decode("utf-8")
+
+        def flush():
+            nonlocal raw_offset, size
+            if not lines:
+                return
+            data = b"".join(lines)
+            offset = out.tell()
+            out.write(gzip.compress(data, compresslevel=BLOCK_LEVEL))
+            index["blocks"].append({"offset": offset, "length": out.tell() - offset, "raw_offset": raw_offset,
+                                    "raw_length": len(data), "start_row": index["rows"], "rows": len(lines),
+                                    "first_ticker": ticker_of(lines[0]), "last_ticker": ticker_of(lines[-1])})
+            index["rows"] += len(lines)
+            raw_offset += len(data)
+            lines.clear()
+            size = 0
+
+        for line in src:
+            ticker = line.split(b",", ticker_column + 1)[ticker_column]
+            if ticker != previous:
+                if previous is not None:
+                    seen.add(previous)
+                    if size >= BLOCK_BYTES:
+                        flush()
+                if ticker in seen:
+                    index["sorted"] = False
+                previous = ticker
+            lines.append(line)
+            size += len(line)
+        flush()
+
+    with open(index_file, "w") as f:
+        json.dump(index, f)
+    logger.info(f"Wrote {len(index['blocks'])} gzip members, {index['rows']} rows to {target_file} "
+                f"(sorted={index['sorted']})")
+
+
+if __name__ == "__main__":
+    if len(sys.argv) != 5 or sys.argv[1] not in ("parquet", "bgzip"):
+        logger.error("Usage: python reencode_raw.py <parquet|bgzip> <source.csv.gz> <target> <target.index.json>")
+        sys.exit(1)
+    if sys.argv[1] == "parquet":
+        reencode_parquet(sys.argv[2], sys.argv[3], sys.argv[4])
+    else:
+        reencode_block_gzip(sys.argv[2], sys.argv[3], sys.argv[4])
@@ -1,103 +1,123 @@
-import json
+import io
 import os
 import sys
-import pandas as pd
-import gzip
-import tempfile
 import logging
-from google.cloud import storage
-from google.oauth2 import service_account
-from google.api_core.client_options import ClientOptions
+from concurrent.futures import ThreadPoolExecutor
+
+from common.lazy import lazy_import
+from common.budget import ByteBudget
+from common.async_gcs_writer import AsyncGCSWriter, use_async_writer
+from common.request_policy import default_policy
+from common.gcs import get_storage_client
+from common.bars import PERIOD_CODES, SESSION, FILL_MODE, resample_bars
+from common.minute_cube import read_ticker_minutes, use_minute_cube
 
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
+# 무거운 의존성은 처음 쓰는 시점에 읽는다. (인자 검증 전 파드 시작 비용을 줄임)
+pd = lazy_import("pandas")
+
+# 주기별 결과를 메모리에서 직렬화해 동시에 올린다. 동시 업로드 수와 메모리에 쌓아 둘 수 있는 총 바이트를 제한한다.
+UPLOAD_CONCURRENCY = int(os.environ.get("RESAMPLE_UPLOAD_CONCURRENCY", "8"))
+MAX_BUFFERED_BYTES = int(os.environ.get("RESAMPLE_MAX_BUFFERED_BYTES", str(64 * 1024 ** 2)))
+
+
+def _upload_period(policy, bucket, norm_folder, target_path, data, budget):
+    try:
+        policy.call("upload", lambda: bucket.blob(norm_folder).upload_from_string(""))
+        policy.call("upload", lambda: bucket.blob(target_path).upload_from_string(data, content_type="application/gzip"))
+    finally:
+        budget.release(len(data))
 
 
 def resample_data(year, month, day, ticker):
     logger.info(f"Processing data for {year}-{month}-{day}, ticker: {ticker}")
-    creds_json = os.environ.get("GOOGLE_CREDENTIALS")
-    emulator_host = os.environ.get("STORAGE_EMULATOR_HOST")
-
-    if creds_json:
-        logger.info("Using GOOGLE_CREDENTIALS from environment")
-        try:
-            credentials = service_account.Credentials.from_service_account_info(json.loads(creds_json))
-            if emulator_host:
-                client_options = ClientOptions(api_endpoint=emulator_host)
-                storage_client = storage.Client(credentials=credentials, client_options=client_options)
-            else:
-                storage_client = storage.Client(credentials=credentials)
-        except Exception as e:
-            logger.error(f"Failed to parse GOOGLE_CREDENTIALS: {e}")
-            storage_client = storage.Client()
-    else:
-        logger.info("No GOOGLE_CREDENTIALS, using default or emulator client")
-        if emulator_host:
-            client_options = ClientOptions(api_endpoint=emulator_host)
-            storage_client = storage.Client(client_options=client_options)
-        else:
-            storage_client = storage.Client()
+    storage_client = get_storage_client()
 
     # split_ticker에서 생성한 원본 1m 파일 경로
     source_bucket_name = "goboolean-452007-resampled"
     source_path = f"stock/usa/{ticker}/1m/{year}/{month}/{ticker}_{year}-{month}-{day}_1m.csv.gz"
 
     source_bucket = storage_client.bucket(source_bucket_name)
-    blob = source_bucket.blob(source_path)
-    if not blob.exists():
-        logger.error(f"File not found: gs://{source_bucket_name}/{source_path}")
-        return
-
-    with tempfile.TemporaryDirectory() as temp_dir:
-        local_file = os.path.join(temp_dir, f"{ticker}_{year}-{month}-{day}_1m.csv.gz")
-        blob.download_to_filename(local_file)
+    policy = default_policy()
+    df = None
+    if use_minute_cube():
+        # 큐브에서 이 티커의 바이트 범위만 읽는다. (CSV 파싱 없음) 큐브나 티커가 없으면 1m 파일로 돌아간다.
+        df = read_ticker_minutes(source_bucket, year, month, day, ticker)
+        if df is None:
+            logger.warning(f"{ticker} not found in minute cube for {year}-{month}-{day}, reading the 1m file")
+    if df is None:
+        blob = source_bucket.blob(source_path)
+        if not blob.exists():
+            logger.error(f"File not found: gs://{source_bucket_name}/{source_path}")
+            return
+
+        # 메모리로 내려받아 느린 요청을 hedge할 때 같은 로컬 파일에 겹쳐 쓰지 않게 한다.
+        data = policy.call("download", blob.download_as_bytes)
 
         # 데이터 로드 및 전처리: 타임스탬프를 인덱스로 사용
-        with gzip.open(local_file, 'rt') as f:
-            df = pd.read_csv(f)
-            df["window_start"] = pd.to_datetime(df["window_start"], unit='ns')
-            df.set_index("window_start", inplace=True)
-
-        # 리샘플링할 주기 정의 (모든 주기에 대해 정규화된 결과 파일을 생성)
-        periods = {
-            "1m": "1min",
-            "5m": "5min",
-            "10m": "10min",
-            "15m": "15min",
-            "30m": "30min",
-            "1h": "1h",
-            "4h": "4h",
-            "1d": "1d"
-        }
-
-        target_bucket = storage_client.bucket(source_bucket_name)
-
-        for period_name, period_code in periods.items():
-            resampled_df = df.resample(period_code).agg({
-                'open': 'first',
-                'high': 'max',
-                'low': 'min',
-                'close': 'last',
-                'volume': 'sum'
-            })
-            # forward filling으로 결측치 보완 (FutureWarning 회피를 위해 .ffill() 사용)
-            resampled_df = resampled_df.ffill().reset_index()
+        df = pd.read_csv(io.BytesIO(data), compression="gzip")
+        df["window_start"] = pd.to_datetime(df["window_start"], unit='ns')
+        df.set_index("window_start", inplace=True)
+
+    logger.info(f"Resample session: {SESSION}, fill mode: {FILL_MODE}")
+
+    target_bucket = storage_client.bucket(source_bucket_name)
+    # 비동기 업로드 엔진 사용 시 모든 주기의 결과를 메모리에서 직렬화하여 한꺼번에 넘긴다.
+    writer = AsyncGCSWriter(concurrency=16) if use_async_writer() else None
+    executor = ThreadPoolExecutor(max_workers=UPLOAD_CONCURRENCY) if writer is None else None
+    budget = ByteBudget(MAX_BUFFERED_BYTES)
+    pending = []
+
+    try:
+        for period_name in PERIOD_CODES:
+            # 세션 캘린더와 채우기 모드는 RESAMPLE_SESSION, RESAMPLE_FILL 환경 변수로 정한다.
+            resampled_df = resample_bars(df, period_name)
 
             # 모든 주기에 대해 "_norm" 접미사를 붙인다.
             normalized_suffix = f"{period_name}_norm"
             # 해당 폴더(플레이스홀더) 생성: GCS는 디렉터리 개념이 없으므로,
             # 빈 blob을 업로드하여 폴더처럼 보이게 할 수 있습니다.
             norm_folder = f"stock/usa/{ticker}/{normalized_suffix}/"
-            dummy_blob = target_bucket.blob(norm_folder)
-            dummy_blob.upload_from_string("")
-
-            local_output = os.path.join(temp_dir, f"{ticker}_{year}-{month}-{day}_{normalized_suffix}.csv.gz")
             target_path = f"stock/usa/{ticker}/{normalized_suffix}/{year}/{month}/{ticker}_{year}-{month}-{day}_{normalized_suffix}.csv.gz"
 
-            resampled_df.to_csv(local_output, compression='gzip', index=False)
-            target_blob = target_bucket.blob(target_path)
-            target_blob.upload_from_filename(local_output)
-            logger.info(f"Resampled ({period_name}) and uploaded: gs://{source_bucket_name}/{target_path}")
+            # 직렬화는 이 스레드에서 하고, 앞서 넘긴 주기의 업로드는 그동안 계속 진행된다.
+            buffer = io.BytesIO()
+            resampled_df.to_csv(buffer, compression={"method": "gzip"}, index=False)
+            output = buffer.getvalue()
+            if writer is not None:
+                pending.append((period_name, target_path, writer.submit(source_bucket_name, norm_folder, b"")))
+                pending.append((period_name, target_path,
+                                writer.submit(source_bucket_name, target_path, output,
+                                              content_type="application/gzip")))
+                continue
+            budget.acquire(len(output))
+            pending.append((period_name, target_path, executor.submit(
+                _upload_period, policy, target_bucket, norm_folder, target_path, output, budget)))
+
+        # 모든 주기가 올라가야 이 티커를 성공으로 본다.
+        failed = set()
+        uploaded = {}
+        for period_name, target_path, future in pending:
+            try:
+                future.result()
+            except Exception as e:
+                logger.error(f"Failed to upload {period_name} for {ticker}: {e}")
+                failed.add(period_name)
+            uploaded[period_name] = target_path
+        for period_name, target_path in uploaded.items():
+            if period_name not in failed:
+                logger.info(f"Resampled ({period_name}) and uploaded: gs://{source_bucket_name}/{target_path}")
+    finally:
+        if executor is not None:
+            executor.shutdown(wait=True)
+        if writer is not None:
+            writer.close()
+    policy.log_stats()
+    if failed:
+        logger.error(f"{ticker}: {len(failed)}/{len(PERIOD_CODES)} periods failed to upload: {sorted(failed)}")
+        return False
+    return True
 
 
 if __name__ == "__main__":
@@ -105,4 +125,5 @@ if __name__ == "__main__":
         logger.error("Usage: python resample_ticker.py <year> <month> <day> <ticker>")
         sys.exit(1)
     year, month, day, ticker = sys.argv[1], sys.argv[2], sys.argv[3], sys.argv[4]
-    resample_data(year, month, day, ticker)
+    if resample_data(year, month, day, ticker) is False:
+        sys.exit(1)
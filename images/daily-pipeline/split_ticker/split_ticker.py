@@ -1,17 +1,184 @@
+import io
 import os
 import sys
 import json
-import pandas as pd
 import gzip
-from google.cloud import storage
-from google.oauth2 import service_account
+import hashlib
 import tempfile
 import logging
+import threading
+import time
 from concurrent.futures import ThreadPoolExecutor, as_completed
-import numpy as np
+
+from common.lazy import lazy_import
+from common.budget import ByteBudget
+from common.async_gcs_writer import AsyncGCSWriter, use_async_writer
+from common.snapshot import SnapshotWriter, snapshot_periods
+from common.minute_cube import MinuteCubeWriter
+from common.raw_columnar import RawColumnarSource, iter_row_group_chunks
+from common.block_gzip import BlockGzipSource, iter_block_chunks
+from common.request_policy import default_policy
+from common.sharding import in_shard, parse_shard
+from common.priority import priority_tickers, publish_priority_done
+from common.gcs import get_storage_client, split_manifest_path, RESAMPLED_BUCKET
+from common.sliced_download import download_to_filename as sliced_download, SLICE_BYTES, SLICE_WORKERS
+from common.tuner import clamp, cpu_workers, log_plan, memory_share, tuned_int
 
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
+# 무거운 의존성은 처음 쓰는 시점에 읽는다. (인자 검증 전 파드 시작 비용을 줄임)
+pd = lazy_import("pandas")
+np = lazy_import("numpy")
+
+# 기본값은 파드의 cgroup CPU/메모리 제한에서 정하고, 환경변수가 있으면 그 값을 쓴다.
+CHUNK_WORKERS = tuned_int("SPLIT_CHUNK_WORKERS", cpu_workers(maximum=16))
+# 업로드는 네트워크 대기가 대부분이므로 CPU당 여러 스레드를 둔다.
+UPLOAD_WORKERS = tuned_int("SPLIT_UPLOAD_WORKERS", cpu_workers(per_cpu=4, minimum=4, maximum=32))
+INITIAL_CHUNK_ROWS = int(os.environ.get("SPLIT_CHUNK_ROWS", "10000"))
+MIN_CHUNK_ROWS = int(os.environ.get("SPLIT_MIN_CHUNK_ROWS", "1000"))
+MAX_INFLIGHT_BYTES = tuned_int("SPLIT_MAX_INFLIGHT_BYTES", memory_share(0.25, 64 * 1024 ** 2, 4 * 1024 ** 3))
+# 워커마다 청크 두 개가 메모리에 올라와도 예산 안에 들도록 한다. (행당 약 512바이트로 추정)
+MAX_CHUNK_ROWS = tuned_int("SPLIT_MAX_CHUNK_ROWS",
+                           clamp(MAX_INFLIGHT_BYTES // (CHUNK_WORKERS * 2 * 512), 10000, 1000000))
+# 청크 하나를 처리하는 데 걸리길 원하는 시간(초). 처리량 측정값과 함께 청크 크기를 정한다.
+TARGET_CHUNK_SECONDS = float(os.environ.get("SPLIT_TARGET_CHUNK_SECONDS", "2.0"))
+CHECKPOINT_ENABLED = os.environ.get("SPLIT_CHECKPOINT", "true").lower() == "true"
+CHECKPOINT_INTERVAL_SECONDS = float(os.environ.get("SPLIT_CHECKPOINT_INTERVAL_SECONDS", "30"))
+# auto: Parquet 사본 → block-gzip 사본 → CSV 순으로 있는 것을 사용 / csv: 항상 CSV
+# parquet, bgzip: 해당 사본만 사용하고 없으면 실패
+SOURCE_FORMAT = os.environ.get("SPLIT_SOURCE_FORMAT", "auto")
+# block-gzip 사본을 풀고 파싱할 프로세스 수
+DECODE_WORKERS = tuned_int("SPLIT_DECODE_WORKERS", cpu_workers(maximum=16))
+# 샤드 모드에서 Parquet 사본의 필요한 행 그룹 비율이 이 값 이하이면 파일 전체 대신 범위 읽기로 그 행 그룹만 가져온다.
+SHARD_RANGE_READ_MAX_FRACTION = float(os.environ.get("SPLIT_SHARD_RANGE_READ_MAX_FRACTION", "0.5"))
+# true이면 티커별 1m 파일과 함께 하루치 (티커, 필드, 분) 큐브 파일을 만든다. (common.minute_cube)
+CUBE_ENABLED = os.environ.get("SPLIT_CUBE", "false").lower() == "true"
+
+
+class SplitCheckpoint:
+    # 재시작 시 남은 작업만 다시 하도록 진행 상황을 작은 GCS 객체에 주기적으로 기록한다.
+    # rows_done: 이 행 번호 이전의 원본 행은 모두 처리 완료(청크가 순서 없이 끝나므로 연속 구간만 인정)
+    # published: 업로드가 끝난 티커. 청크 경계에 걸친 티커는 없으므로 티커 단위로 건너뛸 수 있다.
+    def __init__(self, bucket, year, month, day, source_generation, suffix=""):
+        self.blob = bucket.blob(f"_checkpoints/split_ticker/{year}-{month}-{day}{suffix}.json")
+        self.source_generation = source_generation
+        self.rows_done = 0
+        self.published = set()
+        self.seen = set()
+        self.total_rows = 0
+        self.enabled = CHECKPOINT_ENABLED
+        self.persisted = False
+        self._completed = {}
+        self._last_saved = time.monotonic()
+
+    def load(self):
+        if not self.enabled:
+            return False
+        try:
+            state = json.loads(self.blob.download_as_bytes())
+        except Exception as e:
+            if getattr(e, "code", None) != 404:
+                logger.warning(f"Failed to read checkpoint: {e}")
+            return False
+        if str(state.get("source_generation")) != str(self.source_generation):
+            logger.warning("Checkpoint was written for a different source object; starting from scratch")
+            return False
+        self.rows_done = state["rows_done"]
+        self.published = set(state["published"])
+        self.seen = set(state["seen"])
+        self.total_rows = state["total_rows"]
+        self.persisted = True
+        logger.info(f"Resuming from checkpoint: {self.rows_done} source rows done, "
+                    f"{len(self.published)} tickers already published")
+        return True
+
+    def complete(self, start_row, end_row, rows, tickers):
+        self.published.update(tickers)
+        self.total_rows += rows
+        self._completed[start_row] = end_row
+        while self.rows_done in self._completed:
+            self.rows_done = self._completed.pop(self.rows_done)
+
+    def maybe_save(self, seen):
+        if self.enabled and time.monotonic() - self._last_saved >= CHECKPOINT_INTERVAL_SECONDS:
+            self.save(seen)
+
+    def save(self, seen):
+        state = {
+            "source_generation": self.source_generation,
+            "rows_done": self.rows_done,
+            "published": sorted(self.published),
+            "seen": sorted(self.seen | seen),
+            "total_rows": self.total_rows,
+        }
+        try:
+            self.blob.upload_from_string(json.dumps(state), content_type="application/json")
+            self.persisted = True
+            logger.info(f"Checkpoint saved: {self.rows_done} source rows done, {len(self.published)} tickers published")
+        except Exception as e:
+            logger.warning(f"Failed to save checkpoint: {e}")
+        self._last_saved = time.monotonic()
+
+    def disable(self):
+        self.enabled = False
+        self.clear()
+
+    def clear(self):
+        if not self.persisted:
+            return
+        try:
+            self.blob.delete()
+            self.persisted = False
+        except Exception as e:
+            logger.warning(f"Failed to delete checkpoint: {e}")
+
+
+class ChunkSizer:
+    # 측정된 파싱/업로드 처리량과 메모리 예산으로 다음 청크의 행 수를 정한다.
+    def __init__(self, initial_rows, min_rows, max_rows, max_inflight_bytes, workers, target_seconds):
+        self.rows = initial_rows
+        self.min_rows = min_rows
+        self.max_rows = max_rows
+        self.max_inflight_bytes = max_inflight_bytes
+        self.workers = workers
+        self.target_seconds = target_seconds
+        self.bytes_per_row = None
+        self.parse_rate = None
+        self.process_rate = None
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _ewma(previous, value, alpha=0.3):
+        return value if previous is None else (1 - alpha) * previous + alpha * value
+
+    def record_parse(self, rows, seconds, nbytes):
+        if rows <= 0:
+            return
+        with self._lock:
+            self.bytes_per_row = self._ewma(self.bytes_per_row, nbytes / rows)
+            if seconds > 0:
+                self.parse_rate = self._ewma(self.parse_rate, rows / seconds)
+            self._update()
+
+    def record_process(self, rows, seconds):
+        if rows <= 0 or seconds <= 0:
+            return
+        with self._lock:
+            self.process_rate = self._ewma(self.process_rate, rows / seconds)
+            self._update()
+
+    def _update(self):
+        rows = self.rows
+        if self.process_rate is not None:
+            # 워커 하나가 target_seconds 동안 처리할 수 있는 양
+            rows = self.process_rate * self.target_seconds
+            if self.parse_rate is not None and self.parse_rate < self.process_rate * self.workers:
+                # 파싱이 병목이면 워커는 어차피 놀게 되므로 청크를 키워 청크당 오버헤드를 줄인다.
+                rows *= 2
+        if self.bytes_per_row:
+            # 모든 워커가 청크를 하나씩 들고 있고 하나가 대기 중이어도 예산 안에 들어가야 한다.
+            rows = min(rows, self.max_inflight_bytes / ((self.workers + 1) * self.bytes_per_row))
+        self.rows = int(max(self.min_rows, min(self.max_rows, rows)))
 
 
 def upload_ticker_group(ticker, group, temp_dir, target_bucket, year, month, day, upload_counter):
@@ -26,8 +193,10 @@ def upload_ticker_group(ticker, group, temp_dir, target_bucket, year, month, day
 
     try:
         group.drop(columns=["date", "date_str"]).to_csv(local_output, compression='gzip', index=False)
-        target_blob = target_bucket.blob(target_path)
-        target_blob.upload_from_filename(local_output, content_type="application/gzip")
+        # 일시적인 오류는 재시도한다. 로컬 파일은 finally에서 지우므로, 느린 업로드를 hedge하면
+        # 원래 요청이 끝난 뒤 남은 요청이 지워진 파일을 읽게 된다. 그래서 hedge하지 않는다.
+        default_policy().call("upload", lambda: target_bucket.blob(target_path).upload_from_filename(
+            local_output, content_type="application/gzip"), idempotent=False)
         upload_counter[0] += 1
         if upload_counter[0] % 100 == 0:
             logger.info(f"Uploaded ({upload_counter[0]}th): gs://{target_bucket_name}/{target_path}")
@@ -40,105 +209,459 @@ def upload_ticker_group(ticker, group, temp_dir, target_bucket, year, month, day
             os.remove(local_output)
 
 
-def process_chunk(chunk, temp_dir, target_bucket, year, month, day, total_rows, all_tickers, upload_counter):
+def submit_ticker_group(ticker, group, writer, target_bucket, year, month, day):
+    # 비동기 업로드 엔진 사용 시: 메모리에서 gzip CSV로 직렬화한 뒤 writer에 넘긴다.
+    if ticker is None or (isinstance(ticker, float) and np.isnan(ticker)):
+        logger.warning(f"Skipping upload for invalid ticker: {ticker}")
+        return None
+    period = "1m"
+    target_path = f"stock/usa/{ticker}/{period}/{year}/{month}/{ticker}_{year}-{month}-{day}_{period}.csv.gz"
+    buffer = io.BytesIO()
+    group.drop(columns=["date", "date_str"]).to_csv(buffer, compression={"method": "gzip"}, index=False)
+    return writer.submit(target_bucket.name, target_path, buffer.getvalue(), content_type="application/gzip")
+
+
+def process_chunk(chunk, temp_dir, target_bucket, year, month, day, upload_counter, writer=None, snapshot=None,
+                  order_key=0, cube=None, already_uploaded=None):
     chunk["date"] = pd.to_datetime(chunk["window_start"], unit='ns')
     chunk["date_str"] = chunk["date"].dt.strftime("%Y-%m-%d")
     chunk = chunk[chunk["date_str"] == f"{year}-{month}-{day}"]
     if chunk.empty:
-        return total_rows, set()
+        return 0, set(), set()
 
-    total_rows += len(chunk)
-    logger.info(f"Processed chunk with {len(chunk)} rows, total rows so far: {total_rows}")
+    logger.info(f"Processed chunk with {len(chunk)} rows")
+
+    if snapshot is not None:
+        snapshot.add_chunk(order_key, chunk)
+    if cube is not None:
+        cube.add_chunk(order_key, chunk)
 
     chunk_tickers = set(chunk["ticker"].unique())
-    all_tickers.update(chunk_tickers)
+    rows = len(chunk)
 
     uploaded_tickers = set()
-    with ThreadPoolExecutor(max_workers=8) as executor:
-        futures = [
-            executor.submit(upload_ticker_group, ticker, group, temp_dir, target_bucket, year, month, day,
-                            upload_counter)
-            for ticker, group in chunk.groupby("ticker")
-        ]
+    if already_uploaded:
+        # 우선순위 단계에서 이미 올린 티커는 단면/큐브에만 넣고 다시 올리지 않는다.
+        uploaded_tickers = chunk_tickers & already_uploaded
+        chunk = chunk[~chunk["ticker"].isin(uploaded_tickers)]
+    # 우선순위 티커의 업로드를 먼저 넘겨 청크 안에서도 먼저 끝나게 한다.
+    priority = priority_tickers()
+    groups = sorted(chunk.groupby("ticker"), key=lambda item: item[0] not in priority)
+    if writer is not None:
+        futures = {}
+        for ticker, group in groups:
+            future = submit_ticker_group(ticker, group, writer, target_bucket, year, month, day)
+            if future is not None:
+                futures[future] = ticker
         for future in as_completed(futures):
-            ticker = future.result()
-            if ticker:
-                uploaded_tickers.add(ticker)
+            ticker = futures[future]
+            try:
+                future.result()
+            except Exception as e:
+                logger.error(f"Failed to upload ticker {ticker}: {str(e)}")
+                continue
+            uploaded_tickers.add(ticker)
+            upload_counter[0] += 1
+            if upload_counter[0] % 100 == 0:
+                logger.info(f"Uploaded ({upload_counter[0]}th): {ticker}")
+    else:
+        with ThreadPoolExecutor(max_workers=UPLOAD_WORKERS) as executor:
+            futures = [
+                executor.submit(upload_ticker_group, ticker, group, temp_dir, target_bucket, year, month, day,
+                                upload_counter)
+                for ticker, group in groups
+            ]
+            for future in as_completed(futures):
+                ticker = future.result()
+                if ticker:
+                    uploaded_tickers.add(ticker)
 
     missing_in_chunk = chunk_tickers - uploaded_tickers
     if missing_in_chunk:
         logger.warning(f"Tickers missing in chunk: {missing_in_chunk}")
 
-    return total_rows, uploaded_tickers
+    return rows, uploaded_tickers, missing_in_chunk
+
 
+def process_chunk_timed(chunk, sizer, *args):
+    started = time.monotonic()
+    rows = len(chunk)
+    result = process_chunk(chunk, *args)
+    sizer.record_process(rows, time.monotonic() - started)
+    return result
 
-def process_stock_data(year, month, day):
-    logger.info(f"Processing data for {year}-{month}-{day}")
-    creds_json = os.environ.get("GOOGLE_CREDENTIALS")
-    emulator_host = os.environ.get("STORAGE_EMULATOR_HOST")
 
-    if creds_json:
-        logger.info("Using GOOGLE_CREDENTIALS from environment")
+def iter_ticker_chunks(reader, sizer, all_tickers, start_row=0):
+    # 원본은 티커 순으로 정렬되어 있으므로 청크 경계에 걸친 마지막 티커의 행은 다음 청크로 넘긴다.
+    # 그렇지 않으면 같은 티커가 두 청크에서 따로 업로드되어 뒤의 일부 데이터가 앞의 것을 덮어쓴다.
+    # (시작 행, 끝 행, 청크)를 반환하며 행 번호는 원본 파일 기준(헤더 제외)이다.
+    carry = None
+    position = start_row
+    emitted = start_row
+    while True:
+        started = time.monotonic()
         try:
-            credentials = service_account.Credentials.from_service_account_info(json.loads(creds_json))
-            if emulator_host:
-                storage_client = storage.Client(credentials=credentials, client_options={"api_endpoint": emulator_host})
-            else:
-                storage_client = storage.Client(credentials=credentials)
+            chunk = reader.get_chunk(sizer.rows)
+        except StopIteration:
+            break
+        sizer.record_parse(len(chunk), time.monotonic() - started, int(chunk.memory_usage(deep=True).sum()))
+        all_tickers.update(chunk["ticker"].unique())
+        position += len(chunk)
+
+        if carry is not None:
+            chunk = pd.concat([carry, chunk], ignore_index=True)
+        tail_mask = chunk["ticker"] == chunk["ticker"].iat[-1]
+        carry = chunk[tail_mask]
+        chunk = chunk[~tail_mask].copy()
+        if not chunk.empty:
+            end = position - len(carry)
+            yield emitted, end, chunk
+            emitted = end
+    if carry is not None and not carry.empty:
+        yield emitted, position, carry
+
+
+def iter_csv_chunks(local_gz_file, sizer, all_tickers, start_row=0):
+    with gzip.open(local_gz_file, 'rt') as f:
+        # 체크포인트 이전의 행은 파싱하지 않고 건너뛴다. (헤더는 유지)
+        skiprows = range(1, start_row + 1) if start_row else None
+        reader = pd.read_csv(f, chunksize=sizer.rows, keep_default_na=False, skiprows=skiprows)
+        yield from iter_ticker_chunks(reader, sizer, all_tickers, start_row)
+
+
+def iter_indexed_chunks(chunks, sizer, all_tickers):
+    # Parquet 행 그룹과 block-gzip member는 이미 티커 경계로 나뉘어 있으므로 꼬리 티커를 넘길 필요가 없다.
+    started = time.monotonic()
+    for start, end, chunk in chunks:
+        sizer.record_parse(len(chunk), time.monotonic() - started, int(chunk.memory_usage(deep=True).sum()))
+        all_tickers.update(chunk["ticker"].unique())
+        yield start, end, chunk
+        started = time.monotonic()
+
+
+def select_source(source_bucket, year, month, day):
+    # SPLIT_SOURCE_FORMAT에 따라 읽을 원본 사본을 고른다. (경로, Parquet 소스, block-gzip 소스)
+    # 지정한 형식의 사본이 없으면 None을 반환한다.
+    source_path = f"stock/usa/{year}/{month}/{year}-{month}-{day}.csv.gz"
+    columnar = block_source = None
+    if SOURCE_FORMAT in ("auto", "parquet"):
+        columnar = RawColumnarSource.open(source_bucket, year, month, day)
+        if columnar is None and SOURCE_FORMAT == "parquet":
+            logger.error(f"Columnar copy not found: gs://{source_bucket.name}/{source_path}")
+            return None
+    if columnar is None and SOURCE_FORMAT in ("auto", "bgzip"):
+        block_source = BlockGzipSource.open(source_bucket, year, month, day)
+        if block_source is None and SOURCE_FORMAT == "bgzip":
+            logger.error(f"Block-gzip copy not found: gs://{source_bucket.name}/{source_path}")
+            return None
+
+    if columnar is not None:
+        source_path = columnar.object_path
+        logger.info(f"Using columnar source with {len(columnar.row_groups)} row groups")
+    elif block_source is not None:
+        source_path = block_source.object_path
+        logger.info(f"Using block-gzip source with {len(block_source.blocks)} members, "
+                    f"{DECODE_WORKERS} decode workers")
+    return source_path, columnar, block_source
+
+
+def iter_source_chunks(local_file, columnar, block_source, sizer, all_tickers, start_row=0):
+    if columnar is not None:
+        return iter_indexed_chunks(iter_row_group_chunks(local_file, columnar.row_groups, start_row),
+                                   sizer, all_tickers)
+    if block_source is not None:
+        return iter_indexed_chunks(iter_block_chunks(local_file, block_source, DECODE_WORKERS, start_row),
+                                   sizer, all_tickers)
+    return iter_csv_chunks(local_file, sizer, all_tickers, start_row)
+
+
+def process_priority_lane(columnar, priority, temp_dir, target_bucket, year, month, day, upload_counter, writer):
+    # Parquet 인덱스로 우선순위 티커가 든 행 그룹만 범위 읽기하여 본 처리보다 먼저 올린다.
+    present = sorted(t for t in priority if t in columnar.index["tickers"])
+    if not present:
+        return set()
+    started = time.monotonic()
+    chunk = columnar.read_tickers(present, DECODE_WORKERS)
+    _, uploaded, _ = process_chunk(chunk, temp_dir, target_bucket, year, month, day, upload_counter, writer)
+    logger.info(f"Priority lane uploaded {len(uploaded)}/{len(present)} tickers in "
+                f"{time.monotonic() - started:.1f}s")
+    return uploaded
+
+
+def shard_tickers(tickers, shard):
+    if shard is None:
+        return set(tickers)
+    return {t for t in tickers if isinstance(t, str) and in_shard(t, *shard)}
+
+
+def tickers_digest(tickers):
+    return hashlib.sha1("\n".join(sorted(tickers)).encode("utf-8")).hexdigest()
+
+
+def write_shard_manifest(target_bucket, year, month, day, shard, source_path, source_generation, all_tickers,
+                         uploaded_tickers, total_rows):
+    expected = shard_tickers(all_tickers, shard)
+    manifest = {
+        "shard": shard[0],
+        "shard_count": shard[1],
+        "source_path": source_path,
+        "source_generation": str(source_generation),
+        "source_ticker_count": len(all_tickers),
+        "source_tickers_digest": tickers_digest(all_tickers),
+        "tickers": sorted(expected),
+        "published": sorted(expected & uploaded_tickers),
+        "rows": total_rows,
+    }
+    path = split_manifest_path(year, month, day, *shard)
+    default_policy().call("upload", lambda: target_bucket.blob(path).upload_from_string(
+        json.dumps(manifest), content_type="application/json"))
+    logger.info(f"Wrote shard manifest gs://{target_bucket.name}/{path}")
+
+
+def verify_shards(year, month, day, shard_count):
+    # 모든 샤드의 결과 목록을 합쳐 원본의 모든 티커가 정확히 한 샤드에서 올라갔는지 확인한다.
+    target_bucket = get_storage_client().bucket(RESAMPLED_BUCKET)
+    manifests = {}
+    for index in range(shard_count):
+        path = split_manifest_path(year, month, day, index, shard_count)
+        try:
+            manifests[index] = json.loads(target_bucket.blob(path).download_as_bytes())
         except Exception as e:
-            logger.error(f"Failed to parse GOOGLE_CREDENTIALS: {e}")
-            if emulator_host:
-                storage_client = storage.Client(client_options={"api_endpoint": emulator_host})
-            else:
-                storage_client = storage.Client()
-    else:
-        logger.info("No GOOGLE_CREDENTIALS, using default or emulator client")
-        if emulator_host:
-            storage_client = storage.Client(client_options={"api_endpoint": emulator_host})
-        else:
-            storage_client = storage.Client()
+            if getattr(e, "code", None) != 404:
+                raise
+    ok = True
+    missing_shards = sorted(set(range(shard_count)) - set(manifests))
+    if missing_shards:
+        logger.error(f"Missing manifests for shards {missing_shards} of {shard_count}")
+        ok = False
+    if len({m["source_generation"] for m in manifests.values()}) > 1 or \
+            len({m["source_tickers_digest"] for m in manifests.values()}) > 1:
+        logger.error("Shards were produced from different source objects; rerun all shards")
+        ok = False
+
+    expected = set()
+    published = set()
+    rerun = set()
+    for index, manifest in sorted(manifests.items()):
+        misplaced = [t for t in manifest["tickers"] if not in_shard(t, index, shard_count)]
+        if misplaced:
+            logger.error(f"Shard {index} claims tickers from other shards: {misplaced[:10]}")
+            ok = False
+        expected.update(manifest["tickers"])
+        published.update(manifest["published"])
+        if set(manifest["tickers"]) - set(manifest["published"]):
+            rerun.add(index)
+
+    missing_tickers = expected - published
+    if manifests:
+        source_count = next(iter(manifests.values()))["source_ticker_count"]
+        if not missing_shards and (len(expected) != source_count or
+                                   tickers_digest(expected) != next(iter(manifests.values()))["source_tickers_digest"]):
+            logger.error(f"Shards cover {len(expected)} tickers but the source has {source_count}")
+            ok = False
+    if missing_tickers:
+        logger.error(f"{len(missing_tickers)} tickers were not published: {sorted(missing_tickers)[:20]}")
+        ok = False
+    if rerun or missing_shards:
+        logger.error(f"Rerun shards: {sorted(rerun | set(missing_shards))}")
+    if ok:
+        logger.info(f"All {shard_count} shards verified: {len(published)} tickers published for {year}-{month}-{day}")
+    return ok
+
+
+def process_stock_data(year, month, day, shard=None):
+    logger.info(f"Processing data for {year}-{month}-{day}" + (f" (shard {shard[0]}/{shard[1]})" if shard else ""))
+    log_plan("split_ticker", chunk_workers=CHUNK_WORKERS, upload_workers=UPLOAD_WORKERS,
+             decode_workers=DECODE_WORKERS, max_inflight_bytes=MAX_INFLIGHT_BYTES, max_chunk_rows=MAX_CHUNK_ROWS,
+             slice_bytes=SLICE_BYTES, slice_workers=SLICE_WORKERS)
+    storage_client = get_storage_client()
 
     source_bucket_name = "goboolean-452007-raw"
-    source_path = f"stock/usa/{year}/{month}/{year}-{month}-{day}.csv.gz"
     target_bucket_name = "goboolean-452007-resampled"
     source_bucket = storage_client.bucket(source_bucket_name)
     target_bucket = storage_client.bucket(target_bucket_name)
 
-    blob = source_bucket.blob(source_path)
-    if not blob.exists():
+    source = select_source(source_bucket, year, month, day)
+    if source is None:
+        return []
+    source_path, columnar, block_source = source
+    blob = source_bucket.get_blob(source_path)
+    if blob is None:
         logger.error(f"File not found: gs://{source_bucket_name}/{source_path}")
-        return
+        return []
+
+    suffix = f"_shard-{shard[0]}-of-{shard[1]}" if shard else ""
+    checkpoint = SplitCheckpoint(target_bucket, year, month, day, blob.generation, suffix)
+    checkpoint.load()
+
+    # 샤드 모드에서 Parquet 사본이 있으면 티커 인덱스로 이 샤드에 필요한 행 그룹만 골라 범위 읽기할 수 있다.
+    range_groups = None
+    if shard and columnar is not None:
+        needed = columnar.row_groups_for(shard_tickers(columnar.index["tickers"], shard))
+        if len(needed) <= SHARD_RANGE_READ_MAX_FRACTION * len(columnar.row_groups):
+            range_groups = needed
+            logger.info(f"Range-reading {len(needed)}/{len(columnar.row_groups)} row groups for this shard")
 
     with tempfile.TemporaryDirectory() as temp_dir:
-        local_gz_file = os.path.join(temp_dir, f"{year}-{month}-{day}.csv.gz")
-        logger.info(f"Downloading to: {local_gz_file}")
-        blob.download_to_filename(local_gz_file)
-
-        chunk_size = 10000
-        total_rows = 0
-        all_tickers = set()
-        uploaded_tickers = set()
-        upload_counter = [0]
-
-        with gzip.open(local_gz_file, 'rt') as f:
-            reader = pd.read_csv(f, chunksize=chunk_size, keep_default_na=False)
-            all_tickers = set(pd.concat([chunk['ticker'] for chunk in reader], ignore_index=True).unique())
-            logger.info(f"Total unique tickers in source file: {len(all_tickers)}")
-
-            f.seek(0)
-            with ThreadPoolExecutor(max_workers=4) as executor:
-                futures = []
-                for chunk in pd.read_csv(f, chunksize=chunk_size, keep_default_na=False):
-                    futures.append(
-                        executor.submit(process_chunk, chunk, temp_dir, target_bucket, year, month, day, total_rows,
-                                        all_tickers, upload_counter)
-                    )
-                    total_rows += len(chunk)
+        local_file = os.path.join(temp_dir, os.path.basename(source_path))
+
+        total_rows = checkpoint.total_rows
+        all_tickers = set(checkpoint.seen)
+        uploaded_tickers = set(checkpoint.published)
+        upload_counter = [len(uploaded_tickers)]
+        dispatched_tickers = set()
+        unsorted_warned = False
+        budget = ByteBudget(MAX_INFLIGHT_BYTES)
+        sizer = ChunkSizer(INITIAL_CHUNK_ROWS, MIN_CHUNK_ROWS, MAX_CHUNK_ROWS, MAX_INFLIGHT_BYTES, CHUNK_WORKERS,
+                           TARGET_CHUNK_SECONDS)
+
+        def collect(future, start_row, end_row):
+            nonlocal total_rows
+            rows, tickers, missing = future.result()
+            total_rows += rows
+            uploaded_tickers.update(tickers)
+            if missing:
+                # 실패한 티커가 있는 청크는 완료로 보지 않아 재시작 시 다시 처리된다.
+                checkpoint.published.update(tickers)
+            else:
+                checkpoint.complete(start_row, end_row, rows, tickers)
+            checkpoint.maybe_save(all_tickers)
+
+        snapshot = None
+        periods = snapshot_periods()
+        if periods and shard:
+            # 단면 파일은 모든 티커가 필요하므로 샤드 모드에서는 만들지 않는다.
+            logger.warning("Skipping cross-sectional snapshot in shard mode")
+        elif periods and (checkpoint.rows_done or checkpoint.published):
+            # 재시작한 실행은 일부 티커만 다시 처리하므로 완전한 단면 파일을 만들 수 없다.
+            logger.warning("Skipping cross-sectional snapshot on a resumed run")
+        elif periods:
+            snapshot = SnapshotWriter(temp_dir, periods)
+
+        # 큐브도 모든 티커가 한 번씩 원본 순서대로 들어와야 하므로 단면 파일과 같은 조건에서만 만든다.
+        cube = None
+        if CUBE_ENABLED and shard:
+            logger.warning("Skipping minute cube in shard mode")
+        elif CUBE_ENABLED and (checkpoint.rows_done or checkpoint.published):
+            logger.warning("Skipping minute cube on a resumed run")
+        elif CUBE_ENABLED:
+            cube = MinuteCubeWriter(temp_dir, year, month, day)
+
+        writer = AsyncGCSWriter() if use_async_writer() else None
+        if writer is not None:
+            logger.info(f"Using async GCS writer (concurrency={writer.concurrency})")
+
+        # 예외로 빠져나가도 writer의 이벤트 루프 스레드와 세션을 닫는다.
+        try:
+            # 우선순위 티커: Parquet 사본이 있으면 따로 먼저 올리고, 없으면 청크 안에서 먼저 올린다.
+            # 이 샤드의 우선순위 티커가 모두 올라가면 전체 완료와 별개로 완료 신호를 남긴다.
+            priority = shard_tickers(priority_tickers(), shard)
+            priority_stage = "split" + (f"-shard-{shard[0]}-of-{shard[1]}" if shard else "")
+            priority_uploaded = set()
+            priority_signaled = not priority_tickers()
+
+            def signal_priority(expected):
+                nonlocal priority_signaled
+                if not priority_signaled and expected <= uploaded_tickers:
+                    priority_signaled = True
+                    try:
+                        publish_priority_done(target_bucket, priority_stage, year, month, day, expected)
+                    except Exception as e:
+                        logger.error(f"Failed to publish priority signal: {e}")
+
+            if priority and columnar is not None:
+                # 원본 전체를 내려받기 전에 실행하여 우선순위 티커가 다운로드를 기다리지 않게 한다.
+                priority_uploaded = process_priority_lane(columnar, priority - checkpoint.published, temp_dir,
+                                                          target_bucket, year, month, day, upload_counter, writer)
+                uploaded_tickers.update(priority_uploaded)
+                checkpoint.published.update(priority_uploaded)
+                signal_priority({t for t in priority if t in columnar.index["tickers"]})
+
+            if range_groups is None:
+                logger.info(f"Downloading to: {local_file}")
+                # 큰 원본은 byte range slice로 나눠 동시에 받는다. (단일 HTTP 스트림은 NIC 대역폭을 다 쓰지 못함)
+                sliced_download(blob, local_file)
+
+            if range_groups is not None:
+                all_tickers.update(columnar.index["tickers"])
+                groups = [g for g in range_groups
+                          if columnar.row_groups[g]["start_row"] + columnar.row_groups[g]["rows"]
+                          > checkpoint.rows_done]
+                chunks = iter_indexed_chunks(columnar.iter_row_groups(groups, DECODE_WORKERS), sizer, all_tickers)
+            else:
+                chunks = iter_source_chunks(local_file, columnar, block_source, sizer, all_tickers,
+                                            checkpoint.rows_done)
+
+            with ThreadPoolExecutor(max_workers=CHUNK_WORKERS) as executor:
+                futures = {}
+                for start_row, end_row, chunk in chunks:
+                    if shard:
+                        # 원본은 모두 읽되 이 샤드에 속한 티커만 올린다.
+                        mine = shard_tickers(chunk["ticker"].unique(), shard)
+                        chunk = chunk[chunk["ticker"].isin(mine)]
+                        if chunk.empty:
+                            checkpoint.complete(start_row, end_row, 0, set())
+                            continue
+                    if checkpoint.published - priority_uploaded:
+                        chunk = chunk[~chunk["ticker"].isin(checkpoint.published - priority_uploaded)].copy()
+                        if chunk.empty:
+                            checkpoint.complete(start_row, end_row, 0, set())
+                            continue
+                    chunk_tickers = set(chunk["ticker"].unique())
+                    if not unsorted_warned and dispatched_tickers & chunk_tickers:
+                        logger.warning("Source file is not sorted by ticker; split tickers may be overwritten")
+                        unsorted_warned = True
+                        # 행 번호 기반 체크포인트는 정렬된 원본에서만 일관성이 보장된다.
+                        checkpoint.disable()
+                        if snapshot is not None:
+                            # 티커가 여러 part로 나뉘면 단면 파일의 티커별 행 범위가 맞지 않는다.
+                            logger.warning("Skipping cross-sectional snapshot for unsorted source")
+                            snapshot = None
+                        if cube is not None:
+                            logger.warning("Skipping minute cube for unsorted source")
+                            cube = None
+                    dispatched_tickers.update(chunk_tickers)
+
+                    # 워커가 뒤처져 예산이 차면 여기서 읽기를 멈춘다.
+                    nbytes = int(chunk.memory_usage(deep=True).sum())
+                    budget.acquire(nbytes)
+                    future = executor.submit(process_chunk_timed, chunk, sizer, temp_dir, target_bucket,
+                                             year, month, day, upload_counter, writer, snapshot, start_row, cube,
+                                             priority_uploaded)
+                    future.add_done_callback(lambda _, n=nbytes: budget.release(n))
+                    futures[future] = (start_row, end_row)
+                    del chunk
+
+                    # 완료된 결과는 바로 수거하여 futures 목록이 하루치 청크를 붙잡고 있지 않도록 한다.
+                    for done in [fut for fut in futures if fut.done()]:
+                        collect(done, *futures.pop(done))
+                    signal_priority(priority)
 
                 for future in as_completed(futures):
-                    rows, tickers = future.result()
-                    total_rows = max(total_rows, rows)
-                    uploaded_tickers.update(tickers)
+                    collect(future, *futures[future])
+                    signal_priority(priority)
+        finally:
+            if writer is not None:
+                writer.close()
+        # 원본에 없는 우선순위 티커는 기다리지 않는다.
+        signal_priority(priority & all_tickers)
+
+        if snapshot is not None:
+            try:
+                snapshot.finalize(target_bucket, year, month, day)
+            except Exception as e:
+                logger.error(f"Failed to upload cross-sectional snapshot: {e}")
+
+        if cube is not None:
+            try:
+                cube.finalize(target_bucket, year, month, day)
+            except Exception as e:
+                logger.error(f"Failed to upload minute cube: {e}")
+
+        default_policy().log_stats()
+        logger.info(f"Total unique tickers in source file: {len(all_tickers)}")
+        logger.info(f"Peak in-flight chunk bytes: {budget.peak} (budget {MAX_INFLIGHT_BYTES}), "
+                    f"final chunk size: {sizer.rows} rows")
 
         if uploaded_tickers:
             last_ticker = sorted(uploaded_tickers)[-1]
@@ -148,18 +671,39 @@ def process_stock_data(year, month, day):
 
         logger.info(f"Execution completed. Total rows processed: {total_rows}")
         logger.info(f"Total unique tickers processed: {len(uploaded_tickers)}")
-        if len(uploaded_tickers) != len(all_tickers):
-            missing_tickers = all_tickers - uploaded_tickers
-            logger.warning(f"Ticker mismatch! Source: {len(all_tickers)}, Uploaded: {len(uploaded_tickers)}")
+        expected_tickers = shard_tickers(all_tickers, shard)
+        # 샤드 없이 돌려도 결과 목록을 남긴다. (내보내기가 그날 올라간 티커를 여기서 읽는다)
+        write_shard_manifest(target_bucket, year, month, day, shard or (0, 1), source_path, blob.generation,
+                             all_tickers, uploaded_tickers, total_rows)
+        if len(uploaded_tickers) != len(expected_tickers):
+            missing_tickers = expected_tickers - uploaded_tickers
+            logger.warning(f"Ticker mismatch! Source: {len(expected_tickers)}, Uploaded: {len(uploaded_tickers)}")
             logger.warning(f"Missing tickers: {missing_tickers}")
+            # 누락된 티커가 있으면 체크포인트를 남겨 재시도 시 그 부분만 다시 처리한다.
+            if checkpoint.enabled:
+                checkpoint.save(all_tickers)
+        else:
+            checkpoint.clear()
+
+        return sorted(uploaded_tickers)
 
 
 if __name__ == "__main__":
     logger.info(f"Arguments received: {sys.argv}")
-    if len(sys.argv) != 4:
-        logger.error("Usage: python script.py <year> <month> <day>")
+    if len(sys.argv) == 6 and sys.argv[1] == "verify":
+        # 모든 샤드가 끝난 뒤 한 번 실행하는 조정 단계
+        if not verify_shards(sys.argv[2], sys.argv[3], sys.argv[4], int(sys.argv[5])):
+            sys.exit(1)
+        sys.exit(0)
+    if len(sys.argv) == 6 and sys.argv[4] == "--shard":
+        shard = parse_shard(sys.argv[5])
+    elif len(sys.argv) == 4:
+        shard = None
+    else:
+        logger.error("Usage: python script.py <year> <month> <day> [--shard <i>/<N>]")
+        logger.error("   or: python script.py verify <year> <month> <day> <N>")
         sys.exit(1)
     year = sys.argv[1]
     month = sys.argv[2]
     day = sys.argv[3]
-    process_stock_data(year, month, day)
+    process_stock_data(year, month, day, shard)
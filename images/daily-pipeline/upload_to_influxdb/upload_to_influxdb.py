@@ -1,86 +1,421 @@
-import json
+import io
 import os
+import json
 import sys
-import pandas as pd
+import zlib
+import shutil
 import gzip
-from google.cloud import storage
-from google.oauth2 import service_account
-from influxdb_client import InfluxDBClient, Point
-from influxdb_client.client.write_api import SYNCHRONOUS
+import queue
 import tempfile
 import logging
+import threading
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+from common.lazy import lazy_import
+from common.gcs import (get_storage_client, norm_object_path, ticker_object_path, split_manifest_prefix,
+                        RESAMPLED_BUCKET, PERIODS)
+from common.bars import resample_bars
+from common.minute_cube import read_ticker_minutes, use_minute_cube
+from common.budget import ByteBudget
+from common.priority import split_priority, publish_priority_done
+from common.sharding import in_shard, parse_shard
+from common.request_policy import default_policy
+from common.tuner import cpu_workers, log_plan, tuned_int
 
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
+# 무거운 의존성은 처음 쓰는 시점에 읽는다. (인자 검증 전 파드 시작 비용을 줄임)
+pd = lazy_import("pandas")
+np = lazy_import("numpy")
+influxdb_client = lazy_import("influxdb_client")
 
+MEASUREMENT = "stock_price"
+FIELDS = ["open", "high", "low", "close", "volume"]
+EXPORT_WORKERS = tuned_int("INFLUX_EXPORT_WORKERS", cpu_workers())
+# resample_ticker의 RESAMPLE_FILL=mark로 표시된 합성(채워진) 행은 기본적으로 적재하지 않는다.
+WRITE_FILLED = os.environ.get("INFLUX_WRITE_FILLED", "false").lower() == "true"
+# 실시간 적재: 미리 받아 두는 주기 수(동시 다운로드 수이자 파싱된 결과를 쌓아 두는 큐의 길이)와 메모리 상한
+PREFETCH_DEPTH = int(os.environ.get("INFLUX_PREFETCH_DEPTH", "4"))
+PREFETCH_MAX_BYTES = int(os.environ.get("INFLUX_PREFETCH_MAX_BYTES", str(256 * 1024 ** 2)))
+# true이면 주기별 _norm 파일 8개 대신 split이 만든 1m 파일 하나만 받아 나머지 주기를
+# resample_ticker와 같은 규칙(common.bars.resample_bars, RESAMPLE_SESSION/RESAMPLE_FILL)으로 메모리에서 만든다.
+DERIVE_PERIODS = os.environ.get("INFLUX_DERIVE_PERIODS", "false").lower() == "true"
+# 파생 결과를 저장된 _norm 파일과 비교할 표본 비율 (티커와 날짜로 정해지므로 재실행해도 같은 표본)
+DERIVE_VERIFY_RATE = float(os.environ.get("INFLUX_DERIVE_VERIFY_RATE", "0.01"))
+# 큐에 쌓이는 Point 하나의 대략적인 메모리 (태그/필드 dict 포함, 측정값 약 2.2KB)
+POINT_BYTES = 2048
+_DONE = object()
 
-def upload_to_influxdb(year, month, day, ticker, influx_url, influx_token, influx_org, influx_bucket):
-    logger.info(f"Uploading data for {year}-{month}-{day}, ticker: {ticker}")
-    creds_json = os.environ.get("GOOGLE_CREDENTIALS")
-    storage_client_options = {"api_endpoint": os.environ.get("STORAGE_EMULATOR_HOST")} if os.environ.get(
-        "STORAGE_EMULATOR_HOST") else {}
 
-    if creds_json:
-        logger.info("Using GOOGLE_CREDENTIALS from environment")
+def build_points(df, ticker, period):
+    # 실시간 적재와 line protocol 내보내기가 같은 필드/태그 매핑을 사용한다.
+    if "filled" in df.columns and not WRITE_FILLED:
+        df = df[df["filled"] == 0]
+    points = []
+    for row in df.itertuples(index=False):
+        point = influxdb_client.Point(MEASUREMENT).tag("ticker", ticker).tag("period", period)
+        for field in FIELDS:
+            point = point.field(field, float(getattr(row, field)))
+        points.append(point.time(int(row.window_start.timestamp() * 1000000000)))
+    return points
+
+
+def download_or_none(bucket, path):
+    try:
+        return default_policy().call("download", bucket.blob(path).download_as_bytes)
+    except Exception as e:
+        if getattr(e, "code", None) == 404:
+            return None
+        raise
+
+
+def read_norm_csv(data):
+    df = pd.read_csv(io.BytesIO(data), compression="gzip")
+    df["window_start"] = pd.to_datetime(df["window_start"])
+    return df
+
+
+def read_minute_csv(data):
+    # resample_data와 같은 전처리: window_start(ns)를 인덱스로 쓰는 1분봉
+    df = pd.read_csv(io.BytesIO(data), compression="gzip")
+    df["window_start"] = pd.to_datetime(df["window_start"], unit='ns')
+    df.set_index("window_start", inplace=True)
+    return df
+
+
+def derive_period_frames(minutes, periods):
+    return {period: resample_bars(minutes, period) for period in periods}
+
+
+def in_verify_sample(ticker, year, month, day, rate=None):
+    rate = DERIVE_VERIFY_RATE if rate is None else rate
+    return rate > 0 and zlib.crc32(f"{ticker}/{year}-{month}-{day}".encode("utf-8")) % 10000 < rate * 10000
+
+
+def frames_match(stored, derived):
+    if list(stored.columns) != list(derived.columns) or len(stored) != len(derived):
+        return False
+    if not (stored["window_start"].reset_index(drop=True) == derived["window_start"].reset_index(drop=True)).all():
+        return False
+    numeric = [c for c in stored.columns if c != "window_start"]
+    return bool(np.allclose(stored[numeric].to_numpy(dtype=float), derived[numeric].to_numpy(dtype=float),
+                            equal_nan=True))
+
+
+def verify_derived(bucket, ticker, year, month, day, frames):
+    # 표본 티커는 저장된 _norm 파일도 받아 파생 결과와 비교한다. 다른 주기는 저장된 결과를 돌려주어
+    # 호출한 쪽이 배치 결과를 그대로 쓰게 한다. 아직 _norm이 없는 주기는 비교하지 않는다.
+    stored_frames = {}
+    checked = 0
+    for period, derived in frames.items():
+        data = download_or_none(bucket, norm_object_path(ticker, period, year, month, day))
+        if data is None:
+            continue
+        checked += 1
+        stored = read_norm_csv(data)
+        if not frames_match(stored, derived):
+            stored_frames[period] = stored
+    if stored_frames:
+        logger.warning(f"Derived bars differ from stored _norm files for {ticker} {year}-{month}-{day}: "
+                       f"{sorted(stored_frames)}; using the stored files for those periods")
+    else:
+        logger.info(f"Derived bars match stored _norm files for {ticker} ({checked} periods checked)")
+    return stored_frames
+
+
+def derived_frames(bucket, ticker, periods, year, month, day):
+    # 1m 파일(또는 MINUTE_CUBE_READ=true이면 큐브의 한 티커 범위) 하나로 모든 주기의 봉을 만든다. 없으면 None.
+    minutes = read_ticker_minutes(bucket, year, month, day, ticker) if use_minute_cube() else None
+    if minutes is None:
+        data = download_or_none(bucket, ticker_object_path(ticker, "1m", year, month, day))
+        if data is None:
+            return None
+        minutes = read_minute_csv(data)
+    frames = derive_period_frames(minutes, periods)
+    if in_verify_sample(ticker, year, month, day):
+        frames.update(verify_derived(bucket, ticker, year, month, day, frames))
+    return frames
+
+
+class PeriodPrefetcher:
+    # 한 티커의 주기별 파일을 단계별로 처리한다: 다운로드(스레드 풀) -> 파싱/포인트 생성(스레드) -> 소비자(쓰기).
+    # 다운로드는 depth개까지 동시에 진행하고, 파싱 결과는 길이 depth의 큐에 쌓인다.
+    # 파싱 중인 원본 바이트와 큐에 쌓인 Point 목록의 메모리는 ByteBudget으로 묶어 소비자가 release할 때까지 상한을 넘지 않게 한다.
+    # 한 번에 하나의 항목만 잡는다: 원본 바이트를 놓은 뒤 Point 목록 몫을 잡아야 혼자 남은 큰 항목이 스스로를 기다리지 않는다.
+    # 존재 확인(exists) 요청 없이 바로 내려받고, 404는 파일 없음으로 처리한다.
+    # derive=True이면 1m 파일 하나만 받아 모든 주기를 만들고, 주기별 결과를 같은 큐로 넘긴다.
+    def __init__(self, bucket, ticker, periods, year, month, day, depth=PREFETCH_DEPTH, max_bytes=PREFETCH_MAX_BYTES,
+                 derive=DERIVE_PERIODS):
+        self.bucket = bucket
+        self.derive = derive
+        self.ticker = ticker
+        self.periods = periods
+        self.year, self.month, self.day = year, month, day
+        self.depth = max(1, depth)
+        self.budget = ByteBudget(max_bytes)
+        self._queue = queue.Queue(maxsize=self.depth)
+        self._closed = threading.Event()
+        self._executor = ThreadPoolExecutor(max_workers=self.depth)
+        self._parser = threading.Thread(target=self._parse_all, daemon=True)
+        self._parser.start()
+
+    def _fetch(self, period):
+        blob = self.bucket.blob(norm_object_path(self.ticker, period, self.year, self.month, self.day))
         try:
-            credentials = service_account.Credentials.from_service_account_info(json.loads(creds_json))
-            storage_client = storage.Client(credentials=credentials, client_options=storage_client_options)
+            return period, default_policy().call("download", blob.download_as_bytes)
         except Exception as e:
-            logger.error(f"Failed to parse GOOGLE_CREDENTIALS: {e}")
-            storage_client = storage.Client(client_options=storage_client_options)
-    else:
-        logger.info("No GOOGLE_CREDENTIALS, using default or emulator client")
-        storage_client = storage.Client(client_options=storage_client_options)
+            if getattr(e, "code", None) == 404:
+                logger.warning(f"File not found: gs://{self.bucket.name}/{blob.name}")
+                return period, None
+            raise
+
+    def _put(self, item):
+        # 소비자가 먼저 끝나면(close) 더 기다리지 않는다.
+        while not self._closed.is_set():
+            try:
+                self._queue.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def _parse_all(self):
+        if self.derive:
+            return self._derive_all()
+        remaining = iter(self.periods)
+        pending = set()
+
+        def fill():
+            while len(pending) < self.depth and not self._closed.is_set():
+                period = next(remaining, None)
+                if period is None:
+                    return
+                pending.add(self._executor.submit(self._fetch, period))
+
+        try:
+            fill()
+            while pending:
+                done, pending_left = wait(pending, return_when=FIRST_COMPLETED)
+                pending.intersection_update(pending_left)
+                for future in done:
+                    period, data = future.result()
+                    fill()
+                    if data is None:
+                        continue
+                    self.budget.acquire(len(data))
+                    try:
+                        points = build_points(read_norm_csv(data), self.ticker, period)
+                    finally:
+                        self.budget.release(len(data))
+                    del data
+                    retained = len(points) * POINT_BYTES
+                    self.budget.acquire(retained)
+                    if not self._put((period, points, retained)):
+                        return
+        except Exception as e:
+            self._put(e)
+            return
+        self._put(_DONE)
+
+    def _derive_all(self):
+        try:
+            frames = derived_frames(self.bucket, self.ticker, self.periods, self.year, self.month, self.day)
+            if frames is None:
+                logger.warning(f"1m file not found for {self.ticker} on {self.year}-{self.month}-{self.day}")
+            for period in self.periods if frames is not None else []:
+                points = build_points(frames.pop(period), self.ticker, period)
+                retained = len(points) * POINT_BYTES
+                self.budget.acquire(retained)
+                if not self._put((period, points, retained)):
+                    return
+        except Exception as e:
+            self._put(e)
+            return
+        self._put(_DONE)
+
+    def __iter__(self):
+        while True:
+            item = self._queue.get()
+            if item is _DONE:
+                return
+            if isinstance(item, Exception):
+                raise item
+            yield item
+
+    def release(self, nbytes):
+        self.budget.release(nbytes)
+
+    def close(self):
+        self._closed.set()
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+
+def upload_to_influxdb(year, month, day, ticker, influx_url, influx_token, influx_org, influx_bucket):
+    logger.info(f"Uploading data for {year}-{month}-{day}, ticker: {ticker}")
+    storage_client = get_storage_client()
 
     source_bucket_name = "goboolean-452007-resampled"
-    # 모든 주기의 데이터를 처리하며, 정규화된 파일은 모두 _norm 접미사를 사용합니다.
-    periods = ["1m", "5m", "10m", "15m", "30m", "1h", "4h", "1d"]
     try:
-        client = InfluxDBClient(url=influx_url, token=influx_token, org=influx_org)
+        from influxdb_client.client.write_api import SYNCHRONOUS
+        client = influxdb_client.InfluxDBClient(url=influx_url, token=influx_token, org=influx_org)
         write_api = client.write_api(write_options=SYNCHRONOUS)
     except Exception as e:
         logger.error(f"Failed to initialize InfluxDB client: {e}")
         raise
 
+    source_bucket = storage_client.bucket(source_bucket_name)
+    prefetcher = PeriodPrefetcher(source_bucket, ticker, PERIODS, year, month, day)
     try:
-        with tempfile.TemporaryDirectory() as temp_dir:
-            for period in periods:
-                source_path = f"stock/usa/{ticker}/{period}_norm/{year}/{month}/{ticker}_{year}-{month}-{day}_{period}_norm.csv.gz"
-                source_bucket = storage_client.bucket(source_bucket_name)
-                blob = source_bucket.blob(source_path)
-                if not blob.exists():
-                    logger.warning(f"File not found: gs://{source_bucket_name}/{source_path}")
-                    continue
-
-                local_file = os.path.join(temp_dir, f"{ticker}_{year}-{month}-{day}_{period}_norm.csv.gz")
-                blob.download_to_filename(local_file)
-
-                with gzip.open(local_file, 'rt') as f:
-                    df = pd.read_csv(f)
-                    df["window_start"] = pd.to_datetime(df["window_start"])
-                    points = [
-                        Point("stock_price")
-                        .tag("ticker", ticker)
-                        .tag("period", period)
-                        .field("open", float(row["open"]))
-                        .field("high", float(row["high"]))
-                        .field("low", float(row["low"]))
-                        .field("close", float(row["close"]))
-                        .field("volume", float(row["volume"]))
-                        .time(int(row["window_start"].timestamp() * 1000000000))
-                        for _, row in df.iterrows()
-                    ]
-                    write_api.write(bucket=influx_bucket, record=points)
-                    logger.info(f"Uploaded {period} data to InfluxDB: {ticker} for {year}-{month}-{day}")
+        # 다운로드/파싱 단계가 다음 주기를 준비하는 동안 이 스레드는 InfluxDB에 쓴다.
+        for period, points, nbytes in prefetcher:
+            try:
+                write_api.write(bucket=influx_bucket, record=points)
+            finally:
+                prefetcher.release(nbytes)
+            logger.info(f"Uploaded {period} data to InfluxDB: {ticker} for {year}-{month}-{day}")
     finally:
+        prefetcher.close()
         client.close()
         logger.info(f"Completed uploading all periods for {ticker} on {year}-{month}-{day}")
 
 
+_export_client = None
+
+
+def _export_ticker_lines(args):
+    # 프로세스 풀 워커: 한 티커의 모든 주기를 내려받아 (주기, 시간) 순으로 정렬된 line protocol을 만든다.
+    global _export_client
+    year, month, day, ticker = args
+    if _export_client is None:
+        _export_client = get_storage_client()
+    bucket = _export_client.bucket(RESAMPLED_BUCKET)
+    lines = []
+    if DERIVE_PERIODS:
+        frames = derived_frames(bucket, ticker, PERIODS, year, month, day) or {}
+        for period in PERIODS:
+            if period in frames:
+                df = frames[period].sort_values("window_start", kind="stable")
+                lines.extend(point.to_line_protocol() for point in build_points(df, ticker, period))
+        return ticker, lines
+    for period in PERIODS:
+        blob = bucket.blob(norm_object_path(ticker, period, year, month, day))
+        try:
+            data = default_policy().call("download", blob.download_as_bytes)
+        except Exception as e:
+            # 재시도 후에도 실패한 다운로드는 내보내기 전체를 실패시킨다. (주기가 빠진 파일을 완료로 올리지 않음)
+            if getattr(e, "code", None) != 404:
+                logger.error(f"Failed to download {blob.name}: {e}")
+                raise
+            continue
+        df = read_norm_csv(data).sort_values("window_start", kind="stable")
+        lines.extend(point.to_line_protocol() for point in build_points(df, ticker, period))
+    return ticker, lines
+
+
+def split_tickers(storage_client, year, month, day):
+    # split_ticker가 그날 남긴 결과 목록(샤드별)에서 실제로 1m 파일을 올린 티커를 모은다. 목록이 없으면 None.
+    prefix = split_manifest_prefix(year, month, day)
+    tickers = set()
+    found = False
+    for blob in storage_client.list_blobs(RESAMPLED_BUCKET, prefix=prefix):
+        if not blob.name.endswith(".json"):
+            continue
+        manifest = json.loads(default_policy().call("download", blob.download_as_bytes))
+        tickers.update(manifest["published"])
+        found = True
+    return tickers if found else None
+
+
+def list_tickers(storage_client, year, month, day):
+    explicit = os.environ.get("EXPORT_TICKERS")
+    if explicit:
+        return sorted(t.strip() for t in explicit.split(",") if t.strip())
+    tickers = split_tickers(storage_client, year, month, day)
+    if tickers is not None:
+        return sorted(tickers)
+    # 결과 목록이 생기기 전에 split한 날짜: 지금까지 한 번이라도 올라간 모든 티커 (없는 날짜의 파일은 404로 건너뜀)
+    logger.warning(f"No split manifests for {year}-{month}-{day}, listing every ticker in gs://{RESAMPLED_BUCKET}")
+    blobs = storage_client.list_blobs(RESAMPLED_BUCKET, prefix="stock/usa/", delimiter="/")
+    for _ in blobs.pages:
+        pass
+    return sorted(prefix[len("stock/usa/"):].rstrip("/") for prefix in blobs.prefixes)
+
+
+def _write_export_file(tickers, year, month, day, local_file):
+    total_lines = 0
+    batch_size = EXPORT_WORKERS * 4
+    with gzip.open(local_file, "wt") as out, ProcessPoolExecutor(max_workers=EXPORT_WORKERS) as executor:
+        # 티커 순서를 유지하며 배치 단위로 처리하여 메모리에 올라오는 결과의 양을 제한한다.
+        for start in range(0, len(tickers), batch_size):
+            batch = [(year, month, day, t) for t in tickers[start:start + batch_size]]
+            for ticker, lines in executor.map(_export_ticker_lines, batch):
+                if lines:
+                    out.write("\n".join(lines))
+                    out.write("\n")
+                    total_lines += len(lines)
+            logger.info(f"Exported {min(start + batch_size, len(tickers))}/{len(tickers)} tickers, "
+                        f"{total_lines} lines so far")
+    return total_lines
+
+
+def _publish_export_file(storage_client, local_file, target, year, month, file_name):
+    if target.startswith("gs://"):
+        bucket_name, _, prefix = target[len("gs://"):].partition("/")
+        target_path = "/".join(p for p in [prefix.rstrip("/"), year, month, file_name] if p)
+        storage_client.bucket(bucket_name).blob(target_path).upload_from_filename(
+            local_file, content_type="application/gzip")
+        return f"gs://{bucket_name}/{target_path}"
+    target_dir = os.path.join(target, year, month)
+    os.makedirs(target_dir, exist_ok=True)
+    destination = os.path.join(target_dir, file_name)
+    shutil.move(local_file, destination)
+    return destination
+
+
+def export_line_protocol(year, month, day, target, shard_index=0, shard_count=1):
+    # 백필용: InfluxDB에 직접 쓰지 않고 하루(또는 샤드) 단위로 정렬된 gzip line protocol 파일을 만든다.
+    # 결과 파일은 `influx write --file ... --compression gzip` 등 대량 적재 도구로 넣는다.
+    # PRIORITY_TICKERS가 있으면 그 티커들은 _priority 파일로 먼저 내보내고 완료 신호를 남긴다.
+    # 본 파일은 우선순위 티커까지 모두 담으므로 본 파일만 적재해도 하루치가 빠지지 않는다.
+    # (두 파일을 모두 적재해도 같은 series/시각의 점은 덮어써지므로 결과는 같다)
+    storage_client = get_storage_client()
+    tickers = [t for t in list_tickers(storage_client, year, month, day) if in_shard(t, shard_index, shard_count)]
+    priority, _ = split_priority(tickers)
+    logger.info(f"Exporting {len(tickers)} tickers ({len(priority)} priority) for {year}-{month}-{day} "
+                f"(shard {shard_index}/{shard_count})")
+    log_plan("export_line_protocol", export_workers=EXPORT_WORKERS)
+
+    suffix = f"_shard-{shard_index}-of-{shard_count}" if shard_count > 1 else ""
+    file_name = f"{MEASUREMENT}_{year}-{month}-{day}{suffix}.lp.gz"
+    priority_file_name = f"{MEASUREMENT}_{year}-{month}-{day}{suffix}_priority.lp.gz"
+
+    with tempfile.TemporaryDirectory() as temp_dir:
+        if priority:
+            local_file = os.path.join(temp_dir, priority_file_name)
+            lines = _write_export_file(priority, year, month, day, local_file)
+            destination = _publish_export_file(storage_client, local_file, target, year, month, priority_file_name)
+            logger.info(f"Exported {lines} priority lines to {destination}")
+            publish_priority_done(storage_client.bucket(RESAMPLED_BUCKET), f"export{suffix}", year, month, day,
+                                  priority, destination=destination)
+        local_file = os.path.join(temp_dir, file_name)
+        total_lines = _write_export_file(tickers, year, month, day, local_file)
+        destination = _publish_export_file(storage_client, local_file, target, year, month, file_name)
+
+    logger.info(f"Exported {total_lines} lines to {destination}")
+    return destination
+
+
 if __name__ == "__main__":
+    if len(sys.argv) >= 6 and sys.argv[1] == "export":
+        # 사용법: upload_to_influxdb.py export <year> <month> <day> <target> [<shard_index>/<shard_count>]
+        shard_index, shard_count = parse_shard(sys.argv[6]) if len(sys.argv) > 6 else (0, 1)
+        export_line_protocol(sys.argv[2], sys.argv[3], sys.argv[4], sys.argv[5], shard_index, shard_count)
+        sys.exit(0)
+
     if len(sys.argv) != 9:
         logger.error(
             "Usage: python upload_to_influxdb.py <year> <month> <day> <ticker> <influx_url> <influx_token> <influx_org> <influx_bucket>")
+        logger.error("   or: python upload_to_influxdb.py export <year> <month> <day> <gs://bucket/prefix|local_dir> [<i>/<n>]")
         sys.exit(1)
     year, month, day, ticker, influx_url, influx_token, influx_org, influx_bucket = sys.argv[1:9]
     upload_to_influxdb(year, month, day, ticker, influx_url, influx_token, influx_org, influx_bucket)
@@ -108,9 +108,31 @@ export GCS_PREFIX
 export AWS_ACCESS_KEY_ID
 export AWS_SECRET_ACCESS_KEY
 
+# 파드에 할당된 CPU 수 (cgroup v2 cpu.max → v1 cfs quota → nproc 순으로 확인)
+cgroup_cpus() {
+    local quota period
+    if [ -f /sys/fs/cgroup/cpu.max ]; then
+        read -r quota period < /sys/fs/cgroup/cpu.max
+    elif [ -f /sys/fs/cgroup/cpu/cpu.cfs_quota_us ]; then
+        quota=$(cat /sys/fs/cgroup/cpu/cpu.cfs_quota_us)
+        period=$(cat /sys/fs/cgroup/cpu/cpu.cfs_period_us)
+    fi
+    if [ -n "$quota" ] && [ "$quota" != "max" ] && [ "$quota" -gt 0 ]; then
+        echo $(( (quota + period - 1) / period ))
+    else
+        nproc
+    fi
+}
+
 echo "Processing S3 list output in parallel:"
 # S3 리스트에서 파일 이름만 추출 후 병렬 처리
-NUM_PROCESSES=8
+# 전송은 네트워크 대기가 대부분이므로 CPU당 2개, 2~16개 범위로 정한다. (NUM_PROCESSES로 지정 가능)
+if [ -z "$NUM_PROCESSES" ]; then
+    NUM_PROCESSES=$(( $(cgroup_cpus) * 2 ))
+    [ "$NUM_PROCESSES" -lt 2 ] && NUM_PROCESSES=2
+    [ "$NUM_PROCESSES" -gt 16 ] && NUM_PROCESSES=16
+fi
+echo "Using ${NUM_PROCESSES} parallel transfers"
 grep -v "urllib3/connectionpool.py" /tmp/s3_list.log | awk '{print $4}' | xargs -I {} -P "$NUM_PROCESSES" bash -c 'process_file "{}"'
 
 wait
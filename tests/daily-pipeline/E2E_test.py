@@ -230,18 +230,21 @@ def build_images(docker_client):
     client, _ = docker_client
     images = {}
     logger.info("Building Docker images...")
+    # (빌드 컨텍스트, Dockerfile) - common 패키지를 쓰는 이미지는 daily-pipeline 디렉터리를 컨텍스트로 사용
     components = {
-        "split_ticker": "../../images/daily-pipeline/split_ticker",
-        "resample_ticker": "../../images/daily-pipeline/resample_ticker",
-        "upload_to_influxdb": "../../images/daily-pipeline/upload_to_influxdb"
+        "split_ticker": ("../../images/daily-pipeline", "split_ticker/Dockerfile"),
+        "resample_ticker": ("../../images/daily-pipeline", "resample_ticker/Dockerfile"),
+        "upload_to_influxdb": ("../../images/daily-pipeline", "upload_to_influxdb/Dockerfile"),
+        "compute_indicators": ("../../images/daily-pipeline", "compute_indicators/Dockerfile")
     }
-    for component, build_path in components.items():
+    for component, (build_path, dockerfile) in components.items():
         image_name = f"test_e2e_{component}_{uuid.uuid4().hex[:8]}"
         build_path = os.path.abspath(build_path)
         logger.info(f"Building {component} image from {build_path}")
         try:
             image, _ = client.images.build(
                 path=build_path,
+                dockerfile=dockerfile,
                 tag=image_name,
                 rm=True,
                 forcerm=True
@@ -295,7 +298,21 @@ def test_end_to_end_pipeline(test_env, sample_data, build_images, docker_client)
     if resample_container.wait()["StatusCode"] != 0:
         pytest.fail(f"resample_ticker failed. Logs:\n{chr(10).join(resample_logs)}")
 
-    # 3. Upload to InfluxDB 컨테이너 실행
+    # 3. Compute Indicators 컨테이너 실행
+    logger.info("Running compute_indicators container...")
+    indicator_container = client.containers.run(
+        build_images["compute_indicators"],
+        command=[year, month, day, ticker],
+        environment=test_env["env"],
+        network=network.name,
+        extra_hosts=extra_hosts,
+        detach=True
+    )
+    indicator_logs = [line.decode('utf-8').strip() for line in indicator_container.logs(stream=True)]
+    if indicator_container.wait()["StatusCode"] != 0:
+        pytest.fail(f"compute_indicators failed. Logs:\n{chr(10).join(indicator_logs)}")
+
+    # 4. Upload to InfluxDB 컨테이너 실행
     logger.info("Running upload_to_influxdb container...")
     upload_container = client.containers.run(
         build_images["upload_to_influxdb"],
@@ -324,7 +341,13 @@ def test_end_to_end_pipeline(test_env, sample_data, build_images, docker_client)
         assert bucket.blob(norm_blob_path).exists(), f"resample_ticker missing blob for period: {period}"
     logger.info("All resample_ticker blobs verified.")
 
-    # C. InfluxDB 데이터 검증
+    # C. compute_indicators 결과 검증 (_norm 파일 옆에 _ind 파일 생성)
+    for period in ["1m", "5m", "10m", "15m", "30m", "1h", "4h", "1d"]:
+        ind_blob_path = f"stock/usa/{ticker}/{period}_ind/{year}/{month}/{ticker}_{year}-{month}-{day}_{period}_ind.csv.gz"
+        assert bucket.blob(ind_blob_path).exists(), f"compute_indicators missing blob for period: {period}"
+    logger.info("All compute_indicators blobs verified.")
+
+    # D. InfluxDB 데이터 검증
     logger.info("Verifying data in InfluxDB...")
     client_influx = InfluxDBClient(
         url=test_env["host_influx_url"],
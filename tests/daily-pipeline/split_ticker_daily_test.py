@@ -42,9 +42,12 @@ def stock_splitter_container():
         raise ValueError("GOOGLE_CREDENTIALS 환경 변수가 설정되지 않았습니다. .env 파일을 확인하세요.")
 
     image_name = "split_ticker:test"
-    build_path = os.path.abspath("../../images/daily-pipeline/split_ticker")
+    # common 패키지를 함께 복사하기 위해 daily-pipeline 디렉터리를 빌드 컨텍스트로 사용한다.
+    build_path = os.path.abspath("../../images/daily-pipeline")
+    dockerfile = os.path.join(build_path, "split_ticker", "Dockerfile")
     logger.info(f"Building Docker image from {build_path}...")
-    build_result = os.system(f"docker buildx build --platform linux/arm64,linux/amd64 -t {image_name} {build_path}")
+    build_result = os.system(
+        f"docker buildx build --platform linux/arm64,linux/amd64 -t {image_name} -f {dockerfile} {build_path}")
 
     if build_result != 0:
         raise Exception(f"Docker 이미지 빌드 실패: {build_result}")
@@ -0,0 +1,133 @@
+import math
+import random
+import threading
+
+from common.aimd import ERROR, OK, THROTTLED, AIMDLimiter, classify
+
+
+class Throttled(Exception):
+    code = 429
+
+
+class DeadlineExceeded(Exception):
+    code = 504
+
+
+class ReadTimeout(OSError):
+    pass
+
+
+def limiter(initial=4, **kwargs):
+    return AIMDLimiter("test", initial=initial, minimum=1, maximum=64, cooldown=0, **kwargs)
+
+
+def fill(aimd):
+    while aimd.try_acquire():
+        pass
+
+
+def test_try_acquire_stops_at_limit():
+    aimd = limiter(initial=3)
+    fill(aimd)
+    assert aimd.in_flight == 3
+    aimd.release(OK, 0.01)
+    assert aimd.try_acquire()
+
+
+def test_throttle_halves_limit():
+    aimd = limiter(initial=8)
+    aimd.acquire()
+    aimd.release(THROTTLED)
+    assert aimd.limit == 4
+    assert aimd.counters["throttled"] == 1
+
+
+def test_decrease_waits_for_cooldown():
+    aimd = AIMDLimiter("test", initial=8, minimum=1, maximum=64, cooldown=60)
+    for _ in range(3):
+        aimd.acquire()
+        aimd.release(THROTTLED)
+    assert aimd.limit == 4
+
+
+def test_limit_grows_about_one_per_saturated_window():
+    aimd = limiter(initial=4)
+    for _ in range(5):
+        fill(aimd)
+        aimd.release(OK, 0.01)
+    assert int(aimd.limit) == 5
+    assert aimd.counters["increases"] == 1
+
+
+def test_limit_does_not_grow_when_not_saturated():
+    aimd = limiter(initial=4)
+    for _ in range(20):
+        aimd.acquire()
+        aimd.release(OK, 0.01)
+    assert aimd.limit == 4
+
+
+def run_saturated(aimd, latencies):
+    for latency in latencies:
+        fill(aimd)
+        aimd.release(OK, latency)
+
+
+def test_heavy_tailed_healthy_latency_does_not_decrease_limit():
+    # 부하와 무관한 로그정규 지연(중앙값 60ms, 꼬리가 긴 분포)에는 줄이지 않고 계속 늘린다.
+    aimd = AIMDLimiter("test", initial=16, minimum=1, maximum=256, cooldown=0)
+    rng = random.Random(7)
+    run_saturated(aimd, [rng.lognormvariate(math.log(0.06), 0.6) for _ in range(5000)])
+    assert aimd.counters["decreases"] == 0
+    assert aimd.limit > 16
+
+
+def test_single_outliers_do_not_decrease_limit():
+    aimd = limiter(initial=8, latency_recent=8, latency_window=100)
+    run_saturated(aimd, [0.01] * 50 + [5.0] + [0.01] * 50 + [5.0])
+    assert aimd.counters["decreases"] == 0
+
+
+def test_sustained_latency_inflation_decreases_limit():
+    aimd = limiter(initial=32, latency_recent=8, latency_window=100)
+    run_saturated(aimd, [0.01] * 50)
+    limit = aimd.limit
+    run_saturated(aimd, [0.2] * 12)
+    assert aimd.counters["slow"] == 1
+    assert aimd.limit < limit
+
+
+def test_errors_do_not_change_limit():
+    aimd = limiter(initial=8)
+    aimd.acquire()
+    aimd.release(ERROR)
+    assert aimd.limit == 8 and aimd.counters["errors"] == 1
+
+
+def test_acquire_blocks_until_release():
+    aimd = limiter(initial=1)
+    aimd.acquire()
+    acquired = threading.Event()
+    waiter = threading.Thread(target=lambda: (aimd.acquire(), acquired.set()))
+    waiter.start()
+    assert not acquired.wait(0.05)
+    aimd.release(OK, 0.01)
+    assert acquired.wait(5)
+    waiter.join()
+
+
+def test_cancel_returns_slot_without_outcome():
+    aimd = limiter(initial=1)
+    aimd.acquire()
+    aimd.cancel()
+    assert aimd.in_flight == 0
+    assert (aimd.counters["ok"], aimd.counters["errors"]) == (0, 0)
+
+
+def test_classify():
+    assert classify(None) == OK
+    assert classify(Throttled()) == THROTTLED
+    assert classify(TimeoutError()) == THROTTLED
+    assert classify(DeadlineExceeded()) == THROTTLED
+    assert classify(ReadTimeout()) == THROTTLED
+    assert classify(ValueError()) == ERROR
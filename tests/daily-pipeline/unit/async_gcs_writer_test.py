@@ -0,0 +1,52 @@
+import asyncio
+import time
+from collections import deque
+
+from common.aimd import OK, AIMDLimiter
+from common.async_gcs_writer import AsyncGCSWriter
+
+
+def slot_writer(limit):
+    # 세션 없이 자리 대기열만 쓰는 writer
+    writer = AsyncGCSWriter.__new__(AsyncGCSWriter)
+    writer._limiter = AIMDLimiter("test", initial=limit, maximum=limit)
+    writer._slot_waiters = deque()
+    writer._loop = asyncio.get_running_loop()
+    return writer
+
+
+def test_slots_are_granted_in_arrival_order():
+    async def scenario():
+        writer = slot_writer(1)
+        order = []
+
+        async def upload(name):
+            await writer._acquire_slot()
+            order.append(name)
+            await asyncio.sleep(0.01)
+            writer._release_slot(OK, time.monotonic())
+
+        tasks = []
+        for name in ("a", "b", "c", "d"):
+            tasks.append(asyncio.ensure_future(upload(name)))
+            await asyncio.sleep(0)
+        await asyncio.wait_for(asyncio.gather(*tasks), timeout=5)
+        return order, writer._limiter.in_flight
+
+    order, in_flight = asyncio.run(scenario())
+    assert order == ["a", "b", "c", "d"]
+    assert in_flight == 0
+
+
+def test_cancelled_waiter_does_not_leak_slot():
+    async def scenario():
+        writer = slot_writer(1)
+        await writer._acquire_slot()
+        waiting = asyncio.ensure_future(writer._acquire_slot())
+        await asyncio.sleep(0)
+        waiting.cancel()
+        await asyncio.gather(waiting, return_exceptions=True)
+        writer._release_slot(OK, time.monotonic())
+        return len(writer._slot_waiters), writer._limiter.in_flight
+
+    assert asyncio.run(scenario()) == (0, 0)
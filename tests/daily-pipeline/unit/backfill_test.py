@@ -0,0 +1,65 @@
+import pytest
+
+import backfill
+from backfill import INFLUX, RESAMPLE, SPLIT, BackfillScheduler, Checkpoint
+from fake_gcs import FakeClient
+
+
+@pytest.fixture
+def scheduler(tmp_path, monkeypatch):
+    monkeypatch.setattr(backfill, "priority_tickers", lambda: frozenset({"AAPL"}))
+    checkpoint = Checkpoint(str(tmp_path / "checkpoint.jsonl"))
+    return BackfillScheduler(["2023-01-03", "2023-01-04"], workers=4, shard_size=2, max_split=2,
+                             checkpoint=checkpoint, priority_workers=1)
+
+
+def test_priority_outstanding_ignores_pending_splits(scheduler):
+    # split이 남아 있다는 이유만으로 워커를 비워 두지 않는다.
+    scheduler._push(("2023-01-04", SPLIT, 0))
+    assert not scheduler._priority_outstanding({"future": ("2023-01-03", SPLIT, 0)})
+
+
+def test_priority_outstanding_while_priority_shard_ready_or_running(scheduler):
+    scheduler._push(("2023-01-03", RESAMPLE, "p0"))
+    assert scheduler._priority_outstanding({})
+    scheduler.ready.clear()
+    assert scheduler._priority_outstanding({"future": ("2023-01-03", INFLUX, "p0")})
+
+
+def record_split(scheduler, day_str, tickers, priority):
+    scheduler.checkpoint.record((day_str, SPLIT, 0), tickers=tickers, priority=priority)
+
+
+def test_priority_shards_are_built_from_checkpoint(scheduler):
+    record_split(scheduler, "2023-01-03", ["AAPL", "B", "C", "D", "E"], ["AAPL"])
+    assert scheduler._shards("2023-01-03") == {"p0": ["AAPL"], 0: ["B", "C"], 1: ["D", "E"]}
+
+
+def test_priority_shards_run_first_and_normal_work_leaves_reserved_slots(scheduler):
+    record_split(scheduler, "2023-01-03", ["AAPL", "B", "C", "D", "E"], ["AAPL"])
+    scheduler._on_split_done("2023-01-03")
+    assert scheduler.priority_pending == {("2023-01-03", RESAMPLE): {"p0"}}
+    assert scheduler._next_ready(0, 3) == ("2023-01-03", RESAMPLE, "p0")
+    # 비워 둔 워커만 남으면 우선순위가 아닌 샤드는 기다린다.
+    assert scheduler._next_ready(0, 0) is None
+    assert scheduler._next_ready(0, 1) == ("2023-01-03", RESAMPLE, 0)
+
+
+def test_split_waits_for_free_split_slot(scheduler):
+    scheduler._push(("2023-01-03", SPLIT, 0))
+    assert scheduler._next_ready(scheduler.max_split, 4) is None
+    assert scheduler._next_ready(0, 4) == ("2023-01-03", SPLIT, 0)
+
+
+def test_priority_signal_published_when_last_priority_shard_finishes(scheduler, monkeypatch):
+    published = []
+    monkeypatch.setattr(backfill, "get_storage_client", lambda: FakeClient())
+    monkeypatch.setattr(backfill, "publish_priority_done",
+                        lambda bucket, stage, *args: published.append((stage, *args)))
+    scheduler.shard_size = 1
+    record_split(scheduler, "2023-01-03", ["AAPL", "MSFT", "B"], ["AAPL", "MSFT"])
+    scheduler._on_split_done("2023-01-03")
+    scheduler._on_priority_done(("2023-01-03", RESAMPLE, "p0"))
+    assert published == []
+    scheduler._on_priority_done(("2023-01-03", RESAMPLE, "p1"))
+    assert published == [(RESAMPLE, "2023", "01", "03", ["AAPL", "MSFT"])]
@@ -0,0 +1,42 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from common.bars import ffill_bars, resample_bars
+
+
+def minute_bars():
+    # 정규장(뉴욕 09:30-16:00 = UTC 14:30-21:00) 안에서만 드문드문 거래된 이틀치 1분봉
+    rng = np.random.default_rng(3)
+    minutes = pd.DatetimeIndex(
+        list(pd.date_range("2023-01-03 14:30", "2023-01-03 20:59", freq="1min")) +
+        list(pd.date_range("2023-01-04 14:30", "2023-01-04 20:59", freq="1min")))
+    traded = minutes[(rng.random(len(minutes)) < 0.05) | (minutes == minutes[0]) | (minutes == minutes[-1])]
+    close = 100 + rng.standard_normal(len(traded)).cumsum()
+    return pd.DataFrame({"open": close, "high": close + 1, "low": close - 1, "close": close,
+                         "volume": rng.integers(1, 100, len(traded))},
+                        index=pd.Index(traded, name="window_start"))
+
+
+@pytest.mark.parametrize("period_name", ["1m", "5m", "1h", "4h", "1d"])
+@pytest.mark.parametrize("session", ["regular", "full"])
+def test_filled_sparse_bars_match_ffill_mode(period_name, session):
+    df = minute_bars()
+    dense = resample_bars(df, period_name, session=session, fill="ffill")
+    sparse = resample_bars(df, period_name, session=session, fill="skip")
+    assert set(sparse["session"]) == {session}
+
+    sparse.insert(0, "ticker", "A")
+    filled = ffill_bars(sparse, period_name).drop(columns=["ticker", "session"])
+    filled["volume"] = filled["volume"].astype(dense["volume"].dtype)
+    pd.testing.assert_frame_equal(filled, dense, check_freq=False)
+
+
+def test_ffill_bars_grid_skips_nights_and_weekends():
+    df = minute_bars()
+    sparse = resample_bars(df, "1h", session="regular", fill="skip")
+    sparse.insert(0, "ticker", "A")
+    filled = ffill_bars(sparse, "1h")
+    hours = filled["window_start"].dt.hour
+    assert hours.min() == 14 and hours.max() == 20
+    assert len(filled) == 14
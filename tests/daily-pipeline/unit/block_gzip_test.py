@@ -0,0 +1,58 @@
+import gzip
+
+import pandas as pd
+
+import reencode_raw
+from common.block_gzip import BlockGzipSource, iter_block_chunks
+from common.gcs import raw_block_gzip_index_path
+from fake_gcs import FakeBucket
+
+
+def raw_csv(path, tickers):
+    rows = [{"ticker": ticker, "volume": i, "open": 1.5, "close": 1.5, "high": 2.0, "low": 1.0,
+             "window_start": 1000 + i, "transactions": 1}
+            for ticker, count in tickers for i in range(count)]
+    frame = pd.DataFrame(rows)
+    with gzip.open(path, "wt") as f:
+        frame.to_csv(f, index=False)
+    return frame
+
+
+def reencode(tmp_path, monkeypatch, tickers):
+    monkeypatch.setattr(reencode_raw, "BLOCK_BYTES", 200)
+    source = tmp_path / "raw.csv.gz"
+    frame = raw_csv(source, tickers)
+    target, index_file = tmp_path / "raw.bgz", tmp_path / "raw.bgz.index.json"
+    reencode_raw.reencode_block_gzip(str(source), str(target), str(index_file))
+    bucket = FakeBucket()
+    bucket.put(raw_block_gzip_index_path("2023", "01", "03"), index_file.read_bytes())
+    return frame, str(target), BlockGzipSource.open(bucket, "2023", "01", "03")
+
+
+def test_block_gzip_is_plain_gzip_split_on_ticker_boundaries(tmp_path, monkeypatch):
+    frame, target, source = reencode(tmp_path, monkeypatch, [("A", 4), ("B", 9), ("C", 2), ("D", 6)])
+    # member를 이어 붙인 파일은 그대로 하나의 gzip CSV로 읽힌다.
+    pd.testing.assert_frame_equal(pd.read_csv(target, compression="gzip"), frame)
+    assert source.index["sorted"] and source.index["rows"] == len(frame)
+    assert source.columns == list(frame.columns)
+    for previous, block in zip(source.blocks, source.blocks[1:]):
+        assert previous["last_ticker"] != block["first_ticker"]
+        assert previous["start_row"] + previous["rows"] == block["start_row"]
+    assert len(source.blocks) > 1
+
+
+def test_unsorted_source_is_flagged(tmp_path, monkeypatch):
+    _, _, source = reencode(tmp_path, monkeypatch, [("A", 2), ("B", 2), ("A", 2)])
+    assert not source.index["sorted"]
+
+
+def test_block_chunks_come_back_in_order_and_resume(tmp_path, monkeypatch):
+    frame, target, source = reencode(tmp_path, monkeypatch, [(f"T{i}", 5) for i in range(12)])
+    chunks = list(iter_block_chunks(target, source, workers=2))
+    assert [start for start, _, _ in chunks] == [block["start_row"] for block in source.blocks]
+    pd.testing.assert_frame_equal(pd.concat([chunk for _, _, chunk in chunks], ignore_index=True), frame)
+
+    resume_from = source.blocks[2]["start_row"]
+    resumed = list(iter_block_chunks(target, source, workers=2, start_row=resume_from))
+    assert resumed[0][0] == resume_from
+    assert resumed[-1][1] == len(frame)
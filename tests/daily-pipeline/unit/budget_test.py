@@ -0,0 +1,25 @@
+import threading
+
+from common.budget import ByteBudget
+
+
+def test_acquire_blocks_until_release():
+    budget = ByteBudget(100)
+    budget.acquire(60)
+    acquired = threading.Event()
+    reader = threading.Thread(target=lambda: (budget.acquire(60), acquired.set()))
+    reader.start()
+    # 예산을 넘기면 생산자가 멈춘다.
+    assert not acquired.wait(0.05)
+    budget.release(60)
+    assert acquired.wait(5)
+    reader.join()
+    assert (budget.in_flight, budget.peak) == (60, 60)
+
+
+def test_oversized_item_passes_when_idle():
+    budget = ByteBudget(100)
+    budget.acquire(500)
+    assert budget.in_flight == 500
+    budget.release(500)
+    assert budget.in_flight == 0
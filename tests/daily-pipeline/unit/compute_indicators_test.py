@@ -0,0 +1,140 @@
+from datetime import date, timedelta
+
+import pandas as pd
+import pytest
+
+from common.gcs import RESAMPLED_BUCKET, indicator_object_path, indicator_state_path, norm_object_path
+from fake_gcs import FakeBlob, FakeBucket, FakeClient, gzip_csv, read_gzip_csv
+import compute_indicators
+from compute_indicators import build_points, compute, load_norm, load_series, load_state, parse_indicators, tail_rows
+
+
+def daily_bar(day, close):
+    return pd.DataFrame({"window_start": [pd.Timestamp(day)], "open": [close], "high": [close + 1],
+                         "low": [close - 1], "close": [close], "volume": [1000]})
+
+
+def put_daily_bars(bucket, ticker, days):
+    # 평일마다 1d 파일 하나씩 (주말은 파일 없음)
+    for i, day in enumerate(days):
+        path = norm_object_path(ticker, "1d", f"{day.year:04d}", f"{day.month:02d}", f"{day.day:02d}")
+        bucket.put(path, gzip_csv(daily_bar(day, 100.0 + i)))
+
+
+def weekdays_until(end, count):
+    days = []
+    day = end
+    while len(days) < count:
+        if day.weekday() < 5:
+            days.append(day)
+        day -= timedelta(days=1)
+    return days[::-1]
+
+
+def test_load_series_collects_tail_rows_across_days():
+    # 1d 주기는 하루 한 행이므로 ema:20에 필요한 꼬리를 여러 날에서 모아야 한다.
+    bucket = FakeBucket()
+    today = date(2023, 6, 30)
+    days = weekdays_until(today, 80)
+    put_daily_bars(bucket, "AAPL", days)
+    tail = tail_rows(parse_indicators("sma:20,ema:20,vwap,volatility:20,return"))
+    df = load_series(bucket, "AAPL", "1d", today, tail)
+    assert (~df["is_today"]).sum() == tail
+    assert df["is_today"].sum() == 1
+    assert df["window_start"].is_monotonic_increasing
+    assert df["window_start"].iloc[0] == pd.Timestamp(days[-1 - tail])
+
+
+def test_load_series_keeps_short_history():
+    bucket = FakeBucket()
+    today = date(2023, 6, 30)
+    days = weekdays_until(today, 5)
+    put_daily_bars(bucket, "AAPL", days)
+    df = load_series(bucket, "AAPL", "1d", today, 60)
+    assert len(df) == 5
+
+
+class Forbidden(Exception):
+    code = 403
+
+
+def test_load_norm_raises_on_download_error(monkeypatch):
+    bucket = FakeBucket()
+
+    def forbidden(self, start=None, end=None, **kwargs):
+        raise Forbidden(self.name)
+
+    monkeypatch.setattr(FakeBlob, "download_as_bytes", forbidden)
+    with pytest.raises(Forbidden):
+        load_norm(bucket, "AAPL", "1d", date(2023, 6, 30))
+
+
+def test_load_norm_skips_missing_day():
+    assert load_norm(FakeBucket(), "AAPL", "1d", date(2023, 7, 1)) is None
+
+
+def test_build_points_from_default_indicators():
+    bucket = FakeBucket()
+    today = date(2023, 6, 30)
+    put_daily_bars(bucket, "AAPL", weekdays_until(today, 80))
+    indicators = parse_indicators(compute_indicators.INDICATORS)
+    frame = load_series(bucket, "AAPL", "1d", today, tail_rows(indicators))
+    result = compute(frame, indicators)
+    indicator_columns = [c for c in result.columns if c not in compute_indicators.KEYS + ["window_start"]]
+    assert "return" in indicator_columns
+
+    points = build_points(result, indicator_columns)
+    assert len(points) == 1
+    line = points[0].to_line_protocol()
+    assert line.startswith("stock_price,period=1d,ticker=AAPL ")
+    for column in indicator_columns:
+        assert f"{column}=" in line
+    assert line.endswith(str(pd.Timestamp(today).value))
+
+
+def run_day(monkeypatch, bucket, day):
+    client = FakeClient()
+    client.buckets[RESAMPLED_BUCKET] = bucket
+    monkeypatch.setattr(compute_indicators, "get_storage_client", lambda: client)
+    monkeypatch.delenv("INFLUX_URL", raising=False)
+    assert compute_indicators.compute_indicators(f"{day.year:04d}", f"{day.month:02d}", f"{day.day:02d}", ["AAPL"])
+    path = indicator_object_path("AAPL", "1d", f"{day.year:04d}", f"{day.month:02d}", f"{day.day:02d}")
+    return read_gzip_csv(bucket.objects[path][0])
+
+
+def test_state_from_previous_day_replaces_norm_walk(monkeypatch):
+    bucket = FakeBucket()
+    days = weekdays_until(date(2023, 6, 30), 80)
+    put_daily_bars(bucket, "AAPL", days)
+    run_day(monkeypatch, bucket, days[-2])
+
+    bucket.downloads.clear()
+    with_state = run_day(monkeypatch, bucket, days[-1])
+    state_path = indicator_state_path("AAPL", "1d", "2023", "06", "29")
+    assert [name for name in bucket.downloads if "/1d_" in name] == [
+        norm_object_path("AAPL", "1d", "2023", "06", "30"), state_path]
+
+    # 상태 없이 _norm을 거슬러 올라가 모은 결과와 같다.
+    del bucket.objects[state_path]
+    pd.testing.assert_frame_equal(with_state, run_day(monkeypatch, bucket, days[-1]))
+
+
+def test_state_lookup_skips_holidays_but_not_missing_trading_days():
+    bucket = FakeBucket()
+    put_daily_bars(bucket, "AAPL", [date(2023, 7, 3), date(2023, 7, 5)])
+    state = daily_bar(date(2023, 7, 3), 1.0)
+    bucket.put(indicator_state_path("AAPL", "1d", "2023", "07", "03"), gzip_csv(state))
+    # 7/4(휴장일)는 상태도 _norm도 없으므로 7/3 상태를 쓴다.
+    assert len(load_state(bucket, "AAPL", "1d", date(2023, 7, 5))) == 1
+    # 7/5는 거래일인데 상태가 없으므로 _norm에서 다시 모으도록 None을 돌려준다.
+    assert load_state(bucket, "AAPL", "1d", date(2023, 7, 6)) is None
+
+
+def test_vwap_resets_on_session_day_not_utc_day():
+    # 미국 동부 19:00~20:00(연장 거래)은 UTC 자정을 넘지만 같은 거래일이다.
+    times = pd.to_datetime(["2023-01-03 23:59", "2023-01-04 00:00", "2023-01-04 14:30"])
+    frame = pd.DataFrame({"ticker": "AAPL", "period": "1m", "window_start": times, "open": 1.0,
+                          "high": [10.0, 20.0, 30.0], "low": [10.0, 20.0, 30.0], "close": [10.0, 20.0, 30.0],
+                          "volume": [1, 1, 1], "is_today": True})
+    vwap = compute(frame, [("vwap", None)])["vwap"].tolist()
+    assert vwap == [10.0, 15.0, 30.0]
@@ -0,0 +1,9 @@
+import os
+import sys
+
+# 컨테이너 없이 daily-pipeline의 common 패키지와 엔트리 모듈을 import한다. (컨테이너에서는 모두 /app에 복사됨)
+DAILY_PIPELINE_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..", "..", "images", "daily-pipeline"))
+for module_dir in ("split_ticker", "resample_ticker", "upload_to_influxdb", "compute_indicators", "backfill",
+                   "live_bars", "polygon_to_gcs_daily", "day_pipeline"):
+    sys.path.insert(0, os.path.join(DAILY_PIPELINE_DIR, module_dir))
+sys.path.insert(0, DAILY_PIPELINE_DIR)
@@ -0,0 +1,147 @@
+import threading
+from concurrent.futures import Future
+
+import influxdb_client
+import pandas as pd
+import pytest
+
+import day_pipeline
+from common.gcs import norm_object_path, ticker_object_path
+from common.minute_cube import day_start_ns
+from day_pipeline import InfluxSink, run_priority_lane, transform_chunk
+
+
+class FakeWriteApi:
+    def __init__(self, fail=False, gate=None):
+        self.fail = fail
+        self.gate = gate
+        self.batches = []
+
+    def write(self, bucket, record):
+        if self.gate is not None:
+            self.gate.wait(5)
+        if self.fail:
+            raise RuntimeError("influx unavailable")
+        self.batches.append(list(record))
+
+
+class FakeInfluxClient:
+    write_api_instance = None
+
+    def __init__(self, url, token, org):
+        pass
+
+    def write_api(self, write_options=None):
+        return FakeInfluxClient.write_api_instance
+
+    def close(self):
+        pass
+
+
+@pytest.fixture
+def make_sink(monkeypatch):
+    def make(write_api, **kwargs):
+        FakeInfluxClient.write_api_instance = write_api
+        monkeypatch.setattr(influxdb_client, "InfluxDBClient", FakeInfluxClient)
+        return InfluxSink("http://influx", None, None, "bucket", **kwargs)
+    return make
+
+
+def raw_chunk(tickers, minutes=3, day=("2023", "01", "03")):
+    start = day_start_ns(*day) + 870 * 60 * 10 ** 9
+    rows = [{"ticker": ticker, "volume": 100, "open": 1.0, "close": 1.5, "high": 2.0, "low": 0.5,
+             "window_start": start + i * 60 * 10 ** 9, "transactions": 1}
+            for ticker in tickers for i in range(minutes)]
+    return pd.DataFrame(rows)
+
+
+def test_transform_chunk_persists_and_builds_lines_for_the_day_only():
+    chunk = pd.concat([raw_chunk(["A", "B"]), raw_chunk(["A"], day=("2023", "01", "04"))], ignore_index=True)
+    rows, results, _ = transform_chunk(chunk, "2023", "01", "03", "all", True)
+    assert rows == 6
+    assert [ticker for ticker, _, _ in results] == ["A", "B"]
+    _, objects, lines = results[0]
+    paths = [path for path, _ in objects]
+    assert paths[0] == ticker_object_path("A", "1m", "2023", "01", "03")
+    assert norm_object_path("A", "1d", "2023", "01", "03") in paths
+    assert any(line.startswith("stock_price,period=1m,ticker=A ") for line in lines)
+
+    _, results, _ = transform_chunk(chunk, "2023", "01", "03", "none", False)
+    assert results[0][1:] == ([], [])
+
+
+def test_sink_batches_and_drain_waits_for_writes(make_sink):
+    gate = threading.Event()
+    write_api = FakeWriteApi(gate=gate)
+    sink = make_sink(write_api, workers=2, batch_lines=3)
+    sink.add([f"line {i}" for i in range(7)])
+    drained = threading.Event()
+    waiter = threading.Thread(target=lambda: (sink.drain(), drained.set()))
+    waiter.start()
+    assert not drained.wait(0.05)
+    gate.set()
+    assert drained.wait(5)
+    waiter.join()
+    assert sorted(len(batch) for batch in write_api.batches) == [1, 3, 3]
+    assert (sink.written, sink.failed) == (7, 0)
+    sink.close()
+
+
+def test_sink_counts_failed_lines_and_releases_slots(make_sink):
+    sink = make_sink(FakeWriteApi(fail=True), workers=1, batch_lines=2)
+    sink.add(["a", "b", "c", "d", "e"])
+    sink.drain()
+    assert (sink.written, sink.failed) == (0, 5)
+    sink.close()
+
+
+class FakeColumnar:
+    def __init__(self, tickers):
+        self.index = {"tickers": {ticker: 0 for ticker in tickers}}
+        self.requested = None
+
+    def read_tickers(self, tickers):
+        self.requested = tickers
+        return raw_chunk(tickers)
+
+
+class FakeWriter:
+    def __init__(self, failing=()):
+        self.failing = set(failing)
+        self.paths = []
+
+    def submit(self, bucket_name, path, data, content_type=None):
+        self.paths.append(path)
+        future = Future()
+        if any(f"/{ticker}/" in path for ticker in self.failing):
+            future.set_exception(RuntimeError("upload failed"))
+        else:
+            future.set_result({})
+        return future
+
+
+def test_priority_lane_processes_only_present_priority_tickers(monkeypatch, make_sink):
+    monkeypatch.setattr(day_pipeline, "PERSIST", "1m")
+    columnar = FakeColumnar(["AAPL", "MSFT", "XYZ"])
+    writer = FakeWriter()
+    sink = make_sink(FakeWriteApi())
+    assert run_priority_lane(columnar, {"AAPL", "MSFT", "TSLA"}, "2023", "01", "03", sink, writer) == {"AAPL", "MSFT"}
+    assert columnar.requested == ["AAPL", "MSFT"]
+    assert writer.paths == [ticker_object_path(t, "1m", "2023", "01", "03") for t in ["AAPL", "MSFT"]]
+    assert sink.written > 0
+    sink.close()
+    assert run_priority_lane(columnar, {"TSLA"}, "2023", "01", "03", None, writer) == set()
+
+
+def test_priority_lane_leaves_failed_uploads_to_main_pass(monkeypatch):
+    monkeypatch.setattr(day_pipeline, "PERSIST", "1m")
+    done = run_priority_lane(FakeColumnar(["AAPL", "MSFT"]), {"AAPL", "MSFT"}, "2023", "01", "03", None,
+                             FakeWriter(failing=["MSFT"]))
+    assert done == {"AAPL"}
+
+
+def test_priority_lane_retries_everything_when_influx_writes_fail(monkeypatch, make_sink):
+    monkeypatch.setattr(day_pipeline, "PERSIST", "1m")
+    sink = make_sink(FakeWriteApi(fail=True))
+    assert run_priority_lane(FakeColumnar(["AAPL"]), {"AAPL"}, "2023", "01", "03", sink, FakeWriter()) == set()
+    sink.close()
@@ -0,0 +1,96 @@
+import io
+import gzip
+
+
+class NotFound(Exception):
+    code = 404
+
+
+class FakeBlob:
+    # google.cloud.storage.Blob 중 파이프라인이 쓰는 메서드만 메모리에서 흉내 낸다.
+    def __init__(self, bucket, name):
+        self.bucket = bucket
+        self.name = name
+
+    @property
+    def generation(self):
+        return self.bucket.objects[self.name][1] if self.name in self.bucket.objects else None
+
+    @property
+    def size(self):
+        return len(self.bucket.objects[self.name][0])
+
+    crc32c = None
+
+    def exists(self):
+        return self.name in self.bucket.objects
+
+    def reload(self):
+        pass
+
+    def download_as_bytes(self, start=None, end=None, **kwargs):
+        if self.name not in self.bucket.objects:
+            raise NotFound(self.name)
+        self.bucket.downloads.append(self.name)
+        data = self.bucket.objects[self.name][0]
+        if start is not None:
+            return data[start:None if end is None else end + 1]
+        return data
+
+    def open(self, mode="rb"):
+        return io.BytesIO(self.download_as_bytes())
+
+    def download_to_filename(self, path):
+        with open(path, "wb") as f:
+            f.write(self.download_as_bytes())
+
+    def upload_from_string(self, data, content_type=None, **kwargs):
+        self.bucket.put(self.name, data.encode("utf-8") if isinstance(data, str) else data)
+
+    def upload_from_filename(self, path, content_type=None, **kwargs):
+        with open(path, "rb") as f:
+            self.bucket.put(self.name, f.read())
+
+    def delete(self):
+        if self.bucket.objects.pop(self.name, None) is None:
+            raise NotFound(self.name)
+
+
+class FakeBucket:
+    def __init__(self, name="test-bucket"):
+        self.name = name
+        self.objects = {}
+        self.downloads = []
+
+    def blob(self, name, generation=None):
+        return FakeBlob(self, name)
+
+    def get_blob(self, name):
+        return FakeBlob(self, name) if name in self.objects else None
+
+    def put(self, name, data):
+        generation = self.objects.get(name, (None, 0))[1] + 1
+        self.objects[name] = (data, generation)
+
+
+class FakeClient:
+    def __init__(self):
+        self.buckets = {}
+
+    def bucket(self, name):
+        return self.buckets.setdefault(name, FakeBucket(name))
+
+    def list_blobs(self, bucket_or_name, prefix=""):
+        bucket = self.bucket(getattr(bucket_or_name, "name", bucket_or_name))
+        return [FakeBlob(bucket, name) for name in sorted(bucket.objects) if name.startswith(prefix)]
+
+
+def gzip_csv(df):
+    buffer = io.BytesIO()
+    df.to_csv(buffer, compression={"method": "gzip"}, index=False)
+    return buffer.getvalue()
+
+
+def read_gzip_csv(data):
+    import pandas as pd
+    return pd.read_csv(io.BytesIO(gzip.decompress(data)))
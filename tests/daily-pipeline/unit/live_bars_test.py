@@ -0,0 +1,44 @@
+import pandas as pd
+
+from live_bars import PERIOD_NS, RollingBars, parse_bar, RAW_COLUMNS
+
+MINUTE = PERIOD_NS["1m"]
+START = int(pd.Timestamp("2023-01-03 14:30").value)
+
+
+def test_updates_open_bar_until_period_changes():
+    bars = RollingBars(periods=["5m"], session="full")
+    bars.update("AAPL", START, 10, 11, 9, 10.5, 100)
+    updates = bars.update("AAPL", START + MINUTE, 10.5, 12, 10, 11, 50)
+    assert updates == [("AAPL", "5m", START, [10, 12, 9, 11, 150], False)]
+
+    updates = bars.update("AAPL", START + 5 * MINUTE, 11, 11, 11, 11, 10)
+    assert updates == [("AAPL", "5m", START, [10, 12, 9, 11, 150], True),
+                       ("AAPL", "5m", START + 5 * MINUTE, [11, 11, 11, 11, 10], False)]
+    assert bars.closed == 1
+    assert bars.open_bars() == 1
+
+
+def test_late_and_duplicate_minutes_are_dropped():
+    bars = RollingBars(periods=["1m", "5m"], session="full")
+    bars.update("AAPL", START + MINUTE, 10, 10, 10, 10, 1)
+    assert bars.update("AAPL", START + MINUTE, 10, 10, 10, 10, 1) == []
+    assert bars.update("AAPL", START, 10, 10, 10, 10, 1) == []
+    assert bars.late == 2
+    # 티커마다 따로 판단한다.
+    assert bars.update("MSFT", START, 10, 10, 10, 10, 1)
+
+
+def test_bars_outside_session_are_not_emitted():
+    bars = RollingBars(periods=["1m"], session="regular")
+    pre_market = int(pd.Timestamp("2023-01-03 13:00").value)
+    assert bars.update("AAPL", pre_market, 10, 10, 10, 10, 1) == []
+    assert bars.update("AAPL", START, 10, 10, 10, 10, 1) == [("AAPL", "1m", START, [10, 10, 10, 10, 1], False)]
+
+
+def test_parse_bar_csv_and_json():
+    line = f"AAPL,100,10,10.5,11,9,{START},5"
+    assert parse_bar(line, RAW_COLUMNS) == ("AAPL", START, 10.0, 11.0, 9.0, 10.5, 100.0)
+    json_line = ('{"ticker": "AAPL", "volume": 100, "open": 10, "close": 10.5, "high": 11, "low": 9, '
+                 f'"window_start": {START}}}')
+    assert parse_bar(json_line, RAW_COLUMNS) == ("AAPL", START, 10.0, 11.0, 9.0, 10.5, 100.0)
@@ -0,0 +1,52 @@
+import numpy as np
+import pandas as pd
+
+from common.minute_cube import MINUTES, MinuteCube, MinuteCubeWriter, day_start_ns, read_ticker_minutes
+from fake_gcs import FakeBucket
+
+
+def raw_chunk(tickers, minutes):
+    start = day_start_ns("2023", "01", "03")
+    rows = [{"ticker": ticker, "window_start": start + minute * 60 * 10 ** 9, "open": 1.0 + minute,
+             "high": 2.0 + minute, "low": 0.5, "close": 1.5, "volume": 100 + minute, "transactions": 3}
+            for ticker in tickers for minute in minutes]
+    return pd.DataFrame(rows)
+
+
+def write_cube(tmp_path):
+    bucket = FakeBucket()
+    writer = MinuteCubeWriter(str(tmp_path), "2023", "01", "03")
+    writer.add_chunk(1, raw_chunk(["C"], [0, 1]))
+    writer.add_chunk(0, raw_chunk(["A", "B"], [870, 871, 900]))
+    writer.finalize(bucket, "2023", "01", "03")
+    return bucket
+
+
+def test_cube_round_trip(tmp_path):
+    bucket = write_cube(tmp_path)
+    cube = MinuteCube.download(bucket, "2023", "01", "03", str(tmp_path))
+    assert cube.tickers == ["A", "B", "C"]
+    assert cube.array.shape == (3, 6, MINUTES)
+    assert "B" in cube and "Z" not in cube
+
+    bars = cube.minute_bars("B")
+    assert list(bars.index) == list(pd.to_datetime(["2023-01-03 14:30", "2023-01-03 14:31", "2023-01-03 15:00"]))
+    assert bars["open"].tolist() == [871.0, 872.0, 901.0]
+    assert bars["volume"].dtype == np.int64
+    # 전 티커에 걸친 필드 배열
+    assert np.nansum(cube.field("volume")[:, 0]) == 100
+
+
+def test_read_single_ticker_by_range(tmp_path):
+    bucket = write_cube(tmp_path)
+    bars = read_ticker_minutes(bucket, "2023", "01", "03", "C")
+    assert bars["open"].tolist() == [1.0, 2.0]
+    assert read_ticker_minutes(bucket, "2023", "01", "03", "Z") is None
+    assert read_ticker_minutes(bucket, "2023", "01", "04", "C") is None
+
+
+def test_download_rejects_cube_from_another_run(tmp_path):
+    bucket = write_cube(tmp_path)
+    name = next(name for name in bucket.objects if name.endswith(".cube"))
+    bucket.put(name, bucket.objects[name][0])
+    assert MinuteCube.download(bucket, "2023", "01", "03", str(tmp_path / "other")) is None
@@ -0,0 +1,56 @@
+import json
+
+import pytest
+
+from common.bars import PERIOD_CODES
+from common.planner import DEFAULT_PROFILE, POINTS_PER_ROW, estimate, load_profile, measured_profile, pods_for
+
+
+def test_estimate_counts_missing_days_and_units():
+    profile = dict(DEFAULT_PROFILE, tickers_per_day=1000)
+    plan = estimate(["2023-01-03", "2023-01-04"], {"2023-01-03": 22 * 10 ** 6, "2023-01-04": None}, profile,
+                    workers=4, max_split=1, shard_size=200, list_ops=1)
+    assert plan["days_with_raw"] == 1
+    assert plan["missing_days"] == ["2023-01-04"]
+    assert plan["rows"] == 10 ** 6
+    # split 1개 + resample 5개 + influx 5개
+    assert plan["units"] == 11
+    assert plan["class_a_ops"] == 1 + 1000 + 1000 * len(PERIOD_CODES) * 2
+    assert plan["influx_points"] == int(10 ** 6 * POINTS_PER_ROW)
+
+
+def test_estimate_without_influx_skips_influx_work():
+    plan = estimate(["2023-01-03"], {"2023-01-03": 10 ** 6}, DEFAULT_PROFILE, influx=False)
+    assert plan["influx_points"] == 0 and plan["influx_seconds"] == 0
+
+
+def test_wall_time_is_bounded_by_split_concurrency():
+    profile = dict(DEFAULT_PROFILE, resample_seconds_per_ticker=0, influx_seconds_per_ticker=0,
+                   split_bytes_per_second=1)
+    plan = estimate(["2023-01-03", "2023-01-04"], {"2023-01-03": 3600, "2023-01-04": 3600}, profile,
+                    workers=8, max_split=1)
+    assert plan["wall_hours"] == pytest.approx(2.0)
+    assert pods_for(plan, 0.5) == 4
+    assert pods_for(plan, 0) is None
+
+
+def test_measured_profile_uses_checkpoint_timings():
+    entries = [
+        {"date": "2023-01-03", "stage": "split", "shard": 0, "tickers": ["A", "B"], "seconds": 10},
+        {"date": "2023-01-03", "stage": "resample", "shard": 0, "count": 2, "seconds": 1},
+        {"date": "2023-01-03", "stage": "influx", "shard": 0, "count": 2},
+    ]
+    profile, tickers_by_day, measured = measured_profile(DEFAULT_PROFILE, entries, {"2023-01-03": 1000})
+    assert profile["split_bytes_per_second"] == 100
+    assert profile["resample_seconds_per_ticker"] == 0.5
+    assert profile["influx_seconds_per_ticker"] == DEFAULT_PROFILE["influx_seconds_per_ticker"]
+    assert tickers_by_day == {"2023-01-03": 2}
+    assert measured == ["split", "resample", "tickers"]
+
+
+def test_load_profile_overrides_defaults(tmp_path):
+    path = tmp_path / "profile.json"
+    path.write_text(json.dumps({"tickers_per_day": 5}))
+    profile = load_profile(str(path))
+    assert profile["tickers_per_day"] == 5
+    assert profile["raw_bytes_per_row"] == DEFAULT_PROFILE["raw_bytes_per_row"]
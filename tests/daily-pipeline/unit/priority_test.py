@@ -0,0 +1,31 @@
+import json
+
+from common.gcs import priority_signal_path
+from common.priority import priority_first, priority_tickers, publish_priority_done, split_priority
+from fake_gcs import FakeBucket
+
+
+def test_split_priority_keeps_order():
+    assert split_priority(["C", "A", "B", "D"], {"D", "A"}) == (["A", "D"], ["C", "B"])
+    assert priority_first(["C", "A", "B", "D"], {"D", "A"}) == ["A", "D", "C", "B"]
+
+
+def test_priority_tickers_from_env_and_file(tmp_path, monkeypatch):
+    path = tmp_path / "watchlist.txt"
+    path.write_text("# watchlist\nMSFT\n\nNVDA\n")
+    monkeypatch.setenv("PRIORITY_TICKERS", "AAPL, MSFT")
+    monkeypatch.setenv("PRIORITY_TICKERS_FILE", str(path))
+    priority_tickers.cache_clear()
+    try:
+        assert priority_tickers() == {"AAPL", "MSFT", "NVDA"}
+    finally:
+        priority_tickers.cache_clear()
+
+
+def test_publish_priority_done_writes_signal():
+    bucket = FakeBucket()
+    path = publish_priority_done(bucket, "split", "2023", "01", "03", {"MSFT", "AAPL"}, rows=5)
+    assert path == priority_signal_path("split", "2023", "01", "03")
+    signal = json.loads(bucket.objects[path][0])
+    assert signal["tickers"] == ["AAPL", "MSFT"]
+    assert (signal["stage"], signal["date"], signal["rows"]) == ("split", "2023-01-03", 5)
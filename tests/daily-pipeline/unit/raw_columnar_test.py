@@ -0,0 +1,65 @@
+import gzip
+
+import pandas as pd
+
+import reencode_raw
+from common.gcs import raw_columnar_index_path, raw_columnar_object_path
+from common.raw_columnar import RawColumnarSource, iter_row_group_chunks
+from fake_gcs import FakeBucket
+
+
+def raw_csv(path):
+    # 원본처럼 시간 순으로 섞인 행 (티커 순이 아님)
+    counts = {"A": 3, "B": 7, "C": 2, "D": 4}
+    rows = [{"ticker": ticker, "volume": i, "open": 1.0, "close": 1.0, "high": 1.0, "low": 1.0,
+             "window_start": 1000 + i, "transactions": 1}
+            for i in range(max(counts.values())) for ticker, count in counts.items() if i < count]
+    with gzip.open(path, "wt") as f:
+        pd.DataFrame(rows).to_csv(f, index=False)
+    return counts
+
+
+def test_row_group_bounds_never_split_a_ticker():
+    tickers = list("AAABBBBBBBCCD")
+    bounds = reencode_raw.row_group_bounds(tickers, 4)
+    assert bounds == [(0, 10), (10, 13)]
+    assert reencode_raw.row_group_bounds(list("ABCD"), 2) == [(0, 2), (2, 4)]
+
+
+def reencoded_source(tmp_path, monkeypatch):
+    monkeypatch.setattr(reencode_raw, "ROW_GROUP_ROWS", 4)
+    counts = raw_csv(tmp_path / "raw.csv.gz")
+    parquet_file, index_file = tmp_path / "raw.parquet", tmp_path / "raw.index.json"
+    reencode_raw.reencode_parquet(str(tmp_path / "raw.csv.gz"), str(parquet_file), str(index_file))
+    bucket = FakeBucket()
+    bucket.put(raw_columnar_object_path("2023", "01", "03"), parquet_file.read_bytes())
+    bucket.put(raw_columnar_index_path("2023", "01", "03"), index_file.read_bytes())
+    return RawColumnarSource.open(bucket, "2023", "01", "03"), counts, str(parquet_file)
+
+
+def test_reencoded_copy_is_ticker_sorted_with_group_index(tmp_path, monkeypatch):
+    source, counts, _ = reencoded_source(tmp_path, monkeypatch)
+    assert source.index["rows"] == sum(counts.values())
+    assert [(g["first_ticker"], g["last_ticker"]) for g in source.row_groups] == [("A", "B"), ("C", "D")]
+    assert source.index["tickers"] == {"A": 0, "B": 0, "C": 1, "D": 1}
+
+
+def test_read_tickers_reads_only_their_row_groups(tmp_path, monkeypatch):
+    source, _, _ = reencoded_source(tmp_path, monkeypatch)
+    df = source.read_tickers(["D", "Z"])
+    assert df["ticker"].tolist() == ["D"] * 4
+    assert df["window_start"].tolist() == [1000, 1001, 1002, 1003]
+    # D가 든 행 그룹 하나만 읽는다.
+    assert source.bucket.downloads.count(raw_columnar_object_path("2023", "01", "03")) == 1
+    assert source.read_tickers(["Z"]).empty
+
+
+def test_row_group_chunks_keep_order_and_resume(tmp_path, monkeypatch):
+    source, counts, parquet_file = reencoded_source(tmp_path, monkeypatch)
+    chunks = list(source.iter_row_groups([0, 1], max_workers=2))
+    assert [(start, end) for start, end, _ in chunks] == [(0, 10), (10, 16)]
+    assert pd.concat([chunk for _, _, chunk in chunks])["ticker"].value_counts().to_dict() == counts
+
+    # 체크포인트가 10행까지 진행했다면 둘째 행 그룹부터 읽는다.
+    resumed = list(iter_row_group_chunks(parquet_file, source.row_groups, start_row=10))
+    assert [(start, end, len(chunk)) for start, end, chunk in resumed] == [(10, 16, 6)]
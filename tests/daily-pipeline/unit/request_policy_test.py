@@ -0,0 +1,46 @@
+import threading
+import time
+
+from common.request_policy import LatencyStats, RequestPolicy
+
+
+def warmed_policy(hedge_workers=4, latency=0.01):
+    stats = LatencyStats()
+    for _ in range(20):
+        stats.record("test", latency)
+    return RequestPolicy(max_attempts=1, hedge_percentile=0.95, hedge_min_samples=20,
+                         hedge_workers=hedge_workers, stats=stats)
+
+
+def test_slow_primary_is_hedged():
+    policy = warmed_policy()
+    calls = []
+
+    def fn():
+        calls.append(threading.current_thread().name)
+        if len(calls) == 1:
+            time.sleep(1)
+            return "primary"
+        return "hedge"
+
+    assert policy.call("test", fn) == "hedge"
+    assert policy.stats.snapshot()["test"]["hedge_wins"] == 1
+
+
+def test_full_executor_runs_on_caller_thread():
+    # 실행기가 가득 차면 큐에서 기다리지 않고 호출한 스레드에서 바로 실행한다.
+    policy = warmed_policy(hedge_workers=1)
+    release = threading.Event()
+    blocker = threading.Thread(target=policy.call, args=("test", release.wait))
+    blocker.start()
+    try:
+        time.sleep(0.02)
+        threads = []
+        started = time.monotonic()
+        assert policy.call("test", lambda: threads.append(threading.current_thread().name) or "ok") == "ok"
+        assert threads == [threading.current_thread().name]
+        assert time.monotonic() - started < 0.5
+    finally:
+        release.set()
+        blocker.join()
+
@@ -0,0 +1,82 @@
+import threading
+import time
+
+import pandas as pd
+import pytest
+
+import resample_ticker
+from common.bars import PERIOD_CODES
+from common.gcs import RESAMPLED_BUCKET, norm_object_path, ticker_object_path
+from fake_gcs import FakeBlob, FakeClient, gzip_csv, read_gzip_csv
+
+
+@pytest.fixture
+def client(monkeypatch):
+    monkeypatch.delenv("GCS_UPLOAD_ENGINE", raising=False)
+    monkeypatch.delenv("MINUTE_CUBE_READ", raising=False)
+    client = FakeClient()
+    monkeypatch.setattr(resample_ticker, "get_storage_client", lambda: client)
+    start = pd.Timestamp("2023-01-03 14:30")
+    minutes = pd.DataFrame({"ticker": "AAPL", "volume": 100, "open": 1.0, "close": 1.5, "high": 2.0, "low": 0.5,
+                            "window_start": [(start + pd.Timedelta(minutes=i)).value for i in range(90)],
+                            "transactions": 1})
+    client.bucket(RESAMPLED_BUCKET).put(ticker_object_path("AAPL", "1m", "2023", "01", "03"), gzip_csv(minutes))
+    return client
+
+
+def test_all_periods_are_uploaded_concurrently(client, monkeypatch):
+    active = []
+    peak = [0]
+    lock = threading.Lock()
+    original = FakeBlob.upload_from_string
+
+    def slow_upload(self, data, content_type=None, **kwargs):
+        with lock:
+            active.append(self.name)
+            peak[0] = max(peak[0], len(active))
+        time.sleep(0.02)
+        original(self, data, content_type=content_type)
+        with lock:
+            active.remove(self.name)
+
+    monkeypatch.setattr(FakeBlob, "upload_from_string", slow_upload)
+    monkeypatch.setattr(resample_ticker, "UPLOAD_CONCURRENCY", 4)
+    assert resample_ticker.resample_data("2023", "01", "03", "AAPL")
+
+    bucket = client.bucket(RESAMPLED_BUCKET)
+    for period in PERIOD_CODES:
+        assert f"stock/usa/AAPL/{period}_norm/" in bucket.objects
+    assert len(read_gzip_csv(bucket.objects[norm_object_path("AAPL", "5m", "2023", "01", "03")][0])) == 18
+    assert 1 < peak[0] <= 4
+
+
+def test_buffered_bytes_stay_within_budget(client, monkeypatch):
+    budgets = []
+    original = resample_ticker.ByteBudget
+
+    def recording_budget(max_bytes):
+        budget = original(max_bytes)
+        budgets.append(budget)
+        return budget
+
+    monkeypatch.setattr(resample_ticker, "ByteBudget", recording_budget)
+    monkeypatch.setattr(resample_ticker, "MAX_BUFFERED_BYTES", 1)
+    # 한도보다 큰 결과도 하나씩은 올라가므로 멈추지 않는다.
+    assert resample_ticker.resample_data("2023", "01", "03", "AAPL")
+    assert budgets[0].peak <= max(len(data) for data, _ in client.bucket(RESAMPLED_BUCKET).objects.values())
+
+
+def test_failed_period_upload_fails_the_ticker(client, monkeypatch):
+    failing = norm_object_path("AAPL", "1h", "2023", "01", "03")
+    original = FakeBlob.upload_from_string
+
+    def upload(self, data, content_type=None, **kwargs):
+        if self.name == failing:
+            raise ValueError("rejected")
+        original(self, data, content_type=content_type)
+
+    monkeypatch.setattr(FakeBlob, "upload_from_string", upload)
+    assert resample_ticker.resample_data("2023", "01", "03", "AAPL") is False
+    bucket = client.bucket(RESAMPLED_BUCKET)
+    assert failing not in bucket.objects
+    assert norm_object_path("AAPL", "1d", "2023", "01", "03") in bucket.objects
@@ -0,0 +1,66 @@
+import pandas as pd
+
+from common.gcs import RESAMPLED_BUCKET, norm_object_path
+from common.resampled_reader import LocalObjectCache, ResampledReader
+from fake_gcs import FakeClient, gzip_csv
+
+
+def put_day(bucket, ticker, day, close=1.0):
+    frame = pd.DataFrame({"window_start": pd.date_range(f"{day} 14:30", periods=3, freq="1h"),
+                          "open": close, "high": close, "low": close, "close": close, "volume": 10})
+    bucket.put(norm_object_path(ticker, "1h", *day.split("-")), gzip_csv(frame))
+
+
+def reader(tmp_path):
+    client = FakeClient()
+    bucket = client.bucket(RESAMPLED_BUCKET)
+    for day in ["2023-01-30", "2023-01-31", "2023-02-01"]:
+        put_day(bucket, "AAPL", day)
+        put_day(bucket, "MSFT", day, close=2.0)
+    return ResampledReader(client, cache=LocalObjectCache(str(tmp_path)), max_workers=4), bucket
+
+
+def test_covering_objects_spans_months_and_excludes_end_day(tmp_path):
+    resampled, _ = reader(tmp_path)
+    objects = resampled.covering_objects(["AAPL"], "1h", "2023-01-31", "2023-02-02")
+    assert [(ticker, str(day.date())) for ticker, day, _, _ in objects] == [("AAPL", "2023-01-31"), ("AAPL", "2023-02-01")]
+    # end가 자정이면 그날 파일은 필요 없다.
+    assert len(resampled.covering_objects(["AAPL"], "1h", "2023-01-31", "2023-02-01")) == 1
+
+
+def test_read_filters_to_range_and_sorts_by_ticker(tmp_path):
+    resampled, _ = reader(tmp_path)
+    df = resampled.read(["MSFT", "AAPL"], "1h", "2023-01-31 15:00", pd.Timestamp("2023-02-01 15:00", tz="UTC"))
+    assert df["ticker"].tolist() == ["AAPL"] * 3 + ["MSFT"] * 3
+    assert df["window_start"].min() == pd.Timestamp("2023-01-31 15:30")
+    assert df["window_start"].max() == pd.Timestamp("2023-02-01 14:30")
+
+
+def test_cached_objects_are_not_downloaded_again_until_overwritten(tmp_path):
+    resampled, bucket = reader(tmp_path)
+    resampled.read(["AAPL"], "1h", "2023-01-30", "2023-02-02")
+    assert len(bucket.downloads) == 3
+
+    # 새 프로세스라도 디스크 캐시를 그대로 쓴다.
+    again = ResampledReader(resampled.storage_client, cache=LocalObjectCache(str(tmp_path)), max_workers=4)
+    again.read(["AAPL"], "1h", "2023-01-30", "2023-02-02")
+    assert len(bucket.downloads) == 3
+
+    # 덮어쓴 객체는 generation이 바뀌므로 다시 받는다.
+    put_day(bucket, "AAPL", "2023-01-31", close=5.0)
+    df = again.read(["AAPL"], "1h", "2023-01-30", "2023-02-02")
+    assert len(bucket.downloads) == 4
+    assert (df.loc[df["window_start"].dt.day == 31, "close"] == 5.0).all()
+
+
+def test_cache_evicts_least_recently_used(tmp_path):
+    cache = LocalObjectCache(str(tmp_path), max_bytes=10)
+    cache.put("b", "one", 1, b"aaaa")
+    cache.put("b", "two", 1, b"bbbb")
+    assert cache.get("b", "one", 1) == b"aaaa"
+    cache.put("b", "three", 1, b"cccc")
+    assert cache.get("b", "two", 1) is None
+    assert cache.get("b", "one", 1) == b"aaaa"
+    # 한도보다 큰 객체는 보관하지 않는다.
+    cache.put("b", "big", 1, b"x" * 11)
+    assert cache.get("b", "big", 1) is None
@@ -0,0 +1,81 @@
+import base64
+import os
+import random
+import time
+
+import google_crc32c
+import pytest
+
+from common import sliced_download
+from common.sliced_download import SliceError, download_to_filename, iter_slices, slice_ranges
+from fake_gcs import FakeBlob, FakeBucket
+
+
+def source_blob(size=1000, seed=5):
+    bucket = FakeBucket()
+    data = random.Random(seed).randbytes(size)
+    bucket.put("raw.csv.gz", data)
+    blob = FakeBlob(bucket, "raw.csv.gz")
+    blob.crc32c = base64.b64encode(google_crc32c.Checksum(data).digest()).decode("ascii")
+    return blob, data
+
+
+@pytest.fixture(autouse=True)
+def small_objects_are_sliced(monkeypatch):
+    monkeypatch.setattr(sliced_download, "MIN_SLICED_BYTES", 100)
+
+
+def test_slice_ranges_cover_object_without_overlap():
+    assert slice_ranges(10, 4) == [(0, 3), (4, 7), (8, 9)]
+    assert slice_ranges(8, 4) == [(0, 3), (4, 7)]
+
+
+def test_slices_come_back_in_order_when_they_finish_out_of_order(monkeypatch):
+    blob, data = source_blob()
+    delays = random.Random(1)
+    original = FakeBlob.download_as_bytes
+
+    def slow(self, start=None, end=None, **kwargs):
+        time.sleep(delays.random() * 0.01)
+        return original(self, start, end, **kwargs)
+
+    monkeypatch.setattr(FakeBlob, "download_as_bytes", slow)
+    assert b"".join(iter_slices(blob, slice_bytes=64, workers=4)) == data
+
+
+def test_download_verifies_crc32c(tmp_path):
+    blob, data = source_blob()
+    local_file = tmp_path / "raw.csv.gz"
+    download_to_filename(blob, str(local_file), slice_bytes=64, workers=4)
+    assert local_file.read_bytes() == data
+    assert len(blob.bucket.downloads) == len(slice_ranges(len(data), 64))
+
+
+def test_crc32c_mismatch_removes_partial_file(tmp_path):
+    blob, _ = source_blob()
+    blob.crc32c = base64.b64encode((1234).to_bytes(4, "big")).decode("ascii")
+    local_file = tmp_path / "raw.csv.gz"
+    with pytest.raises(SliceError, match="crc32c mismatch"):
+        download_to_filename(blob, str(local_file), slice_bytes=64, workers=4)
+    assert not os.path.exists(local_file)
+
+
+def test_short_slice_fails_download(tmp_path, monkeypatch):
+    blob, _ = source_blob()
+    original = FakeBlob.download_as_bytes
+
+    def truncated(self, start=None, end=None, **kwargs):
+        data = original(self, start, end, **kwargs)
+        return data[:-1] if start == 128 else data
+
+    monkeypatch.setattr(FakeBlob, "download_as_bytes", truncated)
+    with pytest.raises(SliceError, match="Slice 128-191"):
+        download_to_filename(blob, str(tmp_path / "raw.csv.gz"), slice_bytes=64, workers=4)
+
+
+def test_small_object_is_downloaded_whole(tmp_path):
+    blob, data = source_blob(size=50)
+    local_file = tmp_path / "raw.csv.gz"
+    download_to_filename(blob, str(local_file), slice_bytes=16, workers=4)
+    assert local_file.read_bytes() == data
+    assert len(blob.bucket.downloads) == 1
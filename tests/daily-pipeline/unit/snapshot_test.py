@@ -0,0 +1,48 @@
+import gzip
+import io
+import json
+
+import pandas as pd
+
+from common.gcs import snapshot_object_path
+from common.snapshot import SnapshotWriter, snapshot_periods
+from fake_gcs import FakeBucket
+
+
+def minute_chunk(tickers, minutes=10):
+    start = pd.Timestamp("2023-01-03 14:30")
+    rows = [{"ticker": ticker, "date": start + pd.Timedelta(minutes=i), "open": 1.0 + i, "high": 2.0 + i,
+             "low": 0.5 + i, "close": 1.5 + i, "volume": 10 * (i + 1)}
+            for ticker in tickers for i in range(minutes)]
+    return pd.DataFrame(rows)
+
+
+def test_snapshot_joins_parts_in_source_order(tmp_path):
+    bucket = FakeBucket()
+    writer = SnapshotWriter(str(tmp_path), ["5m"])
+    # 청크가 끝나는 순서와 관계없이 원본 순서(order_key)대로 합친다.
+    writer.add_chunk(1, minute_chunk(["C", "D"]))
+    writer.add_chunk(0, minute_chunk(["A", "B"]))
+    assert writer.finalize(bucket, "2023", "01", "03") == [snapshot_object_path("5m", "2023", "01", "03")]
+
+    path = snapshot_object_path("5m", "2023", "01", "03")
+    data = bucket.objects[path][0]
+    frame = pd.read_csv(io.BytesIO(gzip.decompress(data)))
+    assert list(frame["ticker"].unique()) == ["A", "B", "C", "D"]
+    assert len(frame) == 8
+    assert frame.loc[frame["ticker"] == "A", "volume"].tolist() == [150, 400]
+
+    index = json.loads(bucket.objects[path[:-len(".csv.gz")] + "_index.json"][0])
+    assert index["rows"] == 8
+    assert index["tickers"]["C"] == [4, 2, 1]
+    # 티커의 member만 범위 읽기해도 온전한 gzip이다.
+    offset, length = index["members"][index["tickers"]["C"][2]]
+    member = gzip.decompress(data[offset:offset + length]).decode("utf-8").splitlines()
+    assert [line.split(",")[0] for line in member] == ["C", "C", "D", "D"]
+
+
+def test_snapshot_periods(monkeypatch):
+    monkeypatch.setenv("SNAPSHOT_PERIODS", "")
+    assert snapshot_periods() == []
+    monkeypatch.setenv("SNAPSHOT_PERIODS", "1m, 1d")
+    assert snapshot_periods() == ["1m", "1d"]
@@ -0,0 +1,155 @@
+import io
+import json
+
+import pandas as pd
+
+from common.gcs import RESAMPLED_BUCKET
+from fake_gcs import FakeBucket, FakeClient
+import split_ticker
+from split_ticker import ChunkSizer, SplitCheckpoint, iter_ticker_chunks, shard_tickers, write_shard_manifest
+
+
+def sizer(rows):
+    return ChunkSizer(rows, 1, 1000, 10 ** 9, 2, 2.0)
+
+
+def source_reader(counts):
+    # 티커 순으로 정렬된 원본: {티커: 행 수}
+    rows = [{"ticker": ticker, "window_start": i, "close": float(i)}
+            for ticker, count in counts.items() for i in range(count)]
+    return pd.read_csv(io.StringIO(pd.DataFrame(rows).to_csv(index=False)), chunksize=4)
+
+
+def test_iter_ticker_chunks_carries_tail_ticker_to_next_chunk():
+    counts = {"A": 3, "B": 5, "C": 1, "D": 6}
+    all_tickers = set()
+    chunks = list(iter_ticker_chunks(source_reader(counts), sizer(4), all_tickers))
+
+    seen = []
+    for start, end, chunk in chunks:
+        assert end - start == len(chunk)
+        seen.extend(chunk["ticker"].unique())
+    # 어떤 티커도 두 청크로 나뉘지 않고, 행 번호는 빈틈없이 이어진다.
+    assert seen == ["A", "B", "C", "D"]
+    assert [(start, end) for start, end, _ in chunks] == \
+        list(zip([0] + [end for _, end, _ in chunks[:-1]], [end for _, end, _ in chunks]))
+    assert chunks[-1][1] == sum(counts.values())
+    assert all_tickers == set(counts)
+
+
+def test_iter_ticker_chunks_keeps_ticker_larger_than_chunk_together():
+    chunks = list(iter_ticker_chunks(source_reader({"A": 2, "B": 11, "C": 2}), sizer(4), set()))
+    b_chunks = [chunk for _, _, chunk in chunks if "B" in set(chunk["ticker"])]
+    assert len(b_chunks) == 1 and len(b_chunks[0]) == 11
+
+
+def test_chunk_sizer_respects_memory_budget_and_bounds():
+    chunk_sizer = ChunkSizer(100, 10, 10000, max_inflight_bytes=300 * 1000, workers=2, target_seconds=1.0)
+    chunk_sizer.record_parse(1000, 0.1, 1000 * 1000)
+    chunk_sizer.record_process(1000, 0.001)
+    # (워커 + 1)개 청크가 예산에 들어가는 행 수로 제한된다.
+    assert chunk_sizer.rows == 100
+    chunk_sizer.record_process(1, 10.0)
+    chunk_sizer.record_process(1, 10.0)
+    assert chunk_sizer.rows >= chunk_sizer.min_rows
+
+
+def test_chunk_sizer_grows_when_parsing_is_the_bottleneck():
+    chunk_sizer = ChunkSizer(100, 10, 100000, max_inflight_bytes=10 ** 12, workers=4, target_seconds=1.0)
+    chunk_sizer.record_process(1000, 1.0)
+    assert chunk_sizer.rows == 1000
+    chunk_sizer.record_parse(1000, 1.0, 1000)
+    assert chunk_sizer.rows == 2000
+
+
+def test_checkpoint_advances_only_over_contiguous_rows():
+    checkpoint = SplitCheckpoint(FakeBucket(), "2023", "01", "03", 7)
+    checkpoint.complete(10, 20, 10, {"B"})
+    assert checkpoint.rows_done == 0
+    checkpoint.complete(0, 10, 10, {"A"})
+    assert checkpoint.rows_done == 20
+    assert checkpoint.published == {"A", "B"}
+
+
+def test_checkpoint_resumes_from_saved_state():
+    bucket = FakeBucket()
+    checkpoint = SplitCheckpoint(bucket, "2023", "01", "03", 7)
+    checkpoint.complete(0, 10, 10, {"A"})
+    checkpoint.save({"A", "B"})
+
+    resumed = SplitCheckpoint(bucket, "2023", "01", "03", 7)
+    assert resumed.load()
+    assert (resumed.rows_done, resumed.published, resumed.seen, resumed.total_rows) == (10, {"A"}, {"A", "B"}, 10)
+
+    # 원본이 바뀌었으면 처음부터 다시 한다.
+    replaced = SplitCheckpoint(bucket, "2023", "01", "03", 8)
+    assert not replaced.load()
+    assert replaced.rows_done == 0
+
+
+def test_checkpoint_clear_deletes_saved_state():
+    bucket = FakeBucket()
+    checkpoint = SplitCheckpoint(bucket, "2023", "01", "03", 7)
+    checkpoint.save(set())
+    checkpoint.clear()
+    assert not bucket.objects
+
+
+def write_manifests(bucket, tickers, shard_count, unpublished=()):
+    for index in range(shard_count):
+        shard = (index, shard_count)
+        mine = shard_tickers(tickers, shard)
+        write_shard_manifest(bucket, "2023", "01", "03", shard, "raw.csv.gz", 1, set(tickers),
+                             mine - set(unpublished), 100)
+
+
+def verify(monkeypatch, client, shard_count):
+    monkeypatch.setattr(split_ticker, "get_storage_client", lambda: client)
+    return split_ticker.verify_shards("2023", "01", "03", shard_count)
+
+
+def test_verify_shards_accepts_complete_run(monkeypatch):
+    client = FakeClient()
+    tickers = [f"T{i:03d}" for i in range(50)]
+    write_manifests(client.bucket(RESAMPLED_BUCKET), tickers, 3)
+    assert verify(monkeypatch, client, 3)
+
+
+def test_verify_shards_reports_unpublished_and_missing_shards(monkeypatch):
+    client = FakeClient()
+    bucket = client.bucket(RESAMPLED_BUCKET)
+    tickers = [f"T{i:03d}" for i in range(50)]
+    write_manifests(bucket, tickers, 3, unpublished=["T007"])
+    assert not verify(monkeypatch, client, 3)
+
+    write_manifests(bucket, tickers, 3)
+    del bucket.objects[next(name for name in bucket.objects if name.endswith("shard-1-of-3.json"))]
+    assert not verify(monkeypatch, client, 3)
+
+
+def test_verify_shards_rejects_mixed_sources(monkeypatch):
+    client = FakeClient()
+    bucket = client.bucket(RESAMPLED_BUCKET)
+    write_manifests(bucket, [f"T{i:03d}" for i in range(50)], 2)
+    name = next(name for name in bucket.objects if name.endswith("shard-0-of-2.json"))
+    manifest = json.loads(bucket.objects[name][0])
+    manifest["source_generation"] = "2"
+    bucket.put(name, json.dumps(manifest))
+    assert not verify(monkeypatch, client, 2)
+
+
+def test_file_backed_upload_is_not_hedged(tmp_path, monkeypatch):
+    calls = []
+
+    class RecordingPolicy:
+        def call(self, op, fn, idempotent=True):
+            calls.append((op, idempotent))
+            return fn()
+
+    monkeypatch.setattr(split_ticker, "default_policy", lambda: RecordingPolicy())
+    bucket = FakeBucket()
+    group = pd.DataFrame({"ticker": ["A"], "window_start": [1], "close": [1.0], "date": [0], "date_str": ["x"]})
+    assert split_ticker.upload_ticker_group("A", group, str(tmp_path), bucket, "2023", "01", "03", [0]) == "A"
+    assert calls == [("upload", False)]
+    assert list(bucket.objects) == ["stock/usa/A/1m/2023/01/A_2023-01-03_1m.csv.gz"]
+    assert not list(tmp_path.iterdir())
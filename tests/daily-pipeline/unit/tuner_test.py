@@ -0,0 +1,70 @@
+import pytest
+
+from common import tuner
+
+
+@pytest.fixture
+def cgroup(tmp_path, monkeypatch):
+    monkeypatch.setattr(tuner, "CGROUP_ROOT", str(tmp_path))
+    monkeypatch.setattr(tuner, "_host_cpus", lambda: 16)
+    monkeypatch.setattr(tuner, "_host_memory", lambda: 64 * 1024 ** 3)
+    tuner.detect_limits.cache_clear()
+    yield tmp_path
+    tuner.detect_limits.cache_clear()
+
+
+def write(root, path, value):
+    target = root / path
+    target.parent.mkdir(parents=True, exist_ok=True)
+    target.write_text(value + "\n")
+
+
+def test_cgroup_v2_limits(cgroup):
+    write(cgroup, "cpu.max", "250000 100000")
+    write(cgroup, "memory.max", str(4 * 1024 ** 3))
+    limits = tuner.detect_limits()
+    assert (limits.cpus, limits.memory_bytes, limits.source) == (2.5, 4 * 1024 ** 3, "cgroup")
+    assert limits.workers == 3
+
+
+def test_cgroup_v2_unlimited_falls_back_to_host(cgroup):
+    write(cgroup, "cpu.max", "max 100000")
+    write(cgroup, "memory.max", "max")
+    limits = tuner.detect_limits()
+    assert (limits.cpus, limits.memory_bytes, limits.source) == (16, 64 * 1024 ** 3, "host")
+
+
+def test_cgroup_v1_limits(cgroup):
+    write(cgroup, "cpu,cpuacct/cpu.cfs_quota_us", "50000")
+    write(cgroup, "cpu,cpuacct/cpu.cfs_period_us", "100000")
+    write(cgroup, "memory/memory.limit_in_bytes", str(512 * 1024 ** 2))
+    limits = tuner.detect_limits()
+    assert (limits.cpus, limits.memory_bytes) == (0.5, 512 * 1024 ** 2)
+    assert limits.workers == 1
+
+
+def test_cgroup_v1_unlimited(cgroup):
+    write(cgroup, "cpu/cpu.cfs_quota_us", "-1")
+    write(cgroup, "cpu/cpu.cfs_period_us", "100000")
+    write(cgroup, "memory/memory.limit_in_bytes", "9223372036854771712")
+    assert tuner.cgroup_cpu_limit() is None
+    assert tuner.cgroup_memory_limit() is None
+
+
+def test_limits_never_exceed_host(cgroup):
+    write(cgroup, "cpu.max", "6400000 100000")
+    write(cgroup, "memory.max", str(128 * 1024 ** 3))
+    limits = tuner.detect_limits()
+    assert (limits.cpus, limits.memory_bytes) == (16, 64 * 1024 ** 3)
+
+
+def test_derived_values_and_env_override(cgroup, monkeypatch):
+    write(cgroup, "cpu.max", "200000 100000")
+    write(cgroup, "memory.max", str(1024 ** 3))
+    assert tuner.cpu_workers(per_cpu=8, minimum=4, maximum=64) == 16
+    assert tuner.cpu_workers(per_cpu=100, maximum=64) == 64
+    assert tuner.memory_share(0.25, 0, 10 ** 12) == 256 * 1024 ** 2
+    monkeypatch.setenv("TEST_WORKERS", "3")
+    assert tuner.tuned_int("TEST_WORKERS", tuner.cpu_workers()) == 3
+    monkeypatch.delenv("TEST_WORKERS")
+    assert tuner.tuned_int("TEST_WORKERS", tuner.cpu_workers()) == 2
@@ -0,0 +1,129 @@
+import json
+import os
+import threading
+
+import pandas as pd
+import pytest
+
+from common.gcs import RESAMPLED_BUCKET, norm_object_path, split_manifest_path
+from fake_gcs import FakeBlob, FakeBucket, FakeClient, gzip_csv
+import upload_to_influxdb
+from upload_to_influxdb import PeriodPrefetcher, POINT_BYTES, build_points
+
+
+def norm_frame(rows):
+    return pd.DataFrame({"window_start": pd.date_range("2023-01-03 14:30", periods=rows, freq="1min"),
+                         "open": 1.5, "high": 2.0, "low": 1.0, "close": 1.2, "volume": 100})
+
+
+def run_prefetcher(prefetcher, timeout=10):
+    items = []
+    errors = []
+
+    def consume():
+        try:
+            for item in prefetcher:
+                items.append(item)
+                prefetcher.release(item[2])
+        except Exception as e:
+            errors.append(e)
+
+    thread = threading.Thread(target=consume, daemon=True)
+    thread.start()
+    thread.join(timeout)
+    prefetcher.close()
+    assert not thread.is_alive(), "prefetcher did not finish"
+    return items, errors
+
+
+def test_build_points_skips_filled_rows():
+    df = norm_frame(3).assign(filled=[0, 1, 0])
+    points = build_points(df, "AAPL", "1m")
+    assert len(points) == 2
+    assert "ticker=AAPL" in points[0].to_line_protocol()
+
+
+def test_prefetcher_item_larger_than_budget_does_not_deadlock():
+    # 원본 바이트와 Point 목록이 모두 예산보다 커도, 혼자 남은 항목은 통과해야 한다.
+    bucket = FakeBucket()
+    bucket.put(norm_object_path("AAPL", "1m", "2023", "01", "03"), gzip_csv(norm_frame(500)))
+    prefetcher = PeriodPrefetcher(bucket, "AAPL", ["1m"], "2023", "01", "03", max_bytes=100, derive=False)
+    items, errors = run_prefetcher(prefetcher)
+    assert not errors
+    assert [(period, len(points), nbytes) for period, points, nbytes in items] == [("1m", 500, 500 * POINT_BYTES)]
+    assert prefetcher.budget.in_flight == 0
+
+
+def test_prefetcher_skips_missing_periods():
+    bucket = FakeBucket()
+    for period in ("1m", "5m", "1d"):
+        bucket.put(norm_object_path("AAPL", period, "2023", "01", "03"), gzip_csv(norm_frame(10)))
+    prefetcher = PeriodPrefetcher(bucket, "AAPL", ["1m", "5m", "1h", "1d"], "2023", "01", "03", depth=2,
+                                  max_bytes=10 * POINT_BYTES, derive=False)
+    items, errors = run_prefetcher(prefetcher)
+    assert not errors
+    assert sorted(period for period, _, _ in items) == ["1d", "1m", "5m"]
+    assert prefetcher.budget.in_flight == 0
+
+
+class Forbidden(Exception):
+    code = 403
+
+
+class ForbiddenBlob(FakeBlob):
+    def download_as_bytes(self, start=None, end=None, **kwargs):
+        raise Forbidden(self.name)
+
+
+def export_bucket(monkeypatch):
+    client = FakeClient()
+    bucket = client.bucket(RESAMPLED_BUCKET)
+    bucket.put(norm_object_path("AAPL", "1m", "2023", "01", "03"), gzip_csv(norm_frame(3)))
+    monkeypatch.setattr(upload_to_influxdb, "_export_client", client)
+    monkeypatch.setattr(upload_to_influxdb, "DERIVE_PERIODS", False)
+    return bucket
+
+
+def test_export_skips_missing_periods(monkeypatch):
+    export_bucket(monkeypatch)
+    ticker, lines = upload_to_influxdb._export_ticker_lines(("2023", "01", "03", "AAPL"))
+    assert ticker == "AAPL" and len(lines) == 3
+
+
+def test_export_fails_on_download_error(monkeypatch):
+    # 404가 아닌 실패는 주기가 빠진 파일을 만들지 않도록 내보내기를 실패시켜야 한다.
+    bucket = export_bucket(monkeypatch)
+    forbidden = norm_object_path("AAPL", "1d", "2023", "01", "03")
+    monkeypatch.setattr(bucket, "blob",
+                        lambda name, generation=None: (ForbiddenBlob if name == forbidden else FakeBlob)(bucket, name))
+    with pytest.raises(Forbidden):
+        upload_to_influxdb._export_ticker_lines(("2023", "01", "03", "AAPL"))
+
+
+def test_list_tickers_reads_split_manifests(monkeypatch):
+    monkeypatch.delenv("EXPORT_TICKERS", raising=False)
+    client = FakeClient()
+    bucket = client.bucket(RESAMPLED_BUCKET)
+    # 다른 날짜나 아직 올라가지 않은 티커는 포함하지 않는다.
+    for index, published in enumerate([["AAPL", "MSFT"], ["TSLA"]]):
+        bucket.put(split_manifest_path("2023", "01", "03", index, 2), json.dumps({"published": published}))
+    bucket.put(split_manifest_path("2023", "01", "04", 0, 1), json.dumps({"published": ["NVDA"]}))
+    assert upload_to_influxdb.list_tickers(client, "2023", "01", "03") == ["AAPL", "MSFT", "TSLA"]
+
+
+def test_main_export_file_includes_priority_tickers(tmp_path, monkeypatch):
+    written = {}
+
+    def write_export_file(tickers, year, month, day, local_file):
+        written[os.path.basename(local_file)] = list(tickers)
+        open(local_file, "w").close()
+        return 0
+
+    monkeypatch.setenv("EXPORT_TICKERS", "AAPL,MSFT")
+    monkeypatch.setattr(upload_to_influxdb, "get_storage_client", lambda: FakeClient())
+    monkeypatch.setattr(upload_to_influxdb, "split_priority", lambda tickers: (["AAPL"], ["MSFT"]))
+    monkeypatch.setattr(upload_to_influxdb, "publish_priority_done", lambda *args, **kwargs: None)
+    monkeypatch.setattr(upload_to_influxdb, "_write_export_file", write_export_file)
+    upload_to_influxdb.export_line_protocol("2023", "01", "03", str(tmp_path))
+    assert written == {"stock_price_2023-01-03_priority.lp.gz": ["AAPL"],
+                       "stock_price_2023-01-03.lp.gz": ["AAPL", "MSFT"]}